@@ -0,0 +1,444 @@
+# benchmark.py
+
+"""
+This script is the benchmark suite of EarthAI. It measures throughput and latency percentiles of the hot paths on
+synthetic AIRS data (see synthetic_data.py) and saves the results as JSON, so that a run can be compared with an
+earlier one and regressions are caught before they ship.
+
+Benchmarks:
+
+- pipeline: DataProcessingPipeline.load_data, clean_data, transform_data and prepare_batches on a synthetic CSV,
+  each timed separately, plus end-to-end streaming throughput.
+- batching: SelectiveBatching.create_batch in streaming, best-fit and TaskTable mode, and execute_batches. The
+  model calls are no-ops, so only the batching overhead is measured. Mean batch fill ratios are reported too.
+- scheduler: DynamicTaskScheduler dispatch of no-op tasks: submit-to-completion latency per task and tasks per
+  second through add_task and drain.
+- server: a load generator replaying a /predict trace (requests.jsonl style: one JSON object per line with the
+  request body and its offset in seconds) against the Flask app or the ASGI app in process, or against a running
+  server given by URL. Requests are sent at their trace offsets divided by --speed, or back to back with --speed 0,
+  from --concurrency client threads.
+
+Each result has a count, the elapsed seconds, a throughput in items per second and, where single operations are
+timed, mean, p50, p90, p99 and max latency in milliseconds. The results file also holds the run's environment and
+a snapshot of the metrics registry (see metrics.py) with the timers, queue depths and fill ratios recorded during
+the run.
+
+Comparing: with --compare BASELINE.json, throughput drops and latency increases beyond --tolerance (default 10%)
+are listed as regressions, and --fail-on-regression turns them into a non-zero exit status for CI.
+
+Profiling: --profile FILE attaches a metrics.CProfileHook to the instrumented sections (all timers, or those named
+with --profile-section) and writes the cProfile statistics to FILE for pstats or snakeviz.
+
+Usage:
+    PYTHONPATH=src python scripts/benchmark.py --output benchmarks/results.json
+    PYTHONPATH=src python scripts/benchmark.py --only server --trace requests.jsonl --speed 0 --concurrency 16
+    PYTHONPATH=src python scripts/benchmark.py --compare benchmarks/baseline.json --fail-on-regression
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import metrics
+from batching import BEST_FIT, STREAMING, SelectiveBatching, Task as BatchTask
+from data_processing.pipeline import DataProcessingPipeline
+from data_processing.preprocessing import Preprocessor
+from scheduler import DynamicTaskScheduler, Task as SchedulerTask
+from synthetic_data import make_trace, read_trace, write_airs_csv
+from task_table import TaskTable
+
+BENCHMARKS = ("pipeline", "batching", "scheduler", "server")
+# Result fields where a larger value is an improvement; for all other compared fields smaller is better
+HIGHER_IS_BETTER = ("throughput",)
+COMPARED_FIELDS = ("throughput", "p50_ms", "p99_ms")
+
+
+def summarise(latencies, elapsed, items=None):
+    """Throughput and latency percentiles of a run: latencies in seconds, items processed in elapsed seconds."""
+    items = len(latencies) if items is None else items
+    result = {"count": int(items), "seconds": round(elapsed, 6),
+              "throughput": round(items / elapsed, 3) if elapsed > 0 else None}
+    if len(latencies):
+        milliseconds = np.asarray(latencies, dtype=np.float64) * 1000
+        p50, p90, p99 = np.percentile(milliseconds, [50, 90, 99])
+        result.update(mean_ms=round(float(milliseconds.mean()), 4), p50_ms=round(float(p50), 4),
+                      p90_ms=round(float(p90), 4), p99_ms=round(float(p99), 4),
+                      max_ms=round(float(milliseconds.max()), 4))
+    return result
+
+
+def repeat_timed(function, repeats):
+    """Call function repeats times; returns (per-call durations, total seconds, last return value)."""
+    durations = []
+    value = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        value = function()
+        durations.append(time.perf_counter() - start)
+    return durations, sum(durations), value
+
+
+def bench_pipeline(directory, rows=200000, repeats=3, batch_size=100, chunksize=50000):
+    path = write_airs_csv(os.path.join(directory, "airs.csv"), rows)
+    results = {}
+    durations = {stage: [] for stage in ("load", "clean", "transform", "batch")}
+    for _ in range(repeats):
+        pipeline = DataProcessingPipeline(path, preprocessor=Preprocessor(outlier_threshold=5.0, standardize=True))
+        for stage, step in (("load", pipeline.load_data), ("clean", pipeline.clean_data),
+                            ("transform", pipeline.transform_data),
+                            ("batch", lambda: pipeline.prepare_batches(batch_size))):
+            start = time.perf_counter()
+            step()
+            durations[stage].append(time.perf_counter() - start)
+    for stage, stage_durations in durations.items():
+        # Throughput in rows per second; latency is the duration of one full pass of the stage
+        results[f"pipeline.{stage}"] = summarise(stage_durations, sum(stage_durations), rows * repeats)
+
+    preprocessor = Preprocessor(outlier_threshold=5.0, standardize=True)
+    streaming = DataProcessingPipeline(path, chunksize=chunksize, preprocessor=preprocessor)
+    start = time.perf_counter()
+    kept_rows = sum(len(batch) for batch in streaming.run_pipeline())
+    results["pipeline.streaming"] = summarise([], time.perf_counter() - start, rows)
+    results["pipeline.streaming"]["rows_kept"] = kept_rows
+    return results
+
+
+class _NoOpBatching(SelectiveBatching):
+    """SelectiveBatching with free model calls, so only the batching machinery is measured."""
+
+    def execute_task(self, task):
+        return None
+
+    def process_batch(self, batch):
+        return len(batch)
+
+
+def synthetic_tasks(count, seed=0, max_batch_size=40):
+    rng = np.random.default_rng(seed)
+    types = rng.choice(["model_inference", "data_processing", "attention"], count, p=[0.6, 0.3, 0.1])
+    sizes = rng.integers(1, max_batch_size // 2, count)
+    return [BatchTask(str(task_type), int(size), task_id=number)
+            for number, (task_type, size) in enumerate(zip(types, sizes))]
+
+
+def bench_batching(tasks=100000, repeats=5, max_batch_size=40):
+    task_list = synthetic_tasks(tasks, max_batch_size=max_batch_size)
+    table = TaskTable.from_tasks(task_list)
+    results = {}
+    for name, mode, source in (("streaming", STREAMING, task_list), ("best_fit", BEST_FIT, task_list),
+                               ("table_streaming", STREAMING, table), ("table_best_fit", BEST_FIT, table)):
+        batching = None
+
+        def create():
+            nonlocal batching
+            batching = _NoOpBatching(max_batch_size=max_batch_size, packing=mode)
+            batching.create_batch(source)
+
+        durations, total, _ = repeat_timed(create, repeats)
+        results[f"batching.create.{name}"] = summarise(durations, total, tasks * repeats)
+        results[f"batching.create.{name}"]["batches"] = len(batching.batches)
+        results[f"batching.create.{name}"]["mean_fill_ratio"] = round(float(np.mean(batching.fill_ratios())), 4)
+
+    batching = _NoOpBatching(max_batch_size=max_batch_size, packing=BEST_FIT)
+    batching.create_batch(task_list)
+    durations, total, _ = repeat_timed(batching.execute_batches, repeats)
+    results["batching.execute"] = summarise(durations, total, len(batching.batches) * repeats)
+    return results
+
+
+def bench_scheduler(tasks=5000, max_workers=8, batch_threshold=10):
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def record(submitted):
+        elapsed = time.perf_counter() - submitted[0]
+        with latencies_lock:
+            latencies.append(elapsed)
+
+    scheduler = DynamicTaskScheduler(max_workers=max_workers, batch_threshold=batch_threshold)
+    scheduler.start()
+    start = time.perf_counter()
+    try:
+        for number in range(tasks):
+            scheduler.add_task(SchedulerTask(number, number % 3, 0.0, [time.perf_counter()], func=record))
+        scheduler.drain()
+        elapsed = time.perf_counter() - start
+    finally:
+        scheduler.shutdown()
+    return {"scheduler.dispatch": summarise(latencies, elapsed)}
+
+
+class FlaskTarget:
+    """Sends trace requests to the Flask app in process, through its test client."""
+
+    name = "flask"
+
+    def __init__(self):
+        from model_serving import server
+        self.app = server.app
+
+    def __enter__(self):
+        self.local = threading.local()
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def send(self, entry):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        headers = {"Accept": entry["accept"]} if entry.get("accept") else {}
+        response = client.post("/predict", json=entry["body"], headers=headers)
+        response.get_data()  # Drain streamed responses
+        return response.status_code
+
+
+class AsgiTarget:
+    """Sends trace requests to the ASGI app in process, on an event loop running in a background thread."""
+
+    name = "asgi"
+
+    def __init__(self):
+        from model_serving import asgi
+        self.app = asgi.app
+
+    def __enter__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="asgi-benchmark", daemon=True)
+        self.thread.start()
+        self.app.startup()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.app.shutdown()
+        return False
+
+    async def _request(self, entry):
+        body = json.dumps(entry["body"]).encode("utf-8")
+        headers = [(b"content-type", b"application/json")]
+        if entry.get("accept"):
+            headers.append((b"accept", entry["accept"].encode("latin-1")))
+        scope = {"type": "http", "method": "POST", "path": "/predict", "headers": headers}
+        messages = iter([{"type": "http.request", "body": body, "more_body": False}])
+        status = None
+
+        async def receive():
+            return next(messages, {"type": "http.disconnect"})
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await self.app(scope, receive, send)
+        return status
+
+    def send(self, entry):
+        return asyncio.run_coroutine_threadsafe(self._request(entry), self.loop).result()
+
+
+class HttpTarget:
+    """Sends trace requests over HTTP to a running server."""
+
+    name = "http"
+
+    def __init__(self, url):
+        self.url = url.rstrip("/") + "/predict"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def send(self, entry):
+        headers = {"Content-Type": "application/json"}
+        if entry.get("accept"):
+            headers["Accept"] = entry["accept"]
+        request = urllib.request.Request(self.url, data=json.dumps(entry["body"]).encode("utf-8"), headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+
+def replay(target, trace, concurrency=8, speed=1.0):
+    """
+    Replay trace entries against target from concurrency threads. Entries are released at
+    offset / speed seconds after the start (immediately with speed 0). Latency is measured from
+    the scheduled send time, so queueing behind a saturated target counts against it.
+    """
+    latencies = [None] * len(trace)
+    statuses = [None] * len(trace)
+    start = time.perf_counter()
+
+    def run(index):
+        entry = trace[index]
+        scheduled = start + (entry.get("offset", 0.0) / speed if speed else 0.0)
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            scheduled = time.perf_counter()
+        try:
+            statuses[index] = target.send(entry)
+        except Exception as error:
+            logging.error(f"Request {index} failed: {error}")
+            statuses[index] = "error"
+        latencies[index] = time.perf_counter() - scheduled
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, range(len(trace))))
+    elapsed = time.perf_counter() - start
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    result = summarise(latencies, elapsed)
+    result["statuses"] = counts
+    return result
+
+
+def bench_server(trace, target="flask", concurrency=8, speed=1.0):
+    if target == "flask":
+        client = FlaskTarget()
+    elif target == "asgi":
+        client = AsgiTarget()
+    else:
+        client = HttpTarget(target)
+    with client:
+        return {f"server.{client.name}": replay(client, trace, concurrency, speed)}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "cpu_count": os.cpu_count()}
+
+
+def compare(current, baseline, tolerance=0.1):
+    """
+    Regressions of current against baseline results: a list of dicts naming the benchmark and
+    field, both values and the relative change, for changes worse than tolerance.
+    """
+    regressions = []
+    for name, result in current.get("results", {}).items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        for field in COMPARED_FIELDS:
+            old, new = previous.get(field), result.get(field)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if field in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append({"benchmark": name, "field": field, "baseline": old, "current": new,
+                                    "change": round(change, 4)})
+    return regressions
+
+
+def run(args):
+    """Run the selected benchmarks and return the results document."""
+    selected = args.only or BENCHMARKS
+    results = {}
+    metrics.REGISTRY.reset()
+    directory = tempfile.mkdtemp(prefix="earthai-benchmark-")
+    try:
+        if "pipeline" in selected:
+            results.update(bench_pipeline(directory, rows=args.rows, repeats=args.repeats))
+        if "batching" in selected:
+            results.update(bench_batching(tasks=args.tasks, repeats=args.repeats))
+        if "scheduler" in selected:
+            results.update(bench_scheduler(tasks=args.scheduler_tasks, max_workers=args.workers))
+        if "server" in selected:
+            trace = read_trace(args.trace) if args.trace else make_trace(args.requests)
+            results.update(bench_server(trace, args.target, args.concurrency, args.speed))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {"environment": environment(), "arguments": vars(args), "results": results,
+            "metrics": metrics.snapshot()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the EarthAI hot paths.")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="Benchmarks to run (default: all).")
+    parser.add_argument("--output", default="benchmarks/results.json", help="JSON file for the results.")
+    parser.add_argument("--compare", help="Earlier results file to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change counted as a regression.")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=200000, help="Synthetic AIRS rows for the pipeline.")
+    parser.add_argument("--tasks", type=int, default=100000, help="Tasks for the batching benchmark.")
+    parser.add_argument("--scheduler-tasks", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=8, help="Scheduler worker threads.")
+    parser.add_argument("--trace", help="JSON-lines /predict trace to replay (default: a synthetic one).")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests of the synthetic trace.")
+    parser.add_argument("--target", default="flask", help="flask, asgi, or the base URL of a running server.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads of the load generator.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Trace replay speed; 0 sends back to back.")
+    parser.add_argument("--profile", help="Write cProfile statistics of the instrumented sections to this file.")
+    parser.add_argument("--profile-section", action="append", help="Timer to profile (default: all).")
+    args = parser.parse_args(argv)
+
+    # The scheduler logs every task at INFO, which would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+    hook = None
+    if args.profile:
+        hook = metrics.CProfileHook(args.profile_section)
+        metrics.add_hook(hook)
+    try:
+        document = run(args)
+    finally:
+        if hook is not None:
+            metrics.remove_hook(hook)
+            hook.stats().dump_stats(args.profile)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output:
+            json.dump(document, output, indent=2, default=str)
+    for name, result in document["results"].items():
+        print(f"{name:32} {json.dumps(result)}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(document, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression['benchmark']} {regression['field']}: "
+                  f"{regression['baseline']} -> {regression['current']} ({regression['change']:+.1%})")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+# synthetic_data.py
+
+"""
+This script generates synthetic AIRS data and /predict request traces for the benchmark suite (benchmark.py), so
+throughput and latency can be measured reproducibly without downloading real granules.
+
+- airs_frame builds a table of AIRS Level 2 style retrievals (Latitude, Longitude, TSurfAir, PSurfStd, totH2OStd,
+  CldFrcTot, totO3Std) with physically plausible ranges, a share of missing values and a few gross outliers, so the
+  cleaning stage has real work to do. write_airs_csv writes it as CSV.
+- write_airs_granules writes the same fields as NetCDF-3 granules of 45 scan lines by 30 footprints, the layout of
+  an AIRS granule, for the native granule reader and the parallel pipeline.
+- make_trace builds a /predict request trace: one JSON object per line, like requests.jsonl, with the request body,
+  its offset in seconds from the start of the trace, and optionally an Accept header. A share of the requests
+  repeats earlier ones, as clients resubmitting tiles do. read_trace and write_trace load and save traces.
+
+Everything is seeded, so a given seed always produces the same data and trace.
+
+Usage:
+    PYTHONPATH=src python scripts/synthetic_data.py --rows 1000000 --output data/synthetic_airs.csv
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from data_processing.granules import write_netcdf
+
+# (mean, standard deviation, lower bound, upper bound) of each retrieved field
+AIRS_FIELDS = {
+    "TSurfAir": (288.0, 15.0, 180.0, 340.0),  # Surface air temperature, K
+    "PSurfStd": (1000.0, 25.0, 500.0, 1100.0),  # Surface pressure, hPa
+    "totH2OStd": (25.0, 12.0, 0.0, 80.0),  # Total precipitable water vapour, kg/m^2
+    "CldFrcTot": (0.5, 0.3, 0.0, 1.0),  # Total cloud fraction
+    "totO3Std": (300.0, 40.0, 150.0, 500.0),  # Total ozone, Dobson units
+}
+GRANULE_SHAPE = (45, 30)  # Scan lines (GeoTrack) by footprints (GeoXTrack)
+FILL_VALUE = np.float32(-9999.0)
+
+
+def airs_frame(rows, seed=0, missing_fraction=0.01, outlier_fraction=0.001):
+    """A DataFrame of rows synthetic AIRS retrievals with missing values and outliers."""
+    rng = np.random.default_rng(seed)
+    columns = {
+        "Latitude": rng.uniform(-90.0, 90.0, rows).astype(np.float32),
+        "Longitude": rng.uniform(-180.0, 180.0, rows).astype(np.float32),
+    }
+    for name, (mean, std, low, high) in AIRS_FIELDS.items():
+        values = np.clip(rng.normal(mean, std, rows), low, high).astype(np.float32)
+        outliers = rng.random(rows) < outlier_fraction
+        values[outliers] = mean + np.sign(rng.normal(size=outliers.sum())) * 50 * std
+        values[rng.random(rows) < missing_fraction] = np.nan
+        columns[name] = values
+    return pd.DataFrame(columns)
+
+
+def write_airs_csv(path, rows, seed=0, **options):
+    """Write rows synthetic retrievals to a CSV file and return its path."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    airs_frame(rows, seed, **options).to_csv(path, index=False)
+    return path
+
+
+def write_airs_granules(directory, granules, seed=0, **options):
+    """Write granules synthetic NetCDF-3 granules to directory and return their paths."""
+    os.makedirs(directory, exist_ok=True)
+    per_granule = GRANULE_SHAPE[0] * GRANULE_SHAPE[1]
+    paths = []
+    for number in range(granules):
+        frame = airs_frame(per_granule, seed + number, **options)
+        variables = {}
+        for name in frame.columns:
+            values = frame[name].to_numpy().reshape(GRANULE_SHAPE)
+            variables[name] = (("GeoTrack", "GeoXTrack"), np.where(np.isnan(values), FILL_VALUE, values),
+                               {"_FillValue": FILL_VALUE})
+        path = os.path.join(directory, f"AIRS.synthetic.{number:03d}.nc")
+        write_netcdf(path, {"GeoTrack": GRANULE_SHAPE[0], "GeoXTrack": GRANULE_SHAPE[1]}, variables,
+                     attributes={"title": "Synthetic AIRS granule", "granule_number": np.int32(number)})
+        paths.append(path)
+    return paths
+
+
+def make_trace(requests, rows_per_request=1, rate=200.0, duplicate_fraction=0.2, npy_fraction=0.0, seed=0):
+    """
+    A list of /predict trace entries: {"offset": seconds, "body": payload}, with Poisson
+    arrivals at rate requests per second. duplicate_fraction of the requests repeat an earlier
+    body; npy_fraction of them ask for .npy responses.
+    """
+    rng = np.random.default_rng(seed)
+    offsets = np.cumsum(rng.exponential(1.0 / rate, requests)) if rate else np.zeros(requests)
+    fields = ["Latitude", "Longitude", *AIRS_FIELDS]
+    trace = []
+    for number in range(requests):
+        if trace and rng.random() < duplicate_fraction:
+            body = trace[rng.integers(len(trace))]["body"]
+        else:
+            frame = airs_frame(rows_per_request, seed=seed * 1_000_003 + number, missing_fraction=0.0,
+                               outlier_fraction=0.0)
+            body = {"instances": frame[fields].astype(float).to_dict(orient="records")}
+        entry = {"offset": round(float(offsets[number]), 6), "body": body}
+        if rng.random() < npy_fraction:
+            entry["accept"] = "application/x-npy"
+        trace.append(entry)
+    return trace
+
+
+def write_trace(path, trace):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        for entry in trace:
+            file.write(json.dumps(entry) + "\n")
+    return path
+
+
+def read_trace(path):
+    """
+    Load a JSON-lines trace. Lines without a "body" key are taken as the request body itself,
+    so plain files of /predict payloads can be replayed too; their offsets default to 0.
+    """
+    trace = []
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if not isinstance(entry, dict) or "body" not in entry:
+                entry = {"body": entry}
+            entry.setdefault("offset", 0.0)
+            trace.append(entry)
+    return trace
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic AIRS data and /predict traces.")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows of the synthetic CSV.")
+    parser.add_argument("--output", default="data/synthetic_airs.csv", help="CSV file to write.")
+    parser.add_argument("--granules", type=int, default=0, help="Also write this many NetCDF granules.")
+    parser.add_argument("--granule-dir", default="data/synthetic_granules")
+    parser.add_argument("--trace", help="Also write a /predict trace to this JSON-lines file.")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests in the trace.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    write_airs_csv(args.output, args.rows, args.seed)
+    logging.info(f"Wrote {args.rows} synthetic AIRS rows to {args.output}.")
+    if args.granules:
+        write_airs_granules(args.granule_dir, args.granules, args.seed)
+        logging.info(f"Wrote {args.granules} synthetic granules to {args.granule_dir}.")
+    if args.trace:
+        write_trace(args.trace, make_trace(args.requests, seed=args.seed))
+        logging.info(f"Wrote a {args.requests}-request trace to {args.trace}.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -12,24 +12,99 @@ the type of task is considered to ensure that batches are homogeneous in terms o
 Attention operations, known for their computational intensity, are handled individually to prevent them from blocking 
 the execution of non-attention tasks, following the ORCA paper's strategy for iteration-level task scheduling and 
 selective batching.
+
+Two packing modes are available:
+
+- streaming: The original single greedy pass. A batch is cut whenever the task type changes or the size limit would
+  be exceeded. It needs no look-ahead, so it suits streams, but interleaved input (A, B, A, B, ...) yields
+  one-task batches.
+- best_fit: Tasks are grouped by type first, then packed with best-fit decreasing. Each task goes into the open batch
+  with the least remaining space that still fits it, and open batches are kept in a bisect-sorted list. Sorting costs
+  O(n log n), and finding the batch is a binary search, but taking it out of the list and putting it back shifts the
+  list, so each task costs O(k) for k open batches. Full batches leave the list, which keeps k small. Best fit
+  produces fewer, fuller batches, which means fewer model invocations.
+
+create_batch also accepts a task_table.TaskTable. Tasks are then kept column-wise in NumPy arrays, and batches are
+TaskBatch index ranges into the table rather than lists of objects. Streaming cut points are found with a cumulative
+sum and searchsorted, one binary search per batch rather than a Python step per task. Best fit works on the size
+column directly and places each run of equal sizes with a few array operations, which suits tables of mostly equal
+tasks such as the pipeline's feature blocks. Batch totals are computed with a single reduceat.
+
+execute_batches_async runs batches concurrently on a bounded worker pool driven by an asyncio event loop, and yields
+results as they complete. Every task type gets its own concurrency lane. Attention work has a small lane by default, so
+it cannot occupy every worker and starve data_processing or model_inference batches.
+
+ContinuousBatching applies ORCA's iteration-level scheduling on top of this. It keeps a running batch of requests and
+executes one iteration at a time. Requests that have run all their iterations leave the batch, and queued requests
+join it between iterations, up to max_batch_size. Capacity is therefore never held idle until the longest request in
+a static batch has finished.
 """
 
+import asyncio
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict, deque
+from operator import attrgetter
+
+import numpy as np
+
+from metrics import histogram, RATIO_BUCKETS
+from task_table import TaskBatch, TaskTable
+
+STREAMING = "streaming"
+BEST_FIT = "best_fit"
+PACKING_MODES = (STREAMING, BEST_FIT)
+# Shortest average run of equal sizes for which table best-fit packs whole runs rather than task by task
+_MIN_AVERAGE_RUN = 64
+
+BATCHING_SECONDS = histogram("earthai_batching_seconds", "Time spent creating and executing batches.")
+FILL_RATIO = histogram("earthai_batch_fill_ratio", "Fraction of max_batch_size used by each created batch.",
+                       buckets=RATIO_BUCKETS)
+
 class Task:
-    def __init__(self, task_type, data_size):
+    __slots__ = ("task_type", "data_size", "task_id", "iterations", "data")
+
+    def __init__(self, task_type, data_size, task_id=None, iterations=1, data=None):
         self.task_type = task_type
         self.data_size = data_size
+        self.task_id = task_id
+        self.iterations = iterations  # Model iterations the request needs, e.g. decoding steps
+        self.data = data  # Payload handed to the model, e.g. a feature array view from the pipeline
 
 class SelectiveBatching:
-    def __init__(self, max_batch_size=40):
+    def __init__(self, max_batch_size=40, packing=STREAMING):
+        if packing not in PACKING_MODES:
+            raise ValueError(f"Unknown packing mode {packing!r}; expected one of {PACKING_MODES}.")
         self.max_batch_size = max_batch_size
+        self.packing = packing
         self.batches = []
 
-    def create_batch(self, tasks):
+    def create_batch(self, tasks, *, mode=None):
         """
         Organizes tasks into batches, where each batch contains tasks of the same type
         and the total data size does not exceed the max batch size. Attention tasks are
-        kept separate to allow individual processing.
+        kept separate to allow individual processing. The packing mode defaults to the
+        one chosen at construction. tasks may be a list of task objects or a TaskTable.
+        """
+        mode = mode or self.packing
+        if mode not in PACKING_MODES:
+            raise ValueError(f"Unknown packing mode {mode!r}; expected one of {PACKING_MODES}.")
+        with BATCHING_SECONDS.time(operation="create", packing=mode):
+            if isinstance(tasks, TaskTable):
+                totals = self._create_from_table(tasks, mode)
+            elif mode == STREAMING:
+                totals = self._create_streaming(tasks)
+            else:
+                totals = self._create_best_fit(tasks)
+        # The packers return the totals of the batches they created, so nothing is summed twice
+        FILL_RATIO.observe_many(np.asarray(totals, dtype=np.float64) / self.max_batch_size, packing=mode)
+
+    def _create_streaming(self, tasks):
         """
+        Single greedy pass that cuts a batch on a type change or when the size limit would be
+        exceeded. Returns the total size of each batch created.
+        """
+        totals = []
         current_batch = []
         current_batch_size = 0
         current_batch_type = None
@@ -41,6 +116,7 @@ class SelectiveBatching:
                 
                 if current_batch:
                     self.batches.append((current_batch_type, current_batch))
+                    totals.append(current_batch_size)
                 
                 current_batch = [task]
                 current_batch_size = task.data_size
@@ -52,41 +128,229 @@ class SelectiveBatching:
         # Add the last batch if it's not empty
         if current_batch:
             self.batches.append((current_batch_type, current_batch))
+            totals.append(current_batch_size)
+        return totals
+
+    def _create_best_fit(self, tasks):
+        """
+        Group tasks by type, then pack each group with best-fit decreasing. Open batches are
+        tracked as a sorted list of (remaining space, batch index) so the tightest batch that
+        still fits a task is found by bisection; updating the list is linear in the number of
+        open batches. Tasks larger than max_batch_size get their own batch, as in streaming mode.
+        Returns the total size of each batch created.
+        """
+        groups = defaultdict(list)  # Preserves the order in which types first appear
+        for task in tasks:
+            groups[task.task_type].append(task)
+
+        totals = []
+        for task_type, group in groups.items():
+            group.sort(key=attrgetter("data_size"), reverse=True)
+            sizes = [task.data_size for task in group]
+            assignment = self._best_fit_assignment(sizes)
+            type_batches = [[] for _ in range(max(assignment) + 1)]
+            for task, index in zip(group, assignment):
+                type_batches[index].append(task)
+            self.batches.extend((task_type, batch) for batch in type_batches)
+            totals.append(np.bincount(assignment, weights=sizes, minlength=len(type_batches)))
+        return np.concatenate(totals) if totals else totals
+
+    def _best_fit_assignment(self, sizes):
+        """
+        Assign sizes (already in decreasing order) to batches by best fit. Open batches are kept as
+        a sorted list of (remaining space, batch index). Returns the batch index of each size.
+        """
+        assignment = []
+        open_batches = []
+        batch_count = 0
+        for size in sizes:
+            position = bisect_left(open_batches, (size, -1))
+            if position < len(open_batches):
+                remaining, index = open_batches.pop(position)
+            else:
+                index = batch_count
+                batch_count += 1
+                remaining = self.max_batch_size
+            remaining -= size
+            if remaining > 0:
+                insort(open_batches, (remaining, index))
+            assignment.append(index)
+        return assignment
+
+    def _best_fit_runs(self, sizes):
+        """
+        Best-fit assignment of a NumPy array of integer sizes (in decreasing order) to batches,
+        the same as _best_fit_assignment gives. Equal sizes are placed a whole run at a time:
+        best fit fills the tightest open batch that fits the size before moving on to the next,
+        so each open batch takes remaining // size tasks of the run in order of remaining space,
+        and new batches take the rest. Open batches are one sorted array of remaining * n + batch
+        index keys, so a run costs a binary search and a few array operations however long it is.
+        Inputs with short runs (mostly distinct sizes) are packed task by task instead.
+        """
+        count = len(sizes)
+        run_starts = np.flatnonzero(np.r_[True, sizes[1:] != sizes[:-1]])
+        limit = self.max_batch_size
+        if (count < _MIN_AVERAGE_RUN * len(run_starts) or not isinstance(limit, (int, np.integer))
+                or (max(limit, int(sizes[0])) + 1) * count >= 1 << 62):
+            return np.asarray(self._best_fit_assignment(sizes.tolist()), dtype=np.int64)
+        assignment = np.empty(count, dtype=np.int64)
+        open_keys = np.empty(0, dtype=np.int64)  # remaining * count + batch index; batch indices are below count
+        batch_count = 0
+        for start, stop in zip(run_starts.tolist(), np.r_[run_starts[1:], count].tolist()):
+            size = int(sizes[start])
+            run = stop - start
+            position = int(np.searchsorted(open_keys, size * count, side="left"))
+            candidates = open_keys[position:position + run]  # Every batch the run reaches takes at least one task
+            remaining = candidates // count
+            if size > 0:
+                fits = remaining // size
+                per_batch = max(limit // size, 1)  # Oversized tasks get a batch each
+            else:
+                fits = np.full(len(candidates), run, dtype=np.int64)
+                per_batch = run
+            taken = np.clip(run - (np.cumsum(fits) - fits), 0, fits)
+            touched = int(np.count_nonzero(taken))  # A prefix of the candidates
+            taken = taken[:touched]
+            touched_indices = candidates[:touched] % count
+            placed = int(taken.sum())
+            assignment[start:start + placed] = np.repeat(touched_indices, taken)
+            left = run - placed
+            assignment[start + placed:stop] = batch_count + np.arange(left) // per_batch
+            opened = -(-left // per_batch)
+            filled = np.full(opened, per_batch, dtype=np.int64)
+            if opened:
+                filled[-1] = left - per_batch * (opened - 1)
+            # Re-insert the batches that still have space under their new keys; full ones close
+            changed = np.r_[remaining[:touched] - taken * size, limit - filled * size]
+            keys = changed * count + np.r_[touched_indices, np.arange(batch_count, batch_count + opened)]
+            keys = np.sort(keys[changed > 0])
+            batch_count += opened
+            rest = np.r_[open_keys[:position], open_keys[position + touched:]]
+            open_keys = np.insert(rest, np.searchsorted(rest, keys), keys)
+        return assignment
 
-    def test_homogeneous_batch_creation(self):
-        # Test that batches contain only homogeneous tasks
-        heterogeneous_tasks = [Task(task_id=i, task_type='type_A' if i % 2 == 0 else 'type_B', data_size=i) for i in range(1, 10)]
-        self.batching.create_batch(heterogeneous_tasks)
-        for batch_type, batch in self.batching.batches:
-            self.assertTrue(all(task.task_type == batch_type for task in batch), f"All tasks in the batch should be of type {batch_type}")
-
-    def test_batch_size_limit(self):
-        # Test that no batch exceeds the maximum size limit
-        tasks = [Task(task_id=i, task_type='data_processing', data_size=10) for i in range(20)]
-        self.batching.create_batch(tasks)
-        for _, batch in self.batching.batches:
-            total_size = sum(task.data_size for task in batch)
-            self.assertLessEqual(total_size, self.batching.max_batch_size, "Batch size should not exceed the maximum limit")
-
-    def test_individual_attention_task_processing(self):
-        # Test that attention tasks are executed individually
-        tasks = [Task(task_id=i, task_type='attention', data_size=30) for i in range(5)]
-        self.batching.create_batch(tasks)
-        self.assertEqual(len(self.batching.batches), len(tasks), "Each attention task should be in its own batch")
+    def _create_from_table(self, table, mode):
+        """Form batches as index ranges into a TaskTable. Returns the total size of each batch created."""
+        if not len(table):
+            return []
+        sizes = table.data_sizes
+        codes = table.type_codes
+        if mode == STREAMING:
+            order = np.arange(len(table))
+            bounds = self._greedy_bounds(sizes, codes)
+        else:
+            # Group by type (codes follow first appearance), largest first within each type
+            order = np.lexsort((-sizes, codes))
+            ordered_codes = codes[order]
+            type_starts = np.flatnonzero(np.r_[True, ordered_codes[1:] != ordered_codes[:-1]])
+            batch_ids = np.empty(len(order), dtype=np.int64)
+            offset = 0
+            for start, stop in zip(type_starts.tolist(), np.r_[type_starts[1:], len(order)].tolist()):
+                assignment = self._best_fit_runs(sizes[order[start:stop]])
+                batch_ids[start:stop] = assignment + offset
+                offset += int(assignment.max()) + 1
+            regroup = np.argsort(batch_ids, kind="stable")
+            order = order[regroup]
+            batch_ids = batch_ids[regroup]
+            bounds = np.r_[np.flatnonzero(np.r_[True, batch_ids[1:] != batch_ids[:-1]]), len(order)]
+
+        # Totals for every batch come from one vectorised reduction over the reordered sizes
+        totals = np.add.reduceat(sizes[order], bounds[:-1])
+        first_codes = codes[order[bounds[:-1]]].tolist()
+        type_names = table.type_names
+        self.batches.extend(
+            (type_names[code], TaskBatch(table, order, start, stop, total))
+            for code, start, stop, total in zip(first_codes, bounds[:-1].tolist(), bounds[1:].tolist(), totals.tolist())
+        )
+        return totals
+
+    def _greedy_bounds(self, sizes, codes):
+        """
+        Streaming cut points for rows in table order: a batch ends where the type changes or
+        where the running total would exceed max_batch_size. The end of a batch starting at
+        every row is found with one vectorised searchsorted; the cut points are then read off
+        by following that jump table from row 0.
+        """
+        count = len(sizes)
+        positions = np.arange(count)
+        run_starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        run_ends = np.repeat(np.r_[run_starts[1:], count], np.diff(np.r_[run_starts, count]))
+        cumulative = np.cumsum(sizes)
+        before = cumulative - sizes
+        jumps = np.searchsorted(cumulative, before + self.max_batch_size, side="right")
+        # An oversized task still forms a batch of its own, and no batch crosses a type change
+        jumps = np.minimum(np.maximum(jumps, positions + 1), run_ends).tolist()
+        bounds = [0]
+        position = 0
+        while position < count:
+            position = jumps[position]
+            bounds.append(position)
+        return np.asarray(bounds)
+
+    def batch_totals(self):
+        """Summed data_size of each batch, in the same order as self.batches."""
+        return self._totals(self.batches)
+
+    @staticmethod
+    def _totals(batches):
+        return [batch.total_size() if isinstance(batch, TaskBatch) else sum(task.data_size for task in batch)
+                for _, batch in batches]
+
+    def fill_ratios(self):
+        """Fraction of max_batch_size used by each batch, in the same order as self.batches."""
+        return [total / self.max_batch_size for total in self.batch_totals()]
 
     def execute_batches(self):
         """
         Execute each batch of tasks. Attention tasks are executed individually while 
         other task types are processed in batches.
         """
-        for batch_type, batch in self.batches:
-            if batch_type == "attention":
-                # Attention tasks are executed individually
-                for task in batch:
-                    self.execute_task(task)
-            else:
-                # Non-attention tasks can be batch-processed
-                self.process_batch(batch)
+        with BATCHING_SECONDS.time(operation="execute"):
+            for batch_type, batch in self.batches:
+                self._execute_batch(batch_type, batch)
+
+    def _execute_batch(self, batch_type, batch):
+        """Run one batch and return its result (a list of per-task results for attention batches)."""
+        if batch_type == "attention":
+            # Attention tasks are executed individually
+            return [self.execute_task(task) for task in batch]
+        # Non-attention tasks can be batch-processed
+        return self.process_batch(batch)
+
+    async def execute_batches_async(self, max_workers=4, lane_limits=None):
+        """
+        Execute all batches concurrently and yield (batch_type, batch, result) tuples as each
+        batch completes. Work runs on a pool of max_workers threads. lane_limits maps a task type
+        to the most batches of that type allowed to run at once; types not listed may use the
+        whole pool, except attention, which defaults to a quarter of it.
+        """
+        limits = {"attention": max(1, max_workers // 4), **(lane_limits or {})}
+        lanes = {}
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        async def run(batch_type, batch):
+            lane = lanes.get(batch_type)
+            if lane is None:
+                lane = lanes[batch_type] = asyncio.Semaphore(limits.get(batch_type, max_workers))
+            async with lane:
+                result = await loop.run_in_executor(executor, self._execute_batch, batch_type, batch)
+            return batch_type, batch, result
+
+        pending = [asyncio.ensure_future(run(batch_type, batch)) for batch_type, batch in self.batches]
+        try:
+            for completed in asyncio.as_completed(pending):
+                yield await completed
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def execute_batches_parallel(self, max_workers=4, lane_limits=None):
+        """Synchronous wrapper around execute_batches_async. Returns results in completion order."""
+        async def collect():
+            return [result async for result in self.execute_batches_async(max_workers, lane_limits)]
+        return asyncio.run(collect())
 
     def execute_task(self, task):
         """
@@ -102,6 +366,76 @@ class SelectiveBatching:
         """
         print(f"Processing batch of {len(batch)} {batch[0].task_type} tasks.")
 
+class ContinuousBatching(SelectiveBatching):
+    """
+    Iteration-level batching engine. Requests are admitted first-come first-served while
+    their summed data_size fits in max_batch_size. Every iteration runs non-attention work
+    batched per task type and attention work per request, as execute_batches does.
+    """
+
+    def __init__(self, max_batch_size=40):
+        super().__init__(max_batch_size)
+        self.waiting = deque()  # Requests queued for admission
+        self.running = []  # Requests in the current running batch
+        self.running_size = 0
+        self.iteration = 0
+        self._remaining = {}  # id(task) -> iterations left
+
+    def submit(self, task):
+        """Queue a request; it joins the running batch at the next iteration boundary with room for it."""
+        self.waiting.append(task)
+
+    def _admit(self):
+        # Stop at the first request that does not fit so arrival order is preserved
+        while self.waiting:
+            task = self.waiting[0]
+            # An oversized request is admitted alone rather than blocking the queue forever
+            if self.running and self.running_size + task.data_size > self.max_batch_size:
+                break
+            self.waiting.popleft()
+            self.running.append(task)
+            self.running_size += task.data_size
+            self._remaining[id(task)] = max(task.iterations, 1)
+
+    def step(self):
+        """Admit queued requests, run one iteration of the running batch and return the requests that finished."""
+        self._admit()
+        if not self.running:
+            return []
+        self.iteration += 1
+
+        by_type = defaultdict(list)
+        for task in self.running:
+            if task.task_type == "attention":
+                # Attention work is executed individually per request
+                self.execute_task(task)
+            else:
+                by_type[task.task_type].append(task)
+        for batch in by_type.values():
+            self.process_batch(batch)
+
+        finished = []
+        still_running = []
+        for task in self.running:
+            self._remaining[id(task)] -= 1
+            if self._remaining[id(task)] == 0:
+                del self._remaining[id(task)]
+                self.running_size -= task.data_size
+                finished.append(task)
+            else:
+                still_running.append(task)
+        self.running = still_running
+        return finished
+
+    def run(self, tasks=()):
+        """Submit tasks and iterate until every request has finished. Returns requests in completion order."""
+        for task in tasks:
+            self.submit(task)
+        finished = []
+        while self.running or self.waiting:
+            finished.extend(self.step())
+        return finished
+
 # Example usage
 if __name__ == "__main__":
     # Define a list of tasks including both attention and non-attention types
@@ -117,3 +451,8 @@ if __name__ == "__main__":
 
     # Execute the created batches
     batching_system.execute_batches()
+
+    # Run mixed-length inference requests with iteration-level scheduling
+    engine = ContinuousBatching()
+    engine.run([Task("model_inference", 20, task_id=1, iterations=3), Task("model_inference", 20, task_id=2),
+                Task("attention", 10, task_id=3, iterations=2), Task("model_inference", 10, task_id=4)])
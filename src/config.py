@@ -0,0 +1,38 @@
+"""
+config.py
+
+Loads the application configuration (config/app_config.yml) shared by the data processing pipeline and the model
+server. The EARTHAI_CONFIG environment variable overrides the default location, e.g. for a ConfigMap mounted into
+the pod.
+
+Relative file paths in the settings listed in PATH_SETTINGS are resolved against the directory of the configuration
+file, so they point at the same files whatever the working directory of the process is.
+"""
+
+import os
+
+import yaml
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "config", "app_config.yml")
+# Settings that hold file paths, as key paths into the configuration
+PATH_SETTINGS = (("data_processing", "preprocessing", "stats_path"), ("model", "weights_path"))
+
+
+def load_config(path=None):
+    """Read the YAML configuration and return it as a dict, with relative file paths resolved."""
+    path = path or os.environ.get("EARTHAI_CONFIG", DEFAULT_CONFIG_PATH)
+    with open(path) as config_file:
+        config = yaml.safe_load(config_file) or {}
+    return resolve_paths(config, os.path.dirname(os.path.abspath(path)))
+
+
+def resolve_paths(config, base_directory):
+    """Make the relative paths of PATH_SETTINGS in config absolute, relative to base_directory. Returns config."""
+    for keys in PATH_SETTINGS:
+        section = config
+        for key in keys[:-1]:
+            section = section.get(key) if isinstance(section, dict) else None
+        value = section.get(keys[-1]) if isinstance(section, dict) else None
+        if isinstance(value, str) and not os.path.isabs(value):
+            section[keys[-1]] = os.path.normpath(os.path.join(base_directory, value))
+    return config
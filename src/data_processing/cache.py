@@ -0,0 +1,179 @@
+# cache.py
+
+"""
+This module provides PipelineCache, an on-disk cache for the output of the DataProcessingPipeline stages. Re-running
+the pipeline for a model experiment usually re-parses and re-cleans exactly the same input with exactly the same
+settings; with the cache, the second run maps the previous result back in instead.
+
+Entries are content addressed. The key of a stage's output is a hash of the stage name, a fingerprint of the input
+files and the configuration of that stage and every stage before it. Editing the input, or any setting a stage
+depends on, therefore changes the key, and stale entries are never returned. They simply age out.
+
+Storage is columnar: each entry is a directory holding one .npy file per column plus the index, and a small JSON
+manifest. Numeric columns are loaded back with np.load(mmap_mode="r") and wrapped into a DataFrame without copying,
+so a cache hit costs a few page faults rather than a parse. Object columns are pickled inside their .npy file and
+are loaded eagerly.
+
+The cache is bounded by max_bytes. An entry's manifest modification time records when it was last used, and after
+every write the least recently used entries are removed until the total fits again. invalidate(stage) drops every
+entry of one stage (or of all stages), forcing that stage to be recomputed on the next run.
+
+Entries are written to a temporary directory and renamed into place, so a reader never sees a partial entry and
+several pipeline processes can share one cache directory.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+_MANIFEST = "manifest.json"
+
+
+class PipelineCache:
+    def __init__(self, directory, max_bytes=10 << 30, hash_content=False):
+        """
+        Initialize the cache in the given directory. max_bytes bounds its total size. By default
+        input files are fingerprinted by name, size and modification time; hash_content hashes
+        their bytes instead, which survives copies and touches at the cost of reading the input.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hash_content = hash_content
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def fingerprint(self, paths):
+        """A digest identifying the current contents of the input files."""
+        return fingerprint_files(paths, self.hash_content)
+
+    @staticmethod
+    def key(stage, fingerprint, config):
+        """The content address of a stage's output for the given input fingerprint and configuration."""
+        description = json.dumps({"stage": stage, "input": fingerprint, "config": config}, sort_keys=True, default=repr)
+        return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, stage, key):
+        return os.path.join(self.directory, stage, key)
+
+    def get(self, stage, key):
+        """
+        Return the cached DataFrame for a stage output, memory-mapped where possible, or None
+        when the entry is missing or was removed while it was being loaded.
+        """
+        path = self._entry_path(stage, key)
+        manifest_path = os.path.join(path, _MANIFEST)
+        try:
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            os.utime(manifest_path)  # Mark as most recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:
+            columns = {name: _load_column(os.path.join(path, f"{position}.npy"))
+                       for position, name in enumerate(manifest["columns"])}
+            index = pd.Index(_load_column(os.path.join(path, "index.npy")), name=manifest["index_name"])
+        except OSError as error:
+            # Evicted by another process after the manifest was read; drop what is left and recompute
+            logging.warning(f"Pipeline cache entry {path} disappeared while loading ({error}); treating it as a miss.")
+            shutil.rmtree(path, ignore_errors=True)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pd.DataFrame(columns, index=index, columns=manifest["columns"], copy=False)
+
+    def put(self, stage, key, frame):
+        """Store a stage output, then evict least recently used entries beyond max_bytes."""
+        path = self._entry_path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(path))
+        try:
+            for position, name in enumerate(frame.columns):
+                _save_column(os.path.join(staging, f"{position}.npy"), frame[name].to_numpy())
+            _save_column(os.path.join(staging, "index.npy"), frame.index.to_numpy())
+            with open(os.path.join(staging, _MANIFEST), "w") as manifest_file:
+                json.dump({"columns": [str(name) for name in frame.columns], "index_name": frame.index.name,
+                           "created": time.time()}, manifest_file)
+            if os.path.exists(path):
+                shutil.rmtree(path, ignore_errors=True)
+            os.replace(staging, path)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict()
+
+    def entries(self):
+        """(last used, size in bytes, path) of every complete entry."""
+        found = []
+        for stage in os.listdir(self.directory):
+            stage_path = os.path.join(self.directory, stage)
+            if not os.path.isdir(stage_path):
+                continue
+            for key in os.listdir(stage_path):
+                path = os.path.join(stage_path, key)
+                try:
+                    last_used = os.stat(os.path.join(path, _MANIFEST)).st_mtime
+                except FileNotFoundError:
+                    continue  # Staging directory or entry being replaced
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+                found.append((last_used, size, path))
+        return found
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logging.info(f"Evicted pipeline cache entry {path} ({size} bytes).")
+
+    def invalidate(self, stage=None):
+        """Drop every entry of one stage, or of all stages when stage is None."""
+        stages = [stage] if stage is not None else os.listdir(self.directory)
+        for name in stages:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        logging.info(f"Invalidated pipeline cache stage(s) {stages}.")
+
+
+def fingerprint_files(paths, hash_content=False):
+    """
+    A digest of the input files by name, size and modification time, or by name, size and
+    content when hash_content is set.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}".encode("utf-8"))
+        if not hash_content:
+            digest.update(str(stat.st_mtime_ns).encode("utf-8"))
+            continue
+        with open(path, "rb") as source:
+            for block in iter(lambda: source.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_column(path, values):
+    np.save(path, values, allow_pickle=values.dtype.hasobject)
+
+
+def _load_column(path):
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # Object columns are pickled and cannot be memory-mapped
+        return np.load(path, allow_pickle=True)
@@ -0,0 +1,412 @@
+# granules.py
+
+"""
+This module provides a native reader for AIRS granules so the DataProcessingPipeline can load them directly instead
+of going through an intermediate CSV export. A granule typically holds hundreds of variables of which an analysis
+needs only a handful, so reading is lazy and projected:
+
+- Only the requested variables are touched, and each is sliced by dimension name (e.g. {"GeoTrack": slice(0, 45)})
+  before any data is read.
+- Variable data is memory-mapped rather than copied. Selecting a spatial or time slice is a view, and the operating
+  system pages in only the bytes that are actually used.
+- GranuleView defers all of this until first access: opening the file, building the per-variable arrays and finally
+  the DataFrame happen only when .arrays or .frame is first read, and each is cached afterwards.
+
+Two on-disk formats are supported, detected from the file's magic bytes:
+
+- NetCDF-3 classic and 64-bit offset files are parsed natively with NumPy, so no extra dependency is required.
+  Fixed-size and record (unlimited dimension) variables are both mapped without copying.
+- HDF5 files, which includes NetCDF-4 and HDF-EOS5 granules, are read through the optional h5py package. Contiguous,
+  uncompressed datasets are memory-mapped at their file offset; chunked or compressed datasets fall back to h5py's
+  own partial reads, which still only read the selected slice. HDF4 granules must be converted first.
+
+When a DataFrame is built, each variable becomes one column, flattened over the selected dimensions, so all projected
+variables must share the same selected shape. _FillValue entries become NaN (and are then removed by clean_data) and
+scale_factor/add_offset packing is applied.
+
+write_netcdf creates NetCDF-3 files from NumPy arrays and is used for test fixtures and small exports.
+"""
+
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+GRANULE_EXTENSIONS = (".nc", ".nc4", ".cdf", ".h5", ".hdf5", ".he5")
+
+_NC_DIMENSION = 10
+_NC_VARIABLE = 11
+_NC_ATTRIBUTE = 12
+_NC_TYPES = {1: np.dtype("i1"), 2: np.dtype("S1"), 3: np.dtype(">i2"), 4: np.dtype(">i4"),
+             5: np.dtype(">f4"), 6: np.dtype(">f8")}
+_NC_TYPE_CODES = {(dtype.kind, dtype.itemsize): code for code, dtype in _NC_TYPES.items()}
+_HDF5_MAGIC = b"\x89HDF\r\n\x1a\n"
+
+
+def is_granule(path):
+    """True if the path has one of the granule file extensions."""
+    return path.lower().endswith(GRANULE_EXTENSIONS)
+
+
+def open_granule(path):
+    """Open a granule with the backend matching its format."""
+    with open(path, "rb") as source:
+        magic = source.read(8)
+    if magic[:3] == b"CDF":
+        return NetCDF3Granule(path)
+    if magic == _HDF5_MAGIC:
+        return HDF5Granule(path)
+    raise ValueError(f"Unsupported granule format for {path}; expected NetCDF-3 or HDF5.")
+
+
+class Variable:
+    """Metadata of one granule variable."""
+
+    __slots__ = ("name", "dimensions", "shape", "dtype", "attributes")
+
+    def __init__(self, name, dimensions, shape, dtype, attributes):
+        self.name = name
+        self.dimensions = dimensions
+        self.shape = shape
+        self.dtype = dtype
+        self.attributes = attributes
+
+    def index(self, selection):
+        """
+        Translate a {dimension name: slice or int} selection into an index tuple for this variable.
+        Raises KeyError for selection keys that are not dimensions of the variable.
+        """
+        unknown = [dimension for dimension in selection if dimension not in self.dimensions]
+        if unknown:
+            raise KeyError(f"Selection dimensions {unknown} are not dimensions {self.dimensions} of {self.name}.")
+        return tuple(selection.get(dimension, slice(None)) for dimension in self.dimensions)
+
+
+class NetCDF3Granule:
+    """Parses the header of a NetCDF-3 file and exposes its variables as memory-mapped arrays."""
+
+    def __init__(self, path):
+        self.path = path
+        self._buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        self._offset = 0
+        self.dimensions = {}
+        self.attributes = {}
+        self.variables = {}
+        self._layout = {}  # Variable name -> (begin offset, is record variable)
+        self._parse_header()
+
+    def _read(self, fmt):
+        values = struct.unpack_from(fmt, self._buffer, self._offset)
+        self._offset += struct.calcsize(fmt)
+        return values[0] if len(values) == 1 else values
+
+    def _read_name(self):
+        length = self._read(">i")
+        name = bytes(self._buffer[self._offset:self._offset + length]).decode("utf-8")
+        self._offset += -(-length // 4) * 4  # Names are padded to a 4-byte boundary
+        return name
+
+    def _read_list_header(self, tag):
+        found, count = self._read(">ii")
+        if found not in (0, tag):
+            raise ValueError(f"Corrupt NetCDF header in {self.path}.")
+        return count
+
+    def _read_attributes(self):
+        attributes = {}
+        for _ in range(self._read_list_header(_NC_ATTRIBUTE)):
+            name = self._read_name()
+            nc_type, count = self._read(">ii")
+            dtype = _NC_TYPES[nc_type]
+            size = count * dtype.itemsize
+            raw = bytes(self._buffer[self._offset:self._offset + size])
+            self._offset += -(-size // 4) * 4
+            if nc_type == 2:
+                attributes[name] = raw.decode("utf-8").rstrip("\x00")
+            else:
+                values = np.frombuffer(raw, dtype=dtype).astype(dtype.newbyteorder("="))
+                attributes[name] = values[0] if count == 1 else values
+        return attributes
+
+    def _parse_header(self):
+        magic, version = bytes(self._buffer[:3]), int(self._buffer[3])
+        if magic != b"CDF" or version not in (1, 2):
+            raise ValueError(f"{self.path} is not a NetCDF-3 classic or 64-bit offset file.")
+        self._offset = 4
+        record_count = self._read(">I")
+        dimension_names = []
+        record_dimension = None
+        for _ in range(self._read_list_header(_NC_DIMENSION)):
+            name = self._read_name()
+            length = self._read(">i")
+            if length == 0:
+                record_dimension = name
+            dimension_names.append(name)
+            self.dimensions[name] = length
+        self.attributes = self._read_attributes()
+
+        offset_format = ">i" if version == 1 else ">q"
+        record_variables = []
+        for _ in range(self._read_list_header(_NC_VARIABLE)):
+            name = self._read_name()
+            dimension_ids = [self._read(">i") for _ in range(self._read(">i"))]
+            attributes = self._read_attributes()
+            nc_type, vsize = self._read(">ii")
+            begin = self._read(offset_format)
+            dimensions = tuple(dimension_names[dim_id] for dim_id in dimension_ids)
+            is_record = bool(dimensions) and dimensions[0] == record_dimension
+            shape = tuple(self.dimensions[dimension] for dimension in dimensions)
+            self.variables[name] = Variable(name, dimensions, shape, _NC_TYPES[nc_type], attributes)
+            self._layout[name] = (begin, is_record)
+            if is_record:
+                record_variables.append((name, vsize))
+
+        # Record variables are interleaved: record r of every record variable is stored together
+        if len(record_variables) == 1:
+            name = record_variables[0][0]
+            variable = self.variables[name]
+            self._record_size = int(np.prod(variable.shape[1:], dtype=np.int64)) * variable.dtype.itemsize
+        else:
+            self._record_size = sum(vsize for _, vsize in record_variables)
+        if record_variables:
+            if record_count == 0xFFFFFFFF:  # Streaming: the count was never written back
+                first_begin = min(self._layout[name][0] for name, _ in record_variables)
+                record_count = (len(self._buffer) - first_begin) // max(self._record_size, 1)
+            self.dimensions[record_dimension] = record_count
+            for name, _ in record_variables:
+                variable = self.variables[name]
+                variable.shape = (record_count,) + variable.shape[1:]
+
+    def array(self, name, selection=None):
+        """A read-only, memory-mapped view of a variable, optionally sliced by dimension name."""
+        variable = self.variables[name]
+        begin, is_record = self._layout[name]
+        item_strides = np.empty(variable.shape[1:] if is_record else variable.shape, dtype=variable.dtype).strides
+        if is_record:
+            strides = (self._record_size,) + item_strides
+        else:
+            strides = item_strides
+        view = np.ndarray(variable.shape, dtype=variable.dtype, buffer=self._buffer, offset=begin, strides=strides)
+        return view[variable.index(selection or {})]
+
+    def close(self):
+        self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class HDF5Granule:
+    """Exposes the datasets of an HDF5 (or NetCDF-4) file, memory-mapping the ones stored contiguously."""
+
+    def __init__(self, path):
+        try:
+            import h5py
+        except ImportError as error:
+            raise ImportError("Reading HDF5/NetCDF-4 granules requires the h5py package (pip install h5py).") from error
+        self.path = path
+        self._file = h5py.File(path, "r")
+        self.variables = {}
+        self._datasets = {}
+        self._file.visititems(self._register)
+        self.attributes = dict(self._file.attrs)
+
+    def _register(self, name, item):
+        if not hasattr(item, "shape") or not hasattr(item, "dtype"):
+            return
+        if item.is_scale and item.ndim == 1:
+            dimensions = (name.rsplit("/", 1)[-1],)  # A coordinate variable is its own dimension
+        else:
+            dimensions = tuple(_dimension_name(axis, dim) for axis, dim in enumerate(item.dims))
+        variable = Variable(name, dimensions, item.shape, item.dtype, dict(item.attrs))
+        # Expose both the full path and the bare name, as AIRS fields are usually addressed by the latter
+        self.variables[name] = variable
+        self.variables.setdefault(name.rsplit("/", 1)[-1], variable)
+        self._datasets[name] = item
+
+    def array(self, name, selection=None):
+        """
+        A view of a dataset sliced by dimension name: memory-mapped when the dataset is stored
+        contiguously and uncompressed, otherwise a partial read of just the selection.
+        """
+        variable = self.variables[name]
+        dataset = self._datasets[variable.name]
+        index = variable.index(selection or {})
+        offset = dataset.id.get_offset() if dataset.chunks is None and not dataset.compression else None
+        if offset is not None:
+            return np.memmap(self.path, dtype=dataset.dtype, mode="r", offset=offset, shape=dataset.shape)[index]
+        return dataset[index]
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _dimension_name(axis, dim):
+    """
+    The name of an HDF5 dimension: that of the dimension scale attached to it, as NetCDF-4 and HDF-EOS5
+    write them, else its label, else the phony_dim_N name the netCDF library gives unnamed dimensions.
+    """
+    if len(dim):
+        return dim[0].name.rsplit("/", 1)[-1]
+    return dim.label or f"phony_dim_{axis}"
+
+
+class GranuleView:
+    """
+    Lazy, projected access to one granule. Nothing is opened until .arrays or .frame is first
+    used; variables defaults to every variable in the file and selection to no slicing.
+    """
+
+    def __init__(self, path, variables=None, selection=None):
+        self.path = path
+        self.variables = list(variables) if variables is not None else None
+        self.selection = dict(selection or {})
+        self._granule = None
+        self._arrays = None
+        self._frame = None
+
+    @property
+    def granule(self):
+        if self._granule is None:
+            self._granule = open_granule(self.path)
+        return self._granule
+
+    @property
+    def arrays(self):
+        """Memory-mapped views of the projected variables, keyed by name."""
+        if self._arrays is None:
+            names = self.variables if self.variables is not None else list(self.granule.variables)
+            missing = [name for name in names if name not in self.granule.variables]
+            if missing:
+                raise KeyError(f"Variables {missing} not found in granule {self.path}.")
+            self._arrays = {name: self.granule.array(name, self.selection) for name in names}
+        return self._arrays
+
+    @property
+    def frame(self):
+        """The projected variables as a DataFrame with one flattened column per variable."""
+        if self._frame is None:
+            self._frame = self._build_frame(self.arrays)
+        return self._frame
+
+    def iter_frames(self, rows):
+        """
+        Yield the projection as DataFrames of about rows rows, slicing along the first
+        dimension so that only one slab is decoded at a time.
+        """
+        arrays = self.arrays
+        if not arrays:
+            return
+        shape = self._common_shape(arrays)
+        if not shape:
+            yield self.frame
+            return
+        row_width = int(np.prod(shape[1:], dtype=np.int64))
+        step = max(1, rows // max(row_width, 1))
+        for start in range(0, shape[0], step):
+            yield self._build_frame({name: array[start:start + step] for name, array in arrays.items()})
+
+    def _common_shape(self, arrays):
+        shapes = {name: array.shape for name, array in arrays.items()}
+        if len(set(shapes.values())) > 1:
+            raise ValueError(f"Projected variables must share one shape to form a DataFrame, got {shapes}.")
+        return next(iter(shapes.values()))
+
+    def _build_frame(self, arrays):
+        if arrays:
+            self._common_shape(arrays)
+        columns = {name: _decode(self.granule.variables[name], array) for name, array in arrays.items()}
+        return pd.DataFrame(columns, copy=False)
+
+    def close(self):
+        if self._granule is not None:
+            self._granule.close()
+        self._granule = None
+        self._arrays = None
+
+
+def _decode(variable, array):
+    """Flatten a variable into a native-endian column, masking fill values and unpacking scale/offset."""
+    values = np.asarray(array).reshape(-1)
+    fill = variable.attributes.get("_FillValue")
+    scale = variable.attributes.get("scale_factor")
+    offset = variable.attributes.get("add_offset")
+    if fill is None and scale is None and offset is None:
+        return values.astype(values.dtype.newbyteorder("="))
+    column = values.astype(np.float64 if values.dtype.kind in "iu" else values.dtype.newbyteorder("="))
+    if fill is not None:
+        column[values == fill] = np.nan
+    if scale is not None:
+        column *= scale
+    if offset is not None:
+        column += offset
+    return column
+
+
+def write_netcdf(path, dimensions, variables, attributes=None):
+    """
+    Write a NetCDF-3 (64-bit offset) file. dimensions maps names to lengths and variables maps
+    names to (dimension names, ndarray, attributes) tuples. Record dimensions are not supported.
+    """
+
+    def name_bytes(name):
+        encoded = name.encode("utf-8")
+        return struct.pack(">i", len(encoded)) + encoded.ljust(-(-len(encoded) // 4) * 4, b"\x00")
+
+    def attribute_bytes(attrs):
+        if not attrs:
+            return struct.pack(">ii", 0, 0)
+        chunks = [struct.pack(">ii", _NC_ATTRIBUTE, len(attrs))]
+        for name, value in attrs.items():
+            if isinstance(value, str):
+                nc_type, raw, count = 2, value.encode("utf-8"), len(value.encode("utf-8"))
+            else:
+                value = np.atleast_1d(np.asarray(value))
+                nc_type = _NC_TYPE_CODES[(value.dtype.kind, value.dtype.itemsize)]
+                raw, count = value.astype(_NC_TYPES[nc_type]).tobytes(), value.size
+            padded = raw.ljust(-(-len(raw) // 4) * 4, b"\x00")
+            chunks.append(name_bytes(name) + struct.pack(">ii", nc_type, count) + padded)
+        return b"".join(chunks)
+
+    dimension_ids = {name: index for index, name in enumerate(dimensions)}
+    arrays = {}
+    for name, (dims, data, _) in variables.items():
+        data = np.asarray(data)
+        nc_type = _NC_TYPE_CODES[(data.dtype.kind, data.dtype.itemsize)]
+        if data.shape != tuple(dimensions[dim] for dim in dims):
+            raise ValueError(f"Variable {name} has shape {data.shape}, which does not match dimensions {dims}.")
+        arrays[name] = (nc_type, np.ascontiguousarray(data, dtype=_NC_TYPES[nc_type]).tobytes())
+
+    header = [b"CDF\x02", struct.pack(">I", 0)]
+    header.append(struct.pack(">ii", _NC_DIMENSION if dimensions else 0, len(dimensions)))
+    header.extend(name_bytes(name) + struct.pack(">i", length) for name, length in dimensions.items())
+    header.append(attribute_bytes(attributes))
+    header.append(struct.pack(">ii", _NC_VARIABLE if variables else 0, len(variables)))
+    entries = []
+    for name, (dims, _, attrs) in variables.items():
+        nc_type, raw = arrays[name]
+        entries.append(name_bytes(name) + struct.pack(">i", len(dims))
+                       + b"".join(struct.pack(">i", dimension_ids[dim]) for dim in dims)
+                       + attribute_bytes(attrs) + struct.pack(">ii", nc_type, -(-len(raw) // 4) * 4))
+    # Every entry ends with an 8-byte begin offset, so the header size is known before the offsets are
+    begin = sum(map(len, header)) + sum(len(entry) + 8 for entry in entries)
+    body = []
+    for entry, (nc_type, raw) in zip(entries, arrays.values()):
+        header.append(entry + struct.pack(">q", begin))
+        padded = raw.ljust(-(-len(raw) // 4) * 4, b"\x00")
+        body.append(padded)
+        begin += len(padded)
+    with open(path, "wb") as target:
+        target.write(b"".join(header))
+        target.write(b"".join(body))
+    return os.path.getsize(path)
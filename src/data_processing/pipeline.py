@@ -21,6 +21,43 @@ include:
 - run_pipeline: Orchestrates the execution of the data processing steps, offering a straightforward
   interface to run the entire pipeline.
 
+Streaming mode: when the pipeline is created with a chunksize, run_pipeline returns a generator instead of
+materialising the whole file. The input is read in fixed-size chunks with explicit dtypes, and each chunk is cleaned
+and transformed on its own before being yielded as a batch. Peak memory is therefore bounded by the chunk size
+rather than the file size, which keeps multi-GB AIRS dumps within the pod's memory limit, and the first batch can
+reach the model before the rest of the file has been read.
+
+Parallel mode: when the pipeline is created with workers, the input is split into independent parts and cleaned and
+transformed on a process pool so CPU-bound reprocessing uses every core of the pod. A directory input (e.g. the
+data_processing.data_path archive) yields one part per granule file. A single file is split into byte ranges of
+roughly chunk_bytes on line boundaries, and each worker parses its own range, so parsing is parallel as well.
+- Batches are yielded in input order regardless of which worker finishes first.
+- At most max_in_flight parts are being processed or waiting to be consumed at any time. A slow consumer therefore
+  stalls submission instead of letting finished parts pile up in memory.
+- Workers return numeric columns in shared memory blocks that the parent copies out and unlinks, rather than
+  pickling DataFrames through the pool's result pipe. Object columns fall back to pickling.
+Parallel batches carry a fresh RangeIndex, and the CSV parts must not contain quoted newlines.
+
+Granule input: besides CSV, the pipeline reads NetCDF and HDF5 granules natively through granules.GranuleView, in
+every mode. Only the variables listed in variables are read, sliced by the {dimension: slice} mapping in selection,
+and the arrays are memory-mapped instead of being copied out of the file.
+
+Caching: given a cache.PipelineCache, run_pipeline stores the cleaned and the transformed data on disk under a key
+derived from the input files' fingerprint and the configuration of each stage (stage_config). A re-run with the same
+input and settings maps the transformed result straight back in; a run that only changes transform settings
+recomputes only the transform stage. Use cache.invalidate(stage) to force a stage to be recomputed.
+
+Preprocessing: clean_data runs a preprocessing.Preprocessor, built from the data_processing.preprocessing section of
+app_config.yml unless one is passed in. It masks z-score outliers, standardises the numeric columns and drops
+incomplete rows in one vectorised pass. The statistics it needs are read from stats_path when that file was fitted
+on the same input files, load settings and columns (statistics_source), so a re-run does not hold back the first
+batch with a pass over the input. Otherwise they are fitted once over the whole input before any batch is cleaned,
+in a streaming pass over the chunks or merged from per-part statistics computed by the workers in parallel mode,
+and saved to stats_path for the model server and later runs. Call fit_preprocessing to refit them.
+
+Metrics: load, clean and batch durations and row counts are recorded in the metrics registry of the process running
+them (earthai_pipeline_stage_seconds, earthai_pipeline_rows_total). scripts/benchmark.py reports them per run.
+
 Example usage at the end of the script demonstrates initializing the pipeline with a path to
 the AIRS data and running the defined processing steps. This script serves as a foundational
 template for AIRS data preparation and can be tailored to meet specific project requirements or
@@ -32,65 +69,390 @@ batching process for parallel processing or distributed computing environments.
 """
 
 
+import io
+import logging
+import os
+from collections import deque
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
+from batching import Task as BatchTask
+from config import load_config
+from data_processing.cache import PipelineCache, fingerprint_files
+from data_processing.granules import GranuleView, is_granule
+from data_processing.preprocessing import Preprocessor
+from executors import SharedArray, hand_off, release_array, share_array, take_array
+from metrics import counter, histogram
+
+STAGE_SECONDS = histogram("earthai_pipeline_stage_seconds", "Time spent in each data processing stage.")
+STAGE_ROWS = counter("earthai_pipeline_rows_total", "Rows that passed through each data processing stage.")
 # Import other necessary libraries such as numpy, scipy, or custom modules as needed
 
 class DataProcessingPipeline:
-    def __init__(self, input_path):
+    def __init__(self, input_path, chunksize=None, dtype=None, workers=None, max_in_flight=None,
+                 chunk_bytes=64 << 20, variables=None, selection=None, cache=None, preprocessor=None):
         """
-        Initialize the DataProcessingPipeline with the path to the input data.
+        Initialize the DataProcessingPipeline with the path to the input data. A chunksize
+        (rows per chunk) enables streaming mode; dtype maps columns to explicit types so chunks
+        are parsed consistently without per-chunk type inference, and defaults to the
+        data_processing.dtypes mapping of app_config.yml. workers enables parallel mode,
+        with at most max_in_flight parts (default 2 per worker) of about chunk_bytes outstanding.
+        variables and selection project NetCDF/HDF5 granules onto a few variables and slices.
+        cache is an optional PipelineCache for the outputs of the clean and transform stages.
+        preprocessor configures clean_data; the default is the stage configured in app_config.yml,
+        as for from_config. Pass Preprocessor() to only drop rows with missing values.
         """
+        if dtype is None or preprocessor is None:
+            data_config = load_config().get("data_processing", {})
         self.input_path = input_path
+        self.chunksize = chunksize
+        self.dtype = data_config.get("dtypes") or {} if dtype is None else dtype
+        self.workers = workers
+        self.max_in_flight = max_in_flight or 2 * (workers or 1)
+        self.chunk_bytes = chunk_bytes
+        self.variables = variables
+        self.selection = selection
+        self.cache = cache
+        self.preprocessor = preprocessor or Preprocessor.from_config(data_config.get("preprocessing") or {})
+        self.data = None
+        self.features = None
+        self.feature_columns = None
+        self.batches = []
+
+    @classmethod
+    def from_config(cls, config=None, **options):
+        """
+        Create a pipeline from the data_processing section of the application configuration
+        (loaded from config/app_config.yml when not given). options override the constructor arguments.
+        """
+        config = load_config() if config is None else config
+        data_config = config.get("data_processing", {})
+        options.setdefault("input_path", data_config.get("data_path"))
+        options.setdefault("dtype", data_config.get("dtypes") or {})
+        options.setdefault("preprocessor", Preprocessor.from_config(data_config.get("preprocessing") or {}))
+        return cls(**options)
+
+    def __getstate__(self):
+        # Workers receive the configuration only, never a loaded dataset
+        state = self.__dict__.copy()
+        state["data"] = None
+        state["cache"] = None
+        state["features"] = None
+        state["batches"] = []
+        return state
+
+    def granule_paths(self):
+        """The input files: every CSV or granule file in sorted order for a directory, else the input path itself."""
+        if not os.path.isdir(self.input_path):
+            return [self.input_path]
+        return [os.path.join(self.input_path, name) for name in sorted(os.listdir(self.input_path))
+                if name.endswith(".csv") or is_granule(name)]
+
+    def granule_view(self, path):
+        """A lazy, projected view of a NetCDF/HDF5 granule."""
+        return GranuleView(path, variables=self.variables, selection=self.selection)
+
+    def read_file(self, path):
+        """Read one whole input file, CSV or granule, into a DataFrame."""
+        if is_granule(path):
+            return self.granule_view(path).frame
+        return pd.read_csv(path, dtype=self.dtype)
 
     def load_data(self):
         """
         Load AIRS data from the specified input path. Adapt this method based on
         the data format (e.g., HDF, CSV) and the specifics of the AIRS dataset.
         """
-        # Example for loading a CSV file, replace with actual code for loading AIRS data
-        self.data = pd.read_csv(self.input_path)
+        with STAGE_SECONDS.time(stage="load"):
+            self.data = self.read_file(self.input_path)
+        STAGE_ROWS.inc(len(self.data), stage="load")
         return self.data
 
-    def clean_data(self):
+    def iter_chunks(self):
+        """
+        Read the input lazily as DataFrames of at most chunksize rows. Only one chunk is held
+        in memory at a time.
+        """
+        for path in self.granule_paths():
+            if is_granule(path):
+                yield from self.granule_view(path).iter_frames(self.chunksize)
+                continue
+            with pd.read_csv(path, dtype=self.dtype, chunksize=self.chunksize) as reader:
+                yield from reader
+
+    def fit_preprocessing(self, data=None):
+        """
+        Fit the preprocessing statistics on data when given, else over the whole input: chunk
+        by chunk in streaming mode, or per part on the process pool in parallel mode. The
+        statistics are saved to the preprocessor's stats_path, tagged with the statistics_source
+        unless they were fitted on data other than the loaded input.
+        """
+        source = self.statistics_source() if data is None or data is self.data else None
+        if data is not None:
+            self.preprocessor.fit([data], source)
+        elif self.workers:
+            self.preprocessor.stats = None
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for stats in pool.map(_part_stats, repeat(self), self.partitions()):
+                    if self.preprocessor.stats is None:
+                        self.preprocessor.stats = stats
+                    elif stats is not None:
+                        self.preprocessor.stats.merge(stats)
+            if self.preprocessor.stats is not None:
+                self.preprocessor.stats.source = source
+            self.preprocessor.save()
+        elif self.chunksize:
+            self.preprocessor.fit(self.iter_chunks(), source)
+        else:
+            self.preprocessor.fit((self.read_file(path) for path in self.granule_paths()), source)
+        if self.preprocessor.stats is None:
+            logging.warning(f"No data in {self.input_path} to fit preprocessing statistics on.")
+        else:
+            logging.info(f"Fitted preprocessing statistics over {self.preprocessor.stats.columns}.")
+        return self.preprocessor.stats
+
+    def statistics_source(self):
+        """
+        A digest of what fitted statistics depend on: the input files (by name, size and
+        modification time), the load settings and the configured columns.
+        """
+        return PipelineCache.key("statistics", fingerprint_files(self.granule_paths()),
+                                 [self.stage_config()["load"], self.preprocessor.columns])
+
+    def _ensure_fitted(self, data=None):
+        if not self.preprocessor.needs_stats or self.preprocessor.stats is not None:
+            return
+        # Statistics saved by an earlier run over the same input are reused instead of refitting them
+        columns = None if data is None else self.preprocessor.numeric_columns(data)
+        if not self.preprocessor.load_saved(self.statistics_source(), columns):
+            self.fit_preprocessing(data)
+
+    def clean_data(self, data=None):
         """
         Perform data cleaning operations such as handling missing values,
-        removing outliers, and other necessary preprocessing steps.
+        removing outliers, and other necessary preprocessing steps. Operates on
+        self.data unless a chunk is passed in, and returns the cleaned frame.
+        Outlier masking and standardisation happen here too, fused into one pass.
         """
-        # Example cleaning steps
-        self.data.dropna(inplace=True)  # Remove missing values
-        # Include other data cleaning steps here
+        in_place = data is None
+        data = self.data if in_place else data
+        self._ensure_fitted(data)
+        with STAGE_SECONDS.time(stage="clean"):
+            data = self.preprocessor.apply(data)
+        STAGE_ROWS.inc(len(data), stage="clean")
+        if in_place:
+            self.data = data
+        return data
 
-    def transform_data(self):
+    def transform_data(self, data=None):
         """
         Apply transformations to the data to prepare it for analysis. This might
         include normalizing or standardizing data, feature extraction, and
-        converting data types.
+        converting data types. Operates on self.data unless a chunk is passed in,
+        and returns the transformed frame.
         """
+        data = self.data if data is None else data
         # Example transformation
-        # self.data['normalized_feature'] = (self.data['feature'] - self.data['feature'].mean()) / self.data['feature'].std()
+        # data['normalized_feature'] = (data['feature'] - data['feature'].mean()) / data['feature'].std()
         # Include other transformation steps here
+        return data
 
-    def prepare_batches(self, batch_size):
+    def prepare_batches(self, batch_size, as_tasks=False, task_type="model_inference", columns=None):
         """
-        Split the dataset into batches for processing. This method can leverage the
-        SelectiveBatching class for intelligent batching based on criteria such as data size.
+        Split the dataset into batches for processing. The feature columns (default: the numeric
+        columns) are converted once into one contiguous float32 array, self.features, and every
+        batch is a row-slice view of it, so batching copies no data. With as_tasks the views are
+        wrapped as batching.Task objects whose data_size is the batch's size in bytes, so that
+        SelectiveBatching.create_batch packs them by actual memory.
         """
-        # Placeholder for batch preparation logic
-        # Could involve iterating over self.data in chunks of batch_size
-        # and potentially using the SelectiveBatching class to group tasks
+        columns = self.preprocessor.numeric_columns(self.data) if columns is None else columns
+        self.feature_columns = list(columns)
+        with STAGE_SECONDS.time(stage="batch"):
+            self.features = np.ascontiguousarray(self.data[self.feature_columns].to_numpy(dtype=np.float32))
+            self.batches = [self.features[start:start + batch_size]
+                            for start in range(0, len(self.features), batch_size)]
+        STAGE_ROWS.inc(len(self.features), stage="batch")
+        if as_tasks:
+            self.batches = [BatchTask(task_type, view.nbytes, task_id=number, data=view)
+                            for number, view in enumerate(self.batches)]
+        return self.batches
+
+    def stream_batches(self):
+        """
+        Generator for streaming mode: read, clean and transform the input one chunk at a
+        time and yield each non-empty processed chunk as a batch.
+        """
+        self._ensure_fitted()
+        for chunk in self.iter_chunks():
+            chunk = self.transform_data(self.clean_data(chunk))
+            if len(chunk):
+                yield chunk
+
+    def partitions(self):
+        """
+        Split the input into independently processable parts (path, start, stop): a whole
+        file (start and stop None) per file of a directory or for a single granule, or byte
+        ranges of complete lines of a single CSV file.
+        """
+        if os.path.isdir(self.input_path) or is_granule(self.input_path):
+            return [(path, None, None) for path in self.granule_paths()]
+        size = os.path.getsize(self.input_path)
+        parts = []
+        with open(self.input_path, "rb") as source:
+            source.readline()  # Header
+            start = source.tell()
+            while start < size:
+                source.seek(min(start + self.chunk_bytes, size))
+                source.readline()  # Extend the range to the end of the line the boundary fell in
+                stop = source.tell()
+                parts.append((self.input_path, start, stop))
+                start = stop
+        return parts
+
+    def read_part(self, part):
+        """Parse one part produced by partitions() into a DataFrame."""
+        path, start, stop = part
+        if start is None:
+            return self.read_file(path)
+        with open(path, "rb") as source:
+            header = source.readline()
+            source.seek(start)
+            body = source.read(stop - start)
+        return pd.read_csv(io.BytesIO(header + body), dtype=self.dtype)
+
+    def parallel_batches(self):
+        """
+        Generator for parallel mode: clean and transform the parts on a process pool and
+        yield each non-empty processed part in input order.
+        """
+        self._ensure_fitted()
+        in_flight = deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                for part in self.partitions():
+                    # Backpressure: wait for the oldest part before taking on more work
+                    while len(in_flight) >= self.max_in_flight:
+                        batch = _import_frame(in_flight.popleft().result())
+                        if len(batch):
+                            yield batch
+                    in_flight.append(pool.submit(_process_part, self, part))
+                while in_flight:
+                    batch = _import_frame(in_flight.popleft().result())
+                    if len(batch):
+                        yield batch
+            finally:
+                # Reached on errors or when the consumer stops early; free any shared blocks already produced
+                for future in in_flight:
+                    if not future.cancel() and future.exception() is None:
+                        _release_frame(future.result())
+
+    def stage_config(self):
+        """
+        The settings each stage's output depends on, used to key cached results. Subclasses that
+        add settings to a stage should extend the corresponding entry.
+        """
+        return {
+            "load": {"pipeline": type(self).__qualname__, "dtype": self.dtype, "variables": self.variables,
+                     "selection": self.selection},
+            "clean": self.preprocessor.config(),
+            "transform": {},
+        }
+
+    def run_cached_stages(self):
+        """
+        Produce the transformed data through the cache: reuse the transformed output if present,
+        else the cleaned output, and store whatever had to be recomputed.
+        """
+        config = self.stage_config()
+        fingerprint = self.cache.fingerprint(self.granule_paths())
+        # Each stage's key covers its own settings and those of every earlier stage
+        clean_key = self.cache.key("clean", fingerprint, [config["load"], config["clean"]])
+        transform_key = self.cache.key("transform", fingerprint, [config["load"], config["clean"], config["transform"]])
+        data = self.cache.get("transform", transform_key)
+        if data is not None:
+            logging.info(f"Loaded transformed data for {self.input_path} from the pipeline cache.")
+            return data
+        data = self.cache.get("clean", clean_key)
+        if data is None:
+            data = self.clean_data(self.load_data())
+            self.cache.put("clean", clean_key, data)
+        data = self.transform_data(data)
+        self.cache.put("transform", transform_key, data)
+        return data
 
     def run_pipeline(self):
         """
         Execute the data processing pipeline: load, clean, transform, and batch the data.
+        In parallel mode (workers set) or streaming mode (chunksize set) this returns a
+        generator of processed batches.
         """
-        self.load_data()
-        self.clean_data()
-        self.transform_data()
+        if self.workers:
+            return self.parallel_batches()
+        if self.chunksize:
+            return self.stream_batches()
+        if self.cache is not None:
+            self.data = self.run_cached_stages()
+        else:
+            self.load_data()
+            self.clean_data()
+            self.transform_data()
         self.prepare_batches(batch_size=100)  # Example batch size, adjust as necessary
 
+
+def _process_part(pipeline, part):
+    """Process-pool entry point: read, clean and transform one part and export it."""
+    frame = pipeline.transform_data(pipeline.clean_data(pipeline.read_part(part)))
+    return _export_frame(frame)
+
+
+def _part_stats(pipeline, part):
+    """Process-pool entry point: preprocessing statistics of one part, for merging in the parent."""
+    preprocessor = pipeline.preprocessor
+    preprocessor.stats = None
+    preprocessor.partial_fit(pipeline.read_part(part))
+    return preprocessor.stats
+
+
+def _export_frame(frame):
+    """Move numeric columns into shared memory; only their handles travel back to the parent."""
+    columns = []
+    for name in frame.columns:
+        values = frame[name].to_numpy()
+        if values.dtype.hasobject:
+            columns.append(values)
+            continue
+        block, handle = share_array(np.ascontiguousarray(values))
+        hand_off(block)
+        columns.append(handle)
+    return list(frame.columns), columns
+
+
+def _import_frame(payload):
+    names, columns = payload
+    arrays = [take_array(column) if isinstance(column, SharedArray) else column for column in columns]
+    return pd.DataFrame(dict(zip(names, arrays)), columns=names, copy=False)
+
+
+def _release_frame(payload):
+    for column in payload[1]:
+        if isinstance(column, SharedArray):
+            release_array(column)
+
 # Example usage
 if __name__ == "__main__":
     pipeline = DataProcessingPipeline(input_path="path/to/your/AIRS/data")
     pipeline.run_pipeline()
+
+    # Streaming mode for files larger than memory: batches arrive as soon as each chunk is processed
+    streaming_pipeline = DataProcessingPipeline(input_path="path/to/your/AIRS/data", chunksize=100000)
+    for batch in streaming_pipeline.run_pipeline():
+        pass  # Hand each batch to the model
+
+    # Parallel mode for nightly reprocessing of an archive of granule files
+    parallel_pipeline = DataProcessingPipeline(input_path="path/to/our/AIRS/data", workers=os.cpu_count())
+    for batch in parallel_pipeline.run_pipeline():
+        pass  # Batches arrive in granule order
     # Further actions, such as saving the processed data or passing it to the model for inference, can be added here
 
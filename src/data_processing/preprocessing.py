@@ -0,0 +1,274 @@
+# preprocessing.py
+
+"""
+This module implements the preprocessing stage of the DataProcessingPipeline, driven by the data_processing.
+preprocessing section of config/app_config.yml:
+
+- clean_missing: Drop rows that contain missing values (after outlier masking, see below).
+- outlier_threshold: Mask values whose absolute z-score exceeds this threshold by setting them to NaN.
+- standardize: Replace every numeric column by its z-score.
+- stats_path: Where the fitted statistics are saved, so the model server standardises inference inputs with exactly
+  the statistics the training data was processed with instead of recomputing them. The file records the source the
+  statistics were fitted on, a digest of the input files and load settings. Pipeline runs reuse it (load_saved) only
+  for the same source and columns, and fit the statistics afresh otherwise.
+
+RunningStats accumulates per-column count, mean and sum of squared deviations with the batched form of Welford's
+algorithm (Chan et al.): each chunk's statistics are computed with whole-array NumPy reductions and merged into the
+running totals. The result does not depend on how the data was chunked, so statistics fitted in streaming mode or
+merged from parallel workers match those of a single in-memory pass. Missing values are ignored per column.
+
+Preprocessor.apply works on whole numeric blocks rather than column by column. The numeric columns are grouped by
+dtype, as pandas groups them internally, and each group is extracted once as a 2-D array. Centring, scaling, the
+outlier test and the masking are then in-place ufunc calls over that array, with broadcasting over columns. float32
+data therefore stays float32. The extraction is the only copy made, plus one scratch array for the z-scores when
+outliers are masked without standardising.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from config import load_config
+
+
+class RunningStats:
+    """Streaming per-column count, mean and variance."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.count = np.zeros(len(self.columns), dtype=np.int64)
+        self.mean = np.zeros(len(self.columns), dtype=np.float64)
+        self.m2 = np.zeros(len(self.columns), dtype=np.float64)  # Sum of squared deviations from the mean
+        self.source = None  # Digest of the input the statistics were fitted on, if known
+
+    def update(self, block):
+        """Fold a (rows, columns) block into the statistics, ignoring NaN entries."""
+        block = np.asarray(block, dtype=np.float64)
+        count = np.count_nonzero(~np.isnan(block), axis=0)
+        if not count.any():
+            return self
+        mean = np.nansum(block, axis=0) / np.maximum(count, 1)
+        deviations = block - mean
+        m2 = np.nansum(np.square(deviations, out=deviations), axis=0)
+        self._combine(count, mean, m2)
+        return self
+
+    def merge(self, other):
+        """Fold in statistics accumulated separately over other rows of the same columns."""
+        if other.columns != self.columns:
+            raise ValueError(f"Cannot merge statistics over {other.columns} into statistics over {self.columns}.")
+        self._combine(other.count, other.mean, other.m2)
+        return self
+
+    def _combine(self, count, mean, m2):
+        total = self.count + count
+        weight = count / np.maximum(total, 1)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta * delta * self.count * weight
+        self.count = total
+
+    @property
+    def std(self):
+        """Sample standard deviation per column (ddof=1, as pandas uses)."""
+        return np.sqrt(self.m2 / np.maximum(self.count - 1, 1))
+
+    def digest(self):
+        """A digest of the columns and their count, mean and M2, identifying these statistics exactly."""
+        digest = hashlib.sha256(json.dumps(self.columns).encode("utf-8"))
+        for values in (self.count, self.mean, self.m2):
+            digest.update(np.ascontiguousarray(values).tobytes())
+        return digest.hexdigest()
+
+    def to_dict(self):
+        return {"columns": self.columns, "count": self.count.tolist(), "mean": self.mean.tolist(),
+                "m2": self.m2.tolist(), "source": self.source}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls(state["columns"])
+        stats.count = np.asarray(state["count"], dtype=np.int64)
+        stats.mean = np.asarray(state["mean"], dtype=np.float64)
+        stats.m2 = np.asarray(state["m2"], dtype=np.float64)
+        stats.source = state.get("source")
+        return stats
+
+    def save(self, path):
+        """Write the statistics as JSON, atomically."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as stats_file:
+            json.dump(self.to_dict(), stats_file)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as stats_file:
+            return cls.from_dict(json.load(stats_file))
+
+
+class Preprocessor:
+    def __init__(self, clean_missing=True, outlier_threshold=None, standardize=False, columns=None, stats_path=None,
+                 stats=None):
+        """
+        Initialize the preprocessing stage. columns restricts the statistics to the given numeric
+        columns (default: every numeric column). stats may carry previously fitted RunningStats.
+        The defaults only drop incomplete rows; use from_config() for the configured stage.
+        """
+        self.clean_missing = clean_missing
+        self.outlier_threshold = outlier_threshold
+        self.standardize = standardize
+        self.columns = columns
+        self.stats_path = stats_path
+        self.stats = stats
+
+    @classmethod
+    def from_config(cls, preprocessing=None):
+        """
+        Build the stage from the data_processing.preprocessing section of app_config.yml, read
+        from the configuration file when not given.
+        """
+        if preprocessing is None:
+            preprocessing = load_config().get("data_processing", {}).get("preprocessing")
+        preprocessing = dict(preprocessing or {})
+        return cls(**{key: preprocessing[key] for key in
+                      ("clean_missing", "outlier_threshold", "standardize", "columns", "stats_path")
+                      if key in preprocessing})
+
+    @classmethod
+    def load(cls, stats_path, **options):
+        """A stage using the statistics saved at stats_path, e.g. for inference in the server."""
+        return cls(stats=RunningStats.load(stats_path), stats_path=stats_path, **options)
+
+    @property
+    def needs_stats(self):
+        return self.outlier_threshold is not None or self.standardize
+
+    def config(self):
+        """
+        The settings and fitted statistics that determine the stage's output, for cache keys.
+        Statistics not fitted yet are None: they will be fitted on the very input being cleaned.
+        """
+        stats = self.stats.digest() if self.needs_stats and self.stats is not None else None
+        return {"clean_missing": self.clean_missing, "outlier_threshold": self.outlier_threshold,
+                "standardize": self.standardize, "columns": self.columns, "stats": stats}
+
+    def numeric_columns(self, frame):
+        if self.columns is not None:
+            return list(self.columns)
+        return [name for name, dtype in frame.dtypes.items() if dtype.kind in "iuf"]
+
+    def partial_fit(self, frame):
+        """Fold one frame (or chunk) into the statistics."""
+        if self.stats is None:
+            self.stats = RunningStats(self.numeric_columns(frame))
+        self.stats.update(frame[self.stats.columns].to_numpy(dtype=np.float64))
+        return self
+
+    def fit(self, frames, source=None):
+        """
+        Fit the statistics over an iterable of frames and save them, recording source as the
+        input they were fitted on, if a stats_path is set.
+        """
+        self.stats = None
+        for frame in frames:
+            self.partial_fit(frame)
+        if self.stats is not None:
+            self.stats.source = source
+        self.save()
+        return self
+
+    def load_saved(self, source, columns=None):
+        """
+        Load the statistics saved at stats_path if they were fitted on source and over the
+        expected columns: the configured columns, else columns when given. Returns whether
+        they were loaded; statistics fitted on other input or columns are left for a refit.
+        """
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return False
+        stats = RunningStats.load(self.stats_path)
+        expected = list(self.columns) if self.columns is not None else columns
+        if stats.source is None or stats.source != source:
+            logging.info(f"Statistics at {self.stats_path} were fitted on other input; refitting them.")
+            return False
+        if expected is not None and list(expected) != stats.columns:
+            logging.info(f"Statistics at {self.stats_path} cover {stats.columns}, not {list(expected)}; "
+                         f"refitting them.")
+            return False
+        self.stats = stats
+        logging.info(f"Loaded preprocessing statistics from {self.stats_path}.")
+        return True
+
+    def save(self):
+        if self.stats is not None and self.stats_path:
+            self.stats.save(self.stats_path)
+
+    def _scales(self):
+        # Constant columns keep a scale of 1 so they standardise to zero instead of NaN
+        std = self.stats.std
+        return self.stats.mean, 1.0 / np.where(std > 0, std, 1.0)
+
+    def standardize_array(self, block):
+        """Standardise a (rows, columns) block in stats column order, in place when it is a float array."""
+        if block.shape[-1] != len(self.stats.columns):
+            raise ValueError(f"Expected {len(self.stats.columns)} columns {self.stats.columns}, got {block.shape[-1]}.")
+        mean, inverse_std = self._scales()
+        if block.dtype.kind != "f":
+            block = block.astype(np.float64)
+        block -= mean.astype(block.dtype)
+        block *= inverse_std.astype(block.dtype)
+        return block
+
+    def check_columns(self, frame):
+        """
+        Raise ValueError unless the frame has exactly the numeric columns the statistics were
+        fitted on (or, with configured columns, at least those), naming the mismatched columns.
+        """
+        missing = [name for name in self.stats.columns if name not in frame.columns]
+        unfitted = [] if self.columns is not None else [
+            name for name in self.numeric_columns(frame) if name not in self.stats.columns]
+        if missing or unfitted:
+            raise ValueError(f"Frame columns do not match the fitted statistics: missing from the frame {missing}, "
+                             f"not in the statistics {unfitted}.")
+
+    def apply(self, frame):
+        """
+        Mask outliers, standardise and drop incomplete rows as configured. Returns a new frame;
+        the input is left untouched. Raises ValueError if the frame's columns do not match the
+        fitted statistics, rather than passing some columns through on their raw scale.
+        """
+        if self.needs_stats and self.stats is None:
+            raise ValueError("Preprocessor statistics must be fitted before they can be applied.")
+        result = frame.copy(deep=False)
+        if self.needs_stats:
+            self.check_columns(frame)
+            mean, inverse_std = self._scales()
+            position = {name: index for index, name in enumerate(self.stats.columns)}
+            groups = {}
+            for name in self.stats.columns:
+                dtype = frame.dtypes[name]
+                groups.setdefault(dtype if dtype.kind == "f" else np.dtype(np.float64), []).append(name)
+            for dtype, group in groups.items():
+                indices = [position[name] for name in group]
+                block = frame[group].to_numpy(dtype=dtype, copy=True)
+                group_mean, group_scale = mean[indices].astype(dtype), inverse_std[indices].astype(dtype)
+                if self.standardize:
+                    block -= group_mean
+                    block *= group_scale
+                if self.outlier_threshold is not None:
+                    if self.standardize:
+                        scores = np.abs(block)
+                    else:
+                        scores = block - group_mean
+                        scores *= group_scale
+                        np.abs(scores, out=scores)
+                    block[scores > self.outlier_threshold] = np.nan
+                result[group] = block
+        if self.clean_missing:
+            result = result.dropna()
+        return result
@@ -0,0 +1,173 @@
+"""
+executors.py
+
+Pluggable execution backends for the DynamicTaskScheduler. Each task is routed to one of three backends:
+
+- thread: The default. Tasks run on a ThreadPoolExecutor, which suits I/O-bound work and numpy/pandas calls that
+  release the GIL.
+- process: CPU-bound, GIL-holding work (pandas/numpy transforms on AIRS swaths) runs on a ProcessPoolExecutor so it
+  scales across the cores of the pod. Large numpy payloads are copied once into a multiprocessing SharedMemory block
+  and the worker maps them back as an ndarray view, instead of receiving a pickled copy through the task pipe.
+- inline: Trivial tasks run synchronously in the dispatching thread, avoiding the hand-off cost entirely.
+
+The backend is chosen from a per-task hint (Task.executor) or, failing that, a per-batch-key route configured on the
+ExecutorRouter. Tasks sent to the process backend must carry a picklable, module-level Task.func.
+"""
+
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+THREAD = "thread"
+PROCESS = "process"
+INLINE = "inline"
+BACKENDS = (THREAD, PROCESS, INLINE)
+
+
+class SharedArray:
+    """Picklable handle describing an ndarray that lives in a SharedMemory block."""
+
+    __slots__ = ("name", "shape", "dtype")
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+
+def share_array(array):
+    """
+    Copy an ndarray into a new SharedMemory block. Returns the block (owned by the caller,
+    who must close and unlink it) and the SharedArray handle to send to a worker.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    view[...] = array
+    del view
+    return block, SharedArray(block.name, array.shape, array.dtype.str)
+
+
+def hand_off(block):
+    """
+    Give up ownership of a block created in this process so another process can take it.
+    The block is closed here and this process's resource tracker will no longer unlink it
+    at exit; the receiver must take_array() or release_array() the handle.
+    """
+    resource_tracker.unregister(block._name, "shared_memory")
+    block.close()
+
+
+def take_array(handle):
+    """Copy a handed-off shared array into private memory, then close and unlink its block."""
+    block = shared_memory.SharedMemory(name=handle.name)
+    try:
+        view = np.ndarray(handle.shape, dtype=np.dtype(handle.dtype), buffer=block.buf)
+        array = view.copy()
+        del view
+    finally:
+        _release(block)
+    return array
+
+
+def release_array(handle):
+    """Discard a handed-off shared array without reading it."""
+    _release(shared_memory.SharedMemory(name=handle.name))
+
+
+def run_task_payload(func, data, execution_time):
+    """
+    Worker-side entry point for the process backend. Attaches shared-memory payloads,
+    calls func(data) (or simulates the task when func is None) and detaches again.
+    """
+    block = None
+    if isinstance(data, SharedArray):
+        block = shared_memory.SharedMemory(name=data.name)
+        data = np.ndarray(data.shape, dtype=np.dtype(data.dtype), buffer=block.buf)
+    try:
+        if func is None:
+            time.sleep(execution_time)  # Simulate task execution
+            return None
+        result = func(data)
+        # The block is released below, so results must not alias it
+        if block is not None and isinstance(result, np.ndarray) and np.shares_memory(result, data):
+            result = result.copy()
+        return result
+    finally:
+        if block is not None:
+            del data
+            block.close()
+
+
+class ExecutorRouter:
+    """Routes tasks to thread, process or inline execution based on per-task or per-batch-key hints."""
+
+    def __init__(self, max_workers=5, process_workers=None, routes=None, default_backend=THREAD,
+                 shared_memory_threshold=1 << 20):
+        for backend in [default_backend, *(routes or {}).values()]:
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown executor backend {backend!r}; expected one of {BACKENDS}.")
+        self.thread_pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.process_workers = process_workers or os.cpu_count() or 1
+        self.routes = dict(routes or {})  # Batch key -> backend name
+        self.default_backend = default_backend
+        self.shared_memory_threshold = shared_memory_threshold  # Minimum ndarray size in bytes sent via SharedMemory
+        self._process_pool = None
+
+    @property
+    def process_pool(self):
+        """The process pool is created on first use so thread-only deployments never fork."""
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._process_pool
+
+    def backend_for(self, task, batch_key=None):
+        """Resolve the backend for a task: its own hint first, then the route for its batch key."""
+        backend = getattr(task, "executor", None) or self.routes.get(batch_key, self.default_backend)
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown executor backend {backend!r} for task {task.task_id}.")
+        return backend
+
+    def submit(self, task, run_local, batch_key=None):
+        """
+        Start a task on its backend and return a Future. run_local(task) is used for the
+        thread and inline backends; the process backend runs task.func on task.data.
+        """
+        backend = self.backend_for(task, batch_key)
+        if backend == INLINE:
+            future = Future()
+            try:
+                future.set_result(run_local(task))
+            except BaseException as error:
+                future.set_exception(error)
+            return future
+        if backend == THREAD:
+            return self.thread_pool.submit(run_local, task)
+        return self._submit_process(task)
+
+    def _submit_process(self, task):
+        data, block = task.data, None
+        if isinstance(data, np.ndarray) and data.nbytes >= self.shared_memory_threshold:
+            block, data = share_array(np.ascontiguousarray(data))
+        try:
+            future = self.process_pool.submit(run_task_payload, task.func, data, task.execution_time)
+        except BaseException:
+            if block is not None:
+                _release(block)
+            raise
+        if block is not None:
+            future.add_done_callback(lambda _: _release(block))
+        return future
+
+    def shutdown(self, wait=True):
+        """Shut down every backend that was started."""
+        self.thread_pool.shutdown(wait=wait)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait)
+
+
+def _release(block):
+    block.close()
+    block.unlink()
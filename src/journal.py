@@ -0,0 +1,269 @@
+"""
+journal.py
+
+Durable write-ahead journal for the DynamicTaskScheduler. Every submit, start, complete and fail event is appended to
+an append-only log before the scheduler acts on it, so queued work survives a crash or a Kubernetes RollingUpdate.
+
+Design:
+- Records are framed as [length][crc32][pickle payload]. A torn or corrupt tail left behind by a crash is detected
+  and truncated on recovery instead of aborting it.
+- Every record is flushed to the OS as it is appended, so a crash of the process alone loses nothing. fsync is
+  batched (group commit): the log is synced once fsync_batch records have accumulated or fsync_interval seconds
+  have passed since the first unsynced record, whichever comes first. A background thread enforces the interval
+  when no further record arrives, so the tail of a burst is never left unsynced. sync() forces it, e.g. before
+  acknowledging work.
+- The journal tracks the set of pending tasks in memory. After snapshot_every records it writes a compacted snapshot
+  of just that set, atomically, and starts a new journal generation. The previous generation's log is then deleted.
+- Recovery loads the latest snapshot and replays only the journal tail of the same generation. Restart time is
+  therefore proportional to outstanding work plus at most snapshot_every records, not to total history.
+
+Tasks that had started but not completed when the process died are recovered as pending, so execution is
+at-least-once. Task payloads (data, func) must be picklable. Completed dependencies are pruned from pending tasks
+rather than remembered, so a task submitted after a restart cannot depend on a task that completed before it.
+"""
+
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+SUBMIT = "submit"
+START = "start"
+COMPLETE = "complete"
+FAIL = "fail"
+
+_HEADER = struct.Struct("<II")  # payload length, crc32 of payload
+_SNAPSHOT_FILE = "snapshot.pkl"
+
+
+class TaskJournal:
+    def __init__(self, directory, fsync_batch=256, fsync_interval=0.05, snapshot_every=100000):
+        self.directory = directory
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self.pending = {}  # task_id -> task state tuple, the set a snapshot would contain
+        self.generation = 0
+        self._completed = set()  # task_ids completed since the last snapshot, used to prune dependencies
+        self._file = None
+        self._unsynced = 0
+        self._first_unsynced = 0.0  # When the oldest unsynced record was appended
+        self._last_sync = time.monotonic()
+        self._records_since_snapshot = 0
+        # Re-entrant because _append may snapshot, and the scheduler calls in from several threads
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._syncer = None
+
+    @staticmethod
+    def task_state(task, dependencies=None):
+        """The persisted fields of a scheduler Task, optionally with only its still-unmet dependencies."""
+        if dependencies is None:
+            dependencies = task.dependencies
+        return (task.task_id, task.priority, task.execution_time, task.data, list(dependencies),
+                task.func, task.executor, dict(task.required_resources), task.data_size)
+
+    def _journal_path(self, generation):
+        return os.path.join(self.directory, f"journal-{generation}.log")
+
+    def _ensure_open(self):
+        if self._file is None:
+            self._load()
+
+    def _load(self):
+        """Rebuild the pending set from the snapshot and the journal tail, then open the log for appending."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.pending = {}
+        self.generation = 0
+        snapshot_path = os.path.join(self.directory, _SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "rb") as snapshot:
+                self.generation, columns = pickle.load(snapshot)
+            self.pending = _states_from_columns(columns)
+
+        self._completed = set()
+        journal_path = self._journal_path(self.generation)
+        replayed = 0
+        if os.path.exists(journal_path):
+            replayed = self._replay(journal_path)
+        self._prune_dependencies()
+        self._remove_stale_generations()
+
+        self._file = open(journal_path, "ab")
+        self._records_since_snapshot = replayed
+        self._unsynced = 0
+        if self._syncer is None or not self._syncer.is_alive():
+            self._syncer = threading.Thread(target=self._sync_loop, name="journal-sync", daemon=True)
+            self._syncer.start()
+        logging.info(f"Journal recovered {len(self.pending)} pending task(s), replayed {replayed} record(s).")
+
+    def _replay(self, path):
+        """Apply every intact record in the log and truncate anything after the first torn one."""
+        with open(path, "rb") as log:
+            buffer = log.read()
+        offset = 0
+        count = 0
+        while offset + _HEADER.size <= len(buffer):
+            length, checksum = _HEADER.unpack_from(buffer, offset)
+            start = offset + _HEADER.size
+            payload = buffer[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            self._apply(pickle.loads(payload))
+            offset = start + length
+            count += 1
+        if offset < len(buffer):
+            logging.warning(f"Truncating {len(buffer) - offset} byte(s) of torn journal tail in {path}.")
+            with open(path, "r+b") as log:
+                log.truncate(offset)
+        return count
+
+    def _apply(self, record):
+        event, value = record
+        if event == SUBMIT:
+            self.pending[value[0]] = value
+        elif event == COMPLETE:
+            self.pending.pop(value, None)
+            self._completed.add(value)
+        elif event == FAIL:
+            self.pending.pop(value, None)
+        # START records are informational: a started task stays pending until it completes
+
+    def _prune_dependencies(self):
+        """Drop dependencies that completed, so snapshots never need the full completion history."""
+        if not self._completed:
+            return
+        for task_id, state in self.pending.items():
+            dependencies = state[4]
+            if any(dep in self._completed for dep in dependencies):
+                remaining = [dep for dep in dependencies if dep not in self._completed]
+                self.pending[task_id] = state[:4] + (remaining,) + state[5:]
+        self._completed = set()
+
+    def _remove_stale_generations(self):
+        current = os.path.basename(self._journal_path(self.generation))
+        for name in os.listdir(self.directory):
+            if name.startswith("journal-") and name.endswith(".log") and name != current:
+                os.remove(os.path.join(self.directory, name))
+
+    def _sync_loop(self):
+        """Sync records that have waited fsync_interval without a later append doing it. Exits on close."""
+        with self._wakeup:
+            while self._file is not None:
+                if not self._unsynced:
+                    self._wakeup.wait()
+                    continue
+                remaining = self._first_unsynced + self.fsync_interval - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.wait(remaining)
+                else:
+                    self.sync()
+
+    def _append(self, event, value):
+        payload = pickle.dumps((event, value), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._ensure_open()
+            self._file.write(_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._file.flush()
+            self._apply((event, value))
+            if not self._unsynced:
+                self._first_unsynced = time.monotonic()
+                self._wakeup.notify()
+            self._unsynced += 1
+            self._records_since_snapshot += 1
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self.sync()
+            if self._records_since_snapshot >= self.snapshot_every:
+                self.snapshot()
+
+    def record_submit(self, task, dependencies=None):
+        self._append(SUBMIT, self.task_state(task, dependencies))
+
+    def record_start(self, task_id):
+        self._append(START, task_id)
+
+    def record_complete(self, task_id):
+        self._append(COMPLETE, task_id)
+
+    def record_fail(self, task_id):
+        self._append(FAIL, task_id)
+
+    def sync(self):
+        """Flush buffered records and fsync them to disk."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def snapshot(self):
+        """Write a compacted snapshot of the pending tasks and start a new journal generation."""
+        with self._lock:
+            self._ensure_open()
+            self._prune_dependencies()
+            generation = self.generation + 1
+            snapshot_path = os.path.join(self.directory, _SNAPSHOT_FILE)
+            temporary_path = snapshot_path + ".tmp"
+            with open(temporary_path, "wb") as snapshot:
+                pickle.dump((generation, _columns_from_states(self.pending.values())), snapshot,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            # The rename is the commit point: until it happens the old snapshot and log remain authoritative
+            os.replace(temporary_path, snapshot_path)
+
+            self._file.close()
+            previous_path = self._journal_path(self.generation)
+            self.generation = generation
+            self._file = open(self._journal_path(generation), "ab")
+            os.remove(previous_path)
+            self._unsynced = 0
+            self._records_since_snapshot = 0
+            logging.info(f"Journal snapshot written with {len(self.pending)} pending task(s) "
+                         f"(generation {generation}).")
+
+    def recover(self):
+        """Reload the journal from disk and return the state tuples of every pending task."""
+        with self._lock:
+            self.close()
+            self._load()
+            return list(self.pending.values())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self.sync()
+                self._file.close()
+                self._file = None
+                self._wakeup.notify_all()
+
+
+def _columns_from_states(states):
+    """
+    Lay out task states column-wise for the snapshot. A handful of flat lists pickle and unpickle far faster than one
+    tuple per task; the rarely used fields are stored sparsely, only for tasks that set them.
+    """
+    task_ids, priorities, execution_times, payloads = [], [], [], []
+    extras = {}
+    for state in states:
+        task_ids.append(state[0])
+        priorities.append(state[1])
+        execution_times.append(state[2])
+        payloads.append(state[3])
+        if state[4] or state[5] is not None or state[6] is not None or state[7] or state[8]:
+            extras[state[0]] = state[4:]
+    return task_ids, priorities, execution_times, payloads, extras
+
+
+def _states_from_columns(columns):
+    task_ids, priorities, execution_times, payloads, extras = columns
+    defaults = ([], None, None, {}, 0)
+    pending = {state[0]: state + defaults for state in zip(task_ids, priorities, execution_times, payloads)}
+    for task_id, extra in extras.items():
+        pending[task_id] = pending[task_id][:4] + extra
+    return pending
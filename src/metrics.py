@@ -0,0 +1,310 @@
+"""
+metrics.py
+
+Runtime metrics for the hot paths of EarthAI, exported in the Prometheus text format on the model server's /metrics
+endpoint (scraped as configured under monitoring.prometheus in infra_config.yaml).
+
+- Counter, Gauge and Histogram are label-aware and thread-safe. They are registered once per process in a
+  Registry, normally the module-level REGISTRY, and looked up by name, so instrumented modules share one metric
+  whichever of them creates it first.
+- timer(name, **labels) times a block into a latency histogram. The data processing stages,
+  SelectiveBatching.create_batch/execute_batches, DynamicTaskScheduler dispatch and /predict requests are timed this
+  way; queue depths, batch fill ratios and worker utilisation are reported as gauges and histograms next to them.
+- Collectors are callbacks that report values owned by other objects at scrape time, e.g. the result cache
+  counters, so those objects need no knowledge of the registry.
+- Profiler hooks are optional. A hook registered with add_hook is entered and exited around every timer block, so
+  a profiler can be attached to exactly the sections of interest. CProfileHook collects cProfile statistics for
+  selected timers. With no hooks registered, a timer costs two clock reads and a histogram update.
+
+The exporter is self-contained and needs no prometheus_client, keeping the serving image's dependencies unchanged.
+"""
+
+import cProfile
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import numpy as np
+
+# Latency buckets in seconds, from sub-millisecond dispatches to multi-second pipeline stages
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets for fractions such as batch fill ratios
+RATIO_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation=""):
+        self.name = name
+        self.documentation = documentation
+        self.lock = threading.Lock()
+        self.values = {}  # Label key -> value
+        self.registry = None  # Set on registration; supplies the profiler hooks of Histogram.time
+
+    def samples(self):
+        """(name suffix, label key, extra labels, value) tuples for the exposition format."""
+        with self.lock:
+            return [("", key, (), value) for key, value in self.values.items()]
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(_label_key(labels), 0.0)
+
+    def reset(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase.")
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation="", buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self._bounds = np.asarray(self.buckets)
+
+    def _series(self, key):
+        # Per label set: [count per bucket (plus +Inf), sum, count]
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [np.zeros(len(self.buckets) + 1, dtype=np.int64), 0.0, 0]
+        return series
+
+    def observe(self, value, **labels):
+        index = bisect_left(self.buckets, value)
+        key = _label_key(labels)
+        with self.lock:
+            series = self._series(key)
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def observe_many(self, values, **labels):
+        """Record a batch of observations with one vectorised bucket assignment."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not values.size:
+            return
+        counts = np.bincount(np.searchsorted(self._bounds, values, side="left"), minlength=len(self.buckets) + 1)
+        key = _label_key(labels)
+        with self.lock:
+            series = self._series(key)
+            series[0] += counts
+            series[1] += float(values.sum())
+            series[2] += int(values.size)
+
+    @contextmanager
+    def time(self, **labels):
+        """Time the enclosed block into this histogram, running the registry's profiler hooks around it."""
+        hooks = self.registry.hooks if self.registry is not None else ()
+        for hook in hooks:
+            hook.enter(self.name, labels)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(elapsed, **labels)
+            for hook in reversed(hooks):
+                hook.exit(self.name, labels, elapsed)
+
+    def get(self, **labels):
+        """(count, sum) of the observations for a label set."""
+        with self.lock:
+            series = self.values.get(_label_key(labels))
+            return (0, 0.0) if series is None else (series[2], series[1])
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                cumulative = np.cumsum(counts)
+                for bound, running in zip(self.buckets + (math.inf,), cumulative):
+                    samples.append(("_bucket", key, (("le", _format_value(bound)),), int(running)))
+                samples.append(("_sum", key, (), total))
+                samples.append(("_count", key, (), count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.hooks = ()  # Replaced, never mutated, so timers can iterate without the lock
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, **options):
+        metric = self.metrics.get(name)
+        if type(metric) is cls:
+            return metric  # Fast path for hot-path lookups; registration below is serialised
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, **options)
+                metric.registry = self
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}.")
+            return metric
+
+    def counter(self, name, documentation=""):
+        return self._get_or_create(Counter, name, documentation)
+
+    def gauge(self, name, documentation=""):
+        return self._get_or_create(Gauge, name, documentation)
+
+    def histogram(self, name, documentation="", buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, buckets=buckets)
+
+    def add_collector(self, collector):
+        """
+        Register a callable returning (name, kind, documentation, {label tuple: value}) tuples,
+        evaluated at every render. Label tuples are sorted (name, value) pairs, () for none.
+        """
+        with self.lock:
+            self.collectors.append(collector)
+
+    def add_hook(self, hook):
+        """Register a profiler hook with enter(name, labels) and exit(name, labels, seconds) methods."""
+        with self.lock:
+            self.hooks = self.hooks + (hook,)
+
+    def remove_hook(self, hook):
+        with self.lock:
+            self.hooks = tuple(registered for registered in self.hooks if registered is not hook)
+
+    def timer(self, name, documentation="", **labels):
+        """Time the enclosed block into the latency histogram name, running any profiler hooks around it."""
+        return self.histogram(name, documentation).time(**labels)
+
+    def snapshot(self):
+        """Plain-dict copy of every metric, e.g. for benchmark result files."""
+        result = {}
+        for name, metric in list(self.metrics.items()):
+            with metric.lock:
+                if isinstance(metric, Histogram):
+                    result[name] = {_format_labels(key): {"count": count, "sum": total}
+                                    for key, (_, total, count) in metric.values.items()}
+                else:
+                    result[name] = {_format_labels(key): value for key, value in metric.values.items()}
+        return result
+
+    def reset(self):
+        for metric in list(self.metrics.values()):
+            metric.reset()
+
+    def render(self):
+        """All metrics and collected values in the Prometheus text exposition format."""
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for suffix, key, extra, value in metric.samples():
+                lines.append(f"{name}{suffix}{_format_labels(key, extra)} {_format_value(value)}")
+        for collector in list(self.collectors):
+            for name, kind, documentation, values in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in values.items():
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class CProfileHook:
+    """
+    Profiler hook that runs cProfile inside the timers named in sections (all timers if None).
+    Only the outermost active section of a thread is profiled; read the results with stats().
+    """
+
+    def __init__(self, sections=None):
+        self.sections = None if sections is None else set(sections)
+        self.profile = cProfile.Profile()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def _selected(self, name):
+        return self.sections is None or name in self.sections
+
+    def enter(self, name, labels):
+        if not self._selected(name):
+            return
+        depth = getattr(self.local, "depth", 0)
+        self.local.depth = depth + 1
+        if depth == 0 and self.lock.acquire(blocking=False):
+            # cProfile can only profile one thread at a time; other threads' sections are skipped
+            self.local.owner = True
+            self.profile.enable()
+
+    def exit(self, name, labels, seconds):
+        if not self._selected(name):
+            return
+        self.local.depth -= 1
+        if self.local.depth == 0 and getattr(self.local, "owner", False):
+            self.profile.disable()
+            self.local.owner = False
+            self.lock.release()
+
+    def stats(self, sort="cumulative"):
+        import pstats
+        return pstats.Stats(self.profile).sort_stats(sort)
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+timer = REGISTRY.timer
+add_collector = REGISTRY.add_collector
+add_hook = REGISTRY.add_hook
+remove_hook = REGISTRY.remove_hook
+render = REGISTRY.render
+snapshot = REGISTRY.snapshot
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
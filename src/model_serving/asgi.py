@@ -0,0 +1,233 @@
+# asgi.py
+
+"""
+This module provides the production serving mode of the model server: the /predict contract of server.py as a plain
+ASGI application, runnable under uvicorn or any other ASGI server with several worker processes.
+
+- Repeated requests are answered from server.result_cache, shared with concurrent identical requests in flight.
+- The event loop never runs CPU-bound request work. JSON decoding and cache key hashing, validation and
+  preprocessing (server.parse_predict_request, server.prepare_tensor) and response serialisation run on the loop's
+  thread pool, so a large payload does not stall other connections or load shedding. Preprocessed features are
+  handed to server.batcher; the handler then awaits the batcher's Future, whose batched model call runs on the
+  batcher's own thread. Concurrent requests are therefore coalesced exactly as in the Flask server.
+- The model is loaded once per worker process, when the worker imports the app and at the latest in the ASGI
+  lifespan startup, before the first request is accepted.
+  Weights given as model.weights_path are memory-mapped read-only, so all workers on the host share a single copy
+  through the page cache, whether the workers are forked or spawned.
+- Each worker admits at most max_in_flight concurrent /predict requests. Beyond that it answers 503 with a
+  Retry-After header at once, so an overloaded pod sheds load quickly instead of queueing requests until they
+  time out. Kubernetes and clients can then retry against another replica.
+- Binary .npy tensors and streamed responses are negotiated exactly as in server.py.
+- GET /metrics serves the worker's metrics registry in the Prometheus text format, including the requests in
+  flight and shed by this worker. Each worker process keeps its own registry, so Prometheus should scrape the
+  workers individually or aggregate over them.
+- Connection keep-alive and HTTP parsing are the ASGI server's job; run() configures uvicorn's keep-alive timeout
+  from server.keep_alive in app_config.yml.
+
+The application is framework-free, so it needs no dependencies beyond those of server.py. Serving it requires an
+ASGI server, e.g. uvicorn (pip install uvicorn):
+
+    PYTHONPATH=src python src/model_serving/asgi.py
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+import metrics
+from model_serving import server
+
+_JSON_HEADERS = [(b"content-type", b"application/json")]
+
+
+class PredictApp:
+    def __init__(self, max_in_flight=256, retry_after=1):
+        """
+        Initialize the ASGI application. max_in_flight bounds concurrent /predict requests per
+        worker process; retry_after is the Retry-After value, in seconds, sent with 503 responses.
+        """
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.in_flight = 0  # Only touched from the event loop, so no lock is needed
+        self.requests_shed = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._handle_http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.startup()
+                except Exception as error:
+                    await send({"type": "lifespan.startup.failed", "message": str(error)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def startup(self):
+        """Preload the model and start the batcher in this worker process."""
+        server.load_model(server.config)
+        server.batcher.start()
+        logging.info(f"Model server worker ready (max {self.max_in_flight} requests in flight).")
+
+    def shutdown(self):
+        server.batcher.shutdown()
+
+    async def _handle_http(self, scope, receive, send):
+        if scope["path"] == "/metrics" and scope["method"] == "GET":
+            await _send_text(send, 200, metrics.render(), metrics.CONTENT_TYPE)
+            return
+        if scope["path"] != "/predict":
+            await _send_json(send, 404, {"status": "error", "message": "Not found"})
+            return
+        if scope["method"] != "POST":
+            await _send_json(send, 405, {"status": "error", "message": "Method not allowed"},
+                             headers=[(b"allow", b"POST")])
+            return
+        if self.in_flight >= self.max_in_flight:
+            self.requests_shed += 1
+            await _send_json(send, 503, {"status": "error", "message": "Server overloaded, retry later"},
+                             headers=[(b"retry-after", str(self.retry_after).encode())])
+            return
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        start = time.perf_counter()
+        self.in_flight += 1
+        try:
+            status, body = await self._predict(await _read_body(receive), headers.get("content-type", ""))
+            stream = server.streamed_reply(body, headers.get("accept"))
+            server.REQUEST_SECONDS.observe(time.perf_counter() - start, server="asgi", status=status)
+            if stream is not None:
+                await _send_stream(send, status, *stream)
+                return
+            payload = await _offload(_encode_json, body)
+        finally:
+            self.in_flight -= 1
+        await _send_payload(send, status, payload)
+
+    def load_metrics(self):
+        """Metrics collector reporting admission state at scrape time."""
+        return [
+            ("earthai_asgi_requests_in_flight", "gauge", "/predict requests being served by this worker.",
+             {(): self.in_flight}),
+            ("earthai_asgi_requests_shed_total", "counter", "/predict requests answered 503 because of overload.",
+             {(): self.requests_shed}),
+        ]
+
+    async def _predict(self, raw_body, content_type):
+        if content_type.split(";")[0].strip() == server.NPY_MEDIA_TYPE:
+            return await self._predict_tensor(raw_body)
+        try:
+            data, key = await _offload(_decode_json, raw_body)
+        except ValueError as error:
+            return 400, {"status": "error", "message": f"Invalid JSON: {error}"}
+
+        async def compute():
+            features, reply = await _offload(server.parse_predict_request, data)
+            if reply is not None:
+                return reply
+            predictions = await asyncio.wrap_future(server.batcher.submit(features))
+            return {"status": "success", "predictions": predictions}, 200
+
+        body, status = await server.result_cache.get_or_compute_async(key, compute, cacheable=server.successful_reply)
+        return status, body
+
+    async def _predict_tensor(self, raw_body):
+        async def compute():
+            try:
+                features = await _offload(server.prepare_tensor, raw_body)
+            except ValueError as error:
+                return {"status": "error", "message": f"Invalid tensor: {error}"}, 400
+            predictions = await asyncio.wrap_future(server.batcher.submit(features))
+            return {"status": "success", "predictions": predictions}, 200
+
+        key = await _offload(server.result_cache.key, raw_body)
+        body, status = await server.result_cache.get_or_compute_async(key, compute, cacheable=server.successful_reply)
+        return status, body
+
+
+async def _offload(function, *args):
+    # CPU-bound request work runs on the loop's thread pool, so a large payload never stalls other connections
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+def _decode_json(raw_body):
+    data = json.loads(raw_body) if raw_body else None
+    return data, server.result_cache.key(data)
+
+
+def _encode_json(body):
+    return json.dumps(server.json_body(body)).encode("utf-8")
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+async def _send_json(send, status, body, headers=()):
+    await _send_payload(send, status, json.dumps(body).encode("utf-8"), headers)
+
+
+async def _send_payload(send, status, payload, headers=()):
+    await send({"type": "http.response.start", "status": status,
+                "headers": _JSON_HEADERS + [(b"content-length", str(len(payload)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def _send_text(send, status, text, content_type):
+    payload = text.encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type.encode("latin-1")),
+                            (b"content-length", str(len(payload)).encode())]})
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def _send_stream(send, status, media_type, chunks):
+    # No content-length: the ASGI server falls back to chunked transfer encoding
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", media_type.encode("latin-1"))]})
+    chunks = iter(chunks)
+    while True:
+        # Encoding a chunk costs as much as serialising a whole small reply, so it runs off the loop as well
+        chunk = await _offload(next, chunks, None)
+        if chunk is None:
+            break
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+server_config = server.config.get("server", {})
+app = PredictApp(max_in_flight=server_config.get("max_in_flight", 256))
+metrics.add_collector(app.load_metrics)
+
+
+def run():
+    """Serve the application with uvicorn using the server section of app_config.yml."""
+    try:
+        import uvicorn
+    except ImportError as error:
+        raise ImportError("The async serving mode requires an ASGI server such as uvicorn (pip install uvicorn).") \
+            from error
+    uvicorn.run("model_serving.asgi:app", host=server_config.get("host", "0.0.0.0"),
+                port=server_config.get("port", 5000), workers=server_config.get("workers", 1),
+                timeout_keep_alive=server_config.get("keep_alive", 5), lifespan="on")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,152 @@
+# batcher.py
+
+"""
+This module provides MicroBatcher, the request coalescer behind the model server's /predict endpoint. Prithvi
+inference is far cheaper per sample in a batch than one request at a time, so concurrent requests are not sent to the
+model individually:
+
+- Each request thread submits its feature rows and waits on a Future.
+- A single batching thread takes the oldest pending request and keeps collecting further requests until either
+  max_batch_size rows (model.inference_batch_size in app_config.yml) have been gathered or max_wait seconds have passed
+  since that oldest request arrived.
+- The collected rows are concatenated into one block and passed to the model in a single call, and the output rows
+  are split back into per-request slices and delivered through the Futures.
+
+The deadline is measured from the oldest request's arrival, so no request waits more than max_wait for company,
+and under light load a lone request is served after at most that delay. Requests are never split across model
+calls: a request with more rows than max_batch_size simply runs as its own batch. Only requests whose blocks have
+the same width and dtype are batched together, so a client sending a different feature layout cannot fail the
+requests of other clients. If the model raises, the exception is delivered to every request of that batch.
+
+The batcher reports its queue depth, the rows and fill ratio of every batch and the duration of each model call to
+the metrics registry (earthai_inference_*), for the server's /metrics endpoint.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import RATIO_BUCKETS, gauge, histogram
+
+QUEUE_DEPTH = gauge("earthai_inference_queue_depth", "Requests waiting for the micro-batcher.")
+MODEL_SECONDS = histogram("earthai_inference_model_seconds", "Duration of each batched model call.")
+BATCH_ROWS = histogram("earthai_inference_batch_rows", "Rows per batched model call.",
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096))
+FILL_RATIO = histogram("earthai_inference_batch_fill_ratio", "Fraction of max_batch_size used by each model call.",
+                       buckets=RATIO_BUCKETS)
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=100, max_wait=0.005):
+        """
+        Initialize the batcher around a model function that maps a (rows, features) block to one
+        output row per input row.
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.pending = deque()  # (arrival time, features, future)
+        self.condition = threading.Condition()
+        self.batches_run = 0
+        self.requests_served = 0
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        with self.condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._batch_loop, name="micro-batcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, features):
+        """Queue a (rows, features) block and return a Future for its predictions."""
+        future = Future()
+        with self.condition:
+            if not self._running:
+                self.start()
+            self.pending.append((time.monotonic(), features, future))
+            QUEUE_DEPTH.set(len(self.pending))
+            self.condition.notify()
+        return future
+
+    def predict(self, features, timeout=None):
+        """Submit a block and wait for its predictions."""
+        return self.submit(features).result(timeout=timeout)
+
+    def _pending_rows(self, signature):
+        return sum(len(features) for _, features, _ in self.pending if _signature(features) == signature)
+
+    def _next_batch(self):
+        """Wait until a batch is due and take it off the queue. Returns None on shutdown."""
+        with self.condition:
+            while self._running and not self.pending:
+                self.condition.wait()
+            if not self._running and not self.pending:
+                return None
+            deadline = self.pending[0][0] + self.max_wait
+            signature = _signature(self.pending[0][1])
+            while self._running and self._pending_rows(signature) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch = [self.pending.popleft()]
+            rows = len(batch[0][1])
+            # Only blocks of the oldest request's width and dtype can be concatenated with it; the others keep
+            # their place in the queue for a later batch
+            skipped = deque()
+            while self.pending and rows < self.max_batch_size:
+                entry = self.pending.popleft()
+                if _signature(entry[1]) == signature and rows + len(entry[1]) <= self.max_batch_size:
+                    rows += len(entry[1])
+                    batch.append(entry)
+                else:
+                    skipped.append(entry)
+            self.pending.extendleft(reversed(skipped))
+            QUEUE_DEPTH.set(len(self.pending))
+            return batch
+
+    def _batch_loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        futures = [future for _, _, future in batch]
+        try:
+            block = np.concatenate([features for _, features, _ in batch]) if len(batch) > 1 else batch[0][1]
+            BATCH_ROWS.observe(len(block))
+            FILL_RATIO.observe(len(block) / self.max_batch_size)
+            with MODEL_SECONDS.time():
+                outputs = np.asarray(self.predict_fn(block))
+            offsets = np.cumsum([len(features) for _, features, _ in batch])[:-1]
+            for future, output in zip(futures, np.split(outputs, offsets)):
+                future.set_result(output)
+        except Exception as error:
+            logging.error(f"Batched prediction over {len(batch)} request(s) failed: {error}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+        self.batches_run += 1
+        self.requests_served += len(batch)
+
+    def shutdown(self, wait=True):
+        """Stop the batching thread after serving the requests already queued."""
+        with self.condition:
+            self._running = False
+            self.condition.notify_all()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+
+def _signature(features):
+    """Requests are only batched together when their blocks agree in everything but the row count."""
+    return features.shape[1:], features.dtype
@@ -0,0 +1,163 @@
+# result_cache.py
+
+"""
+This module provides ResultCache, the prediction result cache of the model server. Clients often resubmit identical
+tiles and time windows to /predict; with the cache, a repeated request is answered from memory without touching the
+preprocessing or the model.
+
+- Keys are a SHA-256 over the canonical JSON form of the request (sorted keys, no insignificant whitespace), or over
+  the raw body of a binary tensor request, prefixed with a namespace of model name and version from app_config.yml,
+  so deploying a new model version never serves results of the old one.
+- Entries expire ttl seconds after they were stored, and the cache holds at most max_bytes of results. When it is
+  full, the least recently used entries are evicted first.
+- Lookups are single-flight: while one request computes a result, identical requests arriving meanwhile wait for
+  that computation instead of starting their own, so a burst of duplicates costs one inference. Both blocking
+  callers (Flask threads) and asyncio callers (the ASGI app) share the same in-flight computations.
+- hits, misses, coalesced (requests that waited on another's computation) and evictions are counted for monitoring.
+
+Only results accepted by the cacheable predicate are stored, so validation errors and failed inferences are always
+recomputed.
+"""
+
+import asyncio
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+_HIT = "hit"
+_WAIT = "wait"
+_LEAD = "lead"
+
+
+def estimate_size(value):
+    """Approximate memory held by a cached value: array buffers plus a fixed per-object overhead."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 112
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    def __init__(self, max_bytes=64 << 20, ttl=300.0, namespace="", sizeof=estimate_size, clock=time.monotonic):
+        """
+        Initialize the cache. max_bytes bounds the estimated size of the stored results and ttl is
+        their lifetime in seconds. namespace is mixed into every key, e.g. "Prithvi:1.0".
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.namespace = namespace
+        self.sizeof = sizeof
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (expiry time, size, value), least recently used first
+        self.in_flight = {}  # key -> Future of the computation currently producing it
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def key(self, payload):
+        """The cache key of a JSON-compatible request payload, or of a raw binary request body."""
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            digest = hashlib.sha256(f"{self.namespace}\nbinary\n".encode("utf-8"))
+            digest.update(payload)
+            return digest.hexdigest()
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{self.namespace}\n{canonical}".encode("utf-8")).hexdigest()
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses,
+                    "coalesced": self.coalesced, "evictions": self.evictions}
+
+    def _claim(self, key):
+        """
+        Look a key up. Returns (_HIT, value) on a hit, otherwise (_LEAD, future) for the caller that
+        must compute the value and finish the future, or (_WAIT, future) for callers that wait on it.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > self.clock():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return _HIT, entry[2]
+                self._remove(key)
+            future = self.in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return _WAIT, future
+            future = self.in_flight[key] = Future()
+            self.misses += 1
+            return _LEAD, future
+
+    def _finish(self, key, future, value=None, error=None, cacheable=None):
+        with self.lock:
+            self.in_flight.pop(key, None)
+            if error is None and (cacheable is None or cacheable(value)):
+                self._store(key, value)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def _store(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (self.clock() + self.ttl, size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """Return the cached value for key, computing it with compute() at most once across concurrent callers."""
+        status, result = self._claim(key)
+        if status == _HIT:
+            return result
+        if status == _WAIT:
+            return result.result()
+        try:
+            value = compute()
+        except BaseException as error:
+            self._finish(key, result, error=error)
+            raise
+        self._finish(key, result, value, cacheable=cacheable)
+        return value
+
+    async def get_or_compute_async(self, key, compute, cacheable=None):
+        """Coroutine form of get_or_compute; compute is a coroutine function."""
+        status, result = self._claim(key)
+        if status == _HIT:
+            return result
+        if status == _WAIT:
+            return await asyncio.wrap_future(result)
+        try:
+            value = await compute()
+        except BaseException as error:
+            self._finish(key, result, error=error)
+            raise
+        self._finish(key, result, value, cacheable=cacheable)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
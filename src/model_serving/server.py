@@ -17,12 +17,37 @@ from the request, performs necessary preprocessing or validation, and passes the
 needs to be connected to the actual model's prediction function/method. It's a placeholder demonstrating where and 
 how to integrate model inference within the server logic.
 
+Preprocessing: requests of the form {"instances": [{column: value, ...}, ...]} are standardised with the statistics
+the data processing pipeline fitted and saved to data_processing.preprocessing.stats_path in app_config.yml. They are
+loaded once at startup, so inference inputs are scaled exactly like the training data without recomputing anything.
+
+Micro-batching: concurrent "instances" requests are coalesced by a batcher.MicroBatcher into batches of up to
+model.inference_batch_size rows, or whatever has arrived within model.max_batch_wait_ms of the oldest waiting
+request. Each batch is one model call, and the per-request results are scattered back to the waiting handlers.
+
+Production serving: model_serving.asgi exposes the same /predict contract as an ASGI application for multi-worker
+servers such as uvicorn. The request validation below (parse_predict_request) and the batcher are shared by both.
+
+Result caching: a result_cache.ResultCache answers repeated identical requests without preprocessing or inference.
+Keys hash the canonical request JSON together with the model name and version, entries live for
+model.result_cache.ttl_seconds within a model.result_cache.max_mb memory bound, and concurrent identical requests
+share one computation.
+
+Binary tensors: besides JSON, /predict accepts an application/x-npy body holding a (rows, features) array, decoded
+straight into a NumPy view (see tensor_codec). Responses are content-negotiated: clients whose Accept header lists
+application/x-npy get the predictions back as .npy. .npy responses, and JSON responses with more than
+server.stream_chunk_rows rows, are streamed chunk by chunk.
+
+Metrics: GET /metrics returns the process's metrics registry (see metrics.py) in the Prometheus text format: /predict
+latency by status, the result cache counters, micro-batcher queue depth, batch fill and model call time, and whatever
+scheduler, batching and pipeline metrics the process has recorded.
+
 4. JSON Response: The prediction results are formatted into a JSON response, making it easy for clients to interpret 
 the model's output.
 
 5. Server Execution: Specifies the server's host address and port, enabling the Flask application to run and listen 
-for incoming requests. Debug mode is enabled for development purposes, providing detailed error logs and enabling live 
-reload of the server upon code changes.
+for incoming requests. Debug mode and its reloader stay off: they would expose the interactive debugger and start the
+micro-batcher twice. Set server.debug in app_config.yml to enable them on a development machine.
 
 Usage:
 - The script is executed as a standalone Python application, starting a web server that can be accessed by clients 
@@ -36,33 +61,237 @@ Future Enhancements:
 - Optimize server settings and deployment strategy for production use, considering security, scalability, and performance.
 """
 
-from flask import Flask, request, jsonify
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from flask import Flask, Response, request, jsonify
+import metrics
+from config import load_config
+from data_processing.preprocessing import Preprocessor
+from model_serving.batcher import MicroBatcher
+from model_serving.result_cache import ResultCache
+from model_serving.tensor_codec import JSON_MEDIA_TYPE, NPY_MEDIA_TYPE, decode_npy, iter_json, iter_npy, wants_npy
 # Assume predict is a function or part of a class that you import to make predictions with the Prithvi model
 # from your_model import predict
 
 app = Flask(__name__)
 
+
+def load_preprocessor(config):
+    """Load the preprocessing statistics saved by the pipeline, or return None if there are none yet."""
+    preprocessing = config.get("data_processing", {}).get("preprocessing") or {}
+    stats_path = preprocessing.get("stats_path")
+    if not stats_path or not os.path.exists(stats_path):
+        logging.warning(f"No preprocessing statistics at {stats_path}; inputs will not be standardised.")
+        return None
+    return Preprocessor.load(stats_path, standardize=preprocessing.get("standardize", True))
+
+
+config = load_config()
+preprocessor = load_preprocessor(config)
+
+
+def prepare_features(instances):
+    """Turn a list of input records into a float feature block, standardised with the fitted statistics."""
+    frame = pd.DataFrame(instances)
+    if preprocessor is None:
+        return check_features(frame.to_numpy(dtype=np.float64))
+    features = frame[preprocessor.stats.columns].to_numpy(dtype=np.float64, copy=True)
+    if preprocessor.standardize:
+        preprocessor.standardize_array(features)
+    return check_features(features)
+
+
+def check_features(features):
+    """
+    Reject a feature block the model cannot take, so the request is answered with 400 instead
+    of failing inside a batch shared with other clients.
+    """
+    if features.ndim != 2:
+        raise ValueError(f"Expected a (rows, features) block, got shape {features.shape}.")
+    if model_weights is not None and features.shape[1] != model_weights.shape[0]:
+        raise ValueError(f"Expected {model_weights.shape[0]} features, got {features.shape[1]}.")
+    return features
+
+
+model_weights = None
+
+
+def load_model(config):
+    """
+    Load the model once per process. Weights configured as model.weights_path (a .npy file) are
+    memory-mapped read-only, so every worker process on the host shares one copy in the page cache.
+    """
+    global model_weights
+    weights_path = config.get("model", {}).get("weights_path")
+    if weights_path and model_weights is None:
+        model_weights = np.load(weights_path, mmap_mode="r")
+        logging.info(f"Memory-mapped model weights {weights_path} with shape {model_weights.shape}.")
+    return model_weights
+
+
+def prepare_tensor(raw):
+    """Decode an application/x-npy body into a feature block, standardised with the fitted statistics."""
+    features = decode_npy(raw)
+    if features.ndim == 1:
+        features = features.reshape(1, -1)
+    if features.ndim != 2:
+        raise ValueError(f"Expected a (rows, features) tensor, got shape {features.shape}.")
+    if preprocessor is None:
+        return check_features(features)
+    if features.shape[1] != len(preprocessor.stats.columns):
+        raise ValueError(f"Expected {len(preprocessor.stats.columns)} features, got {features.shape[1]}.")
+    if preprocessor.standardize:
+        # The decoded view is read-only, so standardising needs the one copy
+        features = preprocessor.standardize_array(features.astype(np.result_type(features.dtype, np.float32)))
+    return check_features(features)
+
+
+def predict(features):
+    """
+    Placeholder for the Prithvi model: one simulated prediction per row of the feature block,
+    from a linear head when weights are loaded.
+    """
+    if model_weights is not None:
+        return features @ model_weights
+    return features.mean(axis=1)
+
+
+model_config = config.get("model", {})
+# predict is looked up on every call so the model function can be swapped after startup
+batcher = MicroBatcher(lambda features: predict(features),
+                       max_batch_size=model_config.get("inference_batch_size", 100),
+                       max_wait=model_config.get("max_batch_wait_ms", 5) / 1000)
+stream_chunk_rows = config.get("server", {}).get("stream_chunk_rows", 4096)
+cache_config = model_config.get("result_cache") or {}
+result_cache = ResultCache(max_bytes=int(cache_config.get("max_mb", 64) * (1 << 20)),
+                           ttl=cache_config.get("ttl_seconds", 300),
+                           namespace=f"{model_config.get('name')}:{model_config.get('version')}")
+# Load the model when the app is imported, by this script or by a WSGI server, so the first request does not pay
+# for it and both serving modes run the same configured weights
+load_model(config)
+
+REQUEST_SECONDS = metrics.histogram("earthai_request_seconds",
+                                    "Time to answer a /predict request, up to the start of the response body.")
+
+
+def cache_metrics():
+    """Metrics collector reporting the result cache counters at scrape time."""
+    stats = result_cache.stats()
+    return [
+        ("earthai_result_cache_entries", "gauge", "Results held in the result cache.", {(): stats["entries"]}),
+        ("earthai_result_cache_bytes", "gauge", "Estimated size of the cached results.", {(): stats["bytes"]}),
+        ("earthai_result_cache_requests_total", "counter", "Result cache lookups by outcome.",
+         {(("outcome", outcome),): stats[outcome] for outcome in ("hits", "misses", "coalesced")}),
+        ("earthai_result_cache_evictions_total", "counter", "Results evicted to stay within the memory bound.",
+         {(): stats["evictions"]}),
+    ]
+
+
+metrics.add_collector(cache_metrics)
+
+
+def parse_predict_request(data):
+    """
+    Validate and preprocess a /predict payload. Returns (features, None) when the model has to
+    run, or (None, (body, status)) for a reply that needs no model call.
+    """
+    instances = data.get("instances") if isinstance(data, dict) else None
+    if instances is None:
+        # Here, we're simulating a prediction result for free-form input
+        return None, ({"status": "success", "predictions": "simulated_result"}, 200)
+    try:
+        return prepare_features(instances), None
+    except (KeyError, TypeError, ValueError) as error:
+        return None, ({"status": "error", "message": f"Invalid instances: {error}"}, 400)
+
+
+def predict_reply(data):
+    """
+    Answer a /predict payload: validate, preprocess and run the batched model. Returns
+    (body, status), with predictions as an array.
+    """
+    features, reply = parse_predict_request(data)
+    if reply is not None:
+        return reply
+    return {"status": "success", "predictions": batcher.predict(features)}, 200
+
+
+def predict_tensor_reply(raw):
+    """Answer a binary tensor /predict request. Returns (body, status), with predictions as an array."""
+    try:
+        features = prepare_tensor(raw)
+    except ValueError as error:
+        return {"status": "error", "message": f"Invalid tensor: {error}"}, 400
+    return {"status": "success", "predictions": batcher.predict(features)}, 200
+
+
+def successful_reply(reply):
+    """Only successful replies are worth caching."""
+    return reply[1] == 200
+
+
+def json_body(body):
+    """A reply body with array predictions converted for JSON encoding."""
+    predictions = body.get("predictions")
+    if isinstance(predictions, np.ndarray):
+        return dict(body, predictions=predictions.tolist())
+    return body
+
+
+def streamed_reply(body, accept):
+    """
+    (media type, byte chunk iterator) for replies that are streamed: .npy when the client accepts
+    it, large JSON predictions otherwise. Returns None for replies sent as one JSON document.
+    """
+    predictions = body.get("predictions")
+    if not isinstance(predictions, np.ndarray):
+        return None
+    if wants_npy(accept):
+        return NPY_MEDIA_TYPE, iter_npy(predictions, stream_chunk_rows)
+    if predictions.ndim and len(predictions) > stream_chunk_rows:
+        return JSON_MEDIA_TYPE, iter_json(body, stream_chunk_rows)
+    return None
+
 @app.route('/predict', methods=['POST'])
 def handle_predict():
     """
     Handle prediction requests sent to "/predict" endpoint.
-    Expects data in JSON format and returns predictions from the Prithvi model.
+    Expects data in JSON format, or an application/x-npy tensor, and returns predictions from the
+    Prithvi model as JSON or, if the client accepts it, as .npy.
     """
+    start = time.perf_counter()
     # Extract data from the request
-    data = request.json
+    if request.mimetype == NPY_MEDIA_TYPE:
+        raw = request.get_data(cache=False)
+        key, compute = result_cache.key(raw), lambda: predict_tensor_reply(raw)
+    else:
+        data = request.json
+        key, compute = result_cache.key(data), lambda: predict_reply(data)
+
+    # Repeated requests are answered from the result cache; otherwise validate, preprocess and
+    # call the Prithvi model's prediction function/method, batched together with concurrent requests
+    body, status = result_cache.get_or_compute(key, compute, cacheable=successful_reply)
 
-    # Perform data validation or preprocessing as needed
-    # For simplicity, we're assuming data is directly passed to the model
+    # Return predictions as a stream or in JSON format
+    stream = streamed_reply(body, request.headers.get("Accept"))
+    REQUEST_SECONDS.observe(time.perf_counter() - start, server="flask", status=status)
+    if stream is not None:
+        return Response(stream[1], status=status, mimetype=stream[0])
+    return jsonify(json_body(body)), status
 
-    # Call the Prithvi model's prediction function/method
-    # Here, we're simulating a prediction result
-    # Replace the following line with actual model prediction logic, e.g., predictions = predict(data)
-    predictions = {"status": "success", "predictions": "simulated_result"}
 
-    # Return predictions in JSON format
-    return jsonify(predictions)
+@app.route('/metrics', methods=['GET'])
+def handle_metrics():
+    """Expose the process's metrics in the Prometheus text format."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 if __name__ == "__main__":
     # Run the Flask application
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    server_config = config.get("server", {})
+    app.run(host=server_config.get("host", "0.0.0.0"), port=server_config.get("port", 5000),
+            debug=server_config.get("debug", False))
 
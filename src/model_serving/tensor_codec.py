@@ -0,0 +1,86 @@
+# tensor_codec.py
+
+"""
+This module implements the binary tensor format of the /predict endpoint and the streaming encoders for its responses.
+JSON number lists cost more CPU and bandwidth than inference for AIRS grids, so clients may send and receive tensors
+in the NumPy .npy format instead (media type application/x-npy):
+
+- A request with Content-Type application/x-npy carries one .npy array of shape (rows, features), or (features,)
+  for a single row. decode_npy parses only the small header and returns np.frombuffer over the request body itself,
+  so the values are never turned into Python objects or copied.
+- A response is sent as .npy when the Accept header lists application/x-npy. iter_npy yields the header first and
+  then the array in row chunks, so the server never materialises the whole encoded response.
+- JSON responses with large prediction arrays are streamed as well: iter_json yields the body in row chunks instead
+  of building the whole string at once.
+
+.npy is self-describing (dtype, byte order and shape are in its header) and clients can produce it with nothing but
+NumPy: np.save(buffer, array) or array.tobytes() behind a header from np.lib.format.
+"""
+
+import io
+import json
+
+import numpy as np
+
+NPY_MEDIA_TYPE = "application/x-npy"
+JSON_MEDIA_TYPE = "application/json"
+
+
+def wants_npy(accept):
+    """True if an Accept header value asks for .npy responses (with a non-zero quality)."""
+    for media_range in (accept or "").split(","):
+        media_type, *parameters = [part.strip() for part in media_range.split(";")]
+        if media_type == NPY_MEDIA_TYPE:
+            return not any(parameter.replace(" ", "") in ("q=0", "q=0.0") for parameter in parameters)
+    return False
+
+
+def decode_npy(raw):
+    """Decode a .npy payload into a read-only array view over raw, without copying the data."""
+    stream = io.BytesIO(raw)
+    try:
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    except (ValueError, SyntaxError) as error:
+        raise ValueError(f"Malformed .npy header: {error}") from error
+    if dtype.hasobject or dtype.kind not in "iuf":
+        raise ValueError(f"Unsupported tensor dtype {dtype}; expected a numeric dtype.")
+    count = int(np.prod(shape, dtype=np.int64))
+    offset = stream.tell()
+    if len(raw) - offset != count * dtype.itemsize:
+        raise ValueError(f"Tensor body has {len(raw) - offset} bytes, header describes {count * dtype.itemsize}.")
+    array = np.frombuffer(raw, dtype=dtype, count=count, offset=offset)
+    return array.reshape(shape[::-1]).T if fortran_order else array.reshape(shape)
+
+
+def encode_npy_header(shape, dtype):
+    """The .npy header for an array of the given shape and dtype, in C order."""
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {"shape": tuple(shape), "fortran_order": False,
+                                                  "descr": np.lib.format.dtype_to_descr(np.dtype(dtype))})
+    return header.getvalue()
+
+
+def iter_npy(array, rows_per_chunk=4096):
+    """Yield an array as a .npy byte stream: the header, then chunks of rows."""
+    array = np.ascontiguousarray(array)
+    yield encode_npy_header(array.shape, array.dtype)
+    if array.ndim == 0:
+        yield array.tobytes()
+        return
+    for start in range(0, len(array), rows_per_chunk):
+        yield array[start:start + rows_per_chunk].tobytes()  # One chunk-sized copy at a time
+
+
+def iter_json(body, rows_per_chunk=4096):
+    """Yield a reply body as JSON text chunks, streaming its predictions array row chunk by row chunk."""
+    predictions = body["predictions"]
+    rest = json.dumps({key: value for key, value in body.items() if key != "predictions"})
+    yield (rest[:-1] + (", " if len(rest) > 2 else "") + '"predictions": [').encode("utf-8")
+    for start in range(0, len(predictions), rows_per_chunk):
+        chunk = json.dumps(predictions[start:start + rows_per_chunk].tolist())[1:-1]
+        yield ((", " if start else "") + chunk).encode("utf-8")
+    yield b"]}"
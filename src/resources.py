@@ -0,0 +1,83 @@
+"""
+resources.py
+
+Resource monitors used by the DynamicTaskScheduler for admission control. A monitor reports how much of each
+resource is currently in use on the host, and optionally the total capacity it has detected. The scheduler combines
+these samples with its own ledger of resources committed to in-flight tasks and only admits a task whose declared
+requirements fit in the remaining headroom.
+
+Resources are identified by name. The scheduler understands the following by convention:
+
+- cpu: Percentage of the pod's CPU (0-100).
+- memory: Bytes of RAM.
+- slots: Worker slots. Every task occupies one unless it declares otherwise.
+
+Sampling can be costly, so monitors cache their last sample for sample_interval seconds. The scheduler also uses that
+interval to decide how often to re-check admission while work is held back only by external load.
+"""
+
+import time
+
+
+class ResourceMonitor:
+    """Base class for resource monitors. Subclasses implement _sample() and optionally capacity()."""
+
+    def __init__(self, sample_interval=0.5):
+        self.sample_interval = sample_interval
+        self._last_sample = None
+        self._last_sample_time = 0.0
+
+    def usage(self):
+        """Return the most recent usage sample, refreshing it if it is older than sample_interval."""
+        now = time.monotonic()
+        if self._last_sample is None or now - self._last_sample_time >= self.sample_interval:
+            self._last_sample = self._sample()
+            self._last_sample_time = now
+        return self._last_sample
+
+    def capacity(self):
+        """Return the total capacity per resource detected by this monitor, if any."""
+        return {}
+
+    def _sample(self):
+        raise NotImplementedError
+
+
+class StaticResourceMonitor(ResourceMonitor):
+    """Reports fixed usage figures. Useful for tests and for reserving headroom for co-located processes."""
+
+    def __init__(self, usage, capacity=None):
+        super().__init__(sample_interval=0)
+        self._usage = dict(usage)
+        self._capacity = dict(capacity or {})
+
+    def set_usage(self, **usage):
+        """Update the reported usage, e.g. set_usage(cpu=30)."""
+        self._usage.update(usage)
+
+    def capacity(self):
+        return dict(self._capacity)
+
+    def _sample(self):
+        return dict(self._usage)
+
+
+class PsutilResourceMonitor(ResourceMonitor):
+    """Samples system-wide CPU and memory usage through psutil."""
+
+    def __init__(self, sample_interval=0.5):
+        try:
+            import psutil
+        except ImportError as error:
+            raise ImportError("PsutilResourceMonitor requires the psutil package (pip install psutil).") from error
+        super().__init__(sample_interval=sample_interval)
+        self._psutil = psutil
+        # Prime the counter so the first non-blocking cpu_percent() call is meaningful
+        psutil.cpu_percent(interval=None)
+
+    def capacity(self):
+        return {"cpu": 100.0, "memory": self._psutil.virtual_memory().total}
+
+    def _sample(self):
+        memory = self._psutil.virtual_memory()
+        return {"cpu": self._psutil.cpu_percent(interval=None), "memory": memory.total - memory.available}
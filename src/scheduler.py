@@ -4,108 +4,511 @@ scheduler.py
 A sophisticated task scheduler script that dynamically prioritizes and executes tasks based on their urgency, resource requirements, and optimal batching strategies. This script is inspired by the ORCA paper's approach to iteration-level scheduling and efficient resource management, making it well-suited for distributed systems with varying computational demands and priorities.
 
 Key Improvements and Features:
-- Dynamic Resource Allocation: Manages tasks based on real-time system load and task requirements, using a ThreadPoolExecutor to simulate concurrent task execution.
+- Dynamic Resource Allocation: Manages tasks based on real-time system load and task requirements. Tasks declare CPU, memory and slot requirements; a ledger of resources committed to in-flight work, combined with samples from pluggable monitors (see resources.py), admits a task only when it fits, and smaller ready tasks are backfilled around a blocked large one as long as they do not delay its start (EASY backfilling against a reservation computed from the estimated finish times of in-flight tasks). Tasks run on pluggable backends (see executors.py): a thread pool by default, a process pool for CPU-bound work that would otherwise be serialised by the GIL, or inline for trivial tasks, chosen per task or per batch key.
 - Selective Batching: Groups tasks based on similar characteristics (such as priority) before execution, optimizing throughput and resource utilization in a manner consistent with ORCA's selective batching principle.
+- Bounded Batch Latency: A partial batch is released when it reaches the size threshold, when its summed execution_time exceeds a budget, or when its oldest task has lingered past a deadline, so rare priorities are never starved.
+- Durable Task Journal: An optional write-ahead journal (see journal.py) records submit, start and complete events with batched fsync and periodic compacted snapshots, so pending work survives shutdowns and crashes and recover_tasks() restores it by replaying only the journal tail.
 - Enhanced Error Handling and Logging: Incorporates comprehensive error handling and logging mechanisms to ensure robustness and facilitate troubleshooting, providing clear visibility into the scheduler's operations.
-- Dependency-Aware Scheduling: Introduces the capability to manage task dependencies, ensuring that certain tasks are completed before others begin, which is essential for complex workflows that have interdependent steps.
+- Event-Driven Dispatch: Tasks are handed to the executor from a condition-variable driven loop that sleeps until a task arrives or a worker frees up, so the scheduler costs nothing while idle and reacts immediately under load.
+- Dependency-Aware Scheduling: Introduces the capability to manage task dependencies, ensuring that certain tasks are completed before others begin, which is essential for complex workflows that have interdependent steps. Dependencies form a DAG keyed by task_id: each waiting task keeps an indegree counter, completing a task releases its successors in O(out-degree), cycles are rejected at submit time and a failure is propagated to every descendant.
+- Runtime Metrics: Dispatch time, queue depth, busy workers and worker utilisation are published to the metrics registry (see metrics.py) on every dispatch and completion, and exported on the model server's /metrics endpoint.
 - Integration with Data Processing and Model Serving: Designed to work seamlessly with data processing pipelines and model serving infrastructure, forming a cohesive end-to-end system that can handle a variety of tasks, from data preparation to predictive analysis.
 - Scalability and Deployment: Adapts for scalability and deployment in distributed environments, supporting containerization and orchestration technologies such as Docker and Kubernetes, to meet the demands of a production-grade system.
 
 Note: This script serves as an advanced prototype that demonstrates the core concepts of a dynamic task scheduler. It requires integration with real-world data processing functions and model inference code to be deployed in a production environment.
 """
 
+import gc
 import threading
 import heapq
+import itertools
+import operator
 import time
-from concurrent.futures import ThreadPoolExecutor
 import logging
 from collections import defaultdict
 
+from executors import ExecutorRouter
+from metrics import gauge, histogram
+
+DISPATCH_SECONDS = histogram("earthai_scheduler_dispatch_seconds", "Time spent handing ready tasks to the executor.")
+QUEUE_DEPTH = gauge("earthai_scheduler_queue_depth", "Tasks queued for dispatch, waiting in batches or on dependencies.")
+WORKERS_BUSY = gauge("earthai_scheduler_workers_busy", "Tasks currently running on the executor.")
+UTILISATION = gauge("earthai_scheduler_worker_utilisation", "Fraction of max_workers currently running tasks.")
+
+# Shortest interval between admission re-checks while tasks are held back only by external load
+RESOURCE_POLL_INTERVAL = 0.05
+
 # Set up basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class Task:
-    def __init__(self, task_id, priority, execution_time, data, dependencies=None):
+    __slots__ = ("task_id", "priority", "execution_time", "data", "dependencies", "func", "executor",
+                 "required_resources", "data_size")
+
+    def __init__(self, task_id, priority, execution_time, data, dependencies=None, func=None, executor=None,
+                 required_resources=None, data_size=0):
         self.task_id = task_id
         self.priority = priority  # Lower numbers indicate higher priority
         self.execution_time = execution_time  # Estimated execution time
         self.data = data  # Task-specific data
         self.dependencies = dependencies or []
+        self.func = func  # Optional callable invoked as func(data); must be module-level for the process backend
+        self.executor = executor  # Optional backend hint: "thread", "process" or "inline"
+        self.required_resources = required_resources or {}  # e.g. {'cpu': 50, 'memory': 2 * 2**30, 'slots': 1}
+        self.data_size = data_size  # Payload size, used when tasks are batched by size
 
     def __lt__(self, other):
         # Define comparison for priority queue
         return self.priority < other.priority
 
 class DynamicTaskScheduler:
-    def __init__(self, max_workers=5, batch_threshold=10):
+    def __init__(self, max_workers=5, batch_threshold=10, max_linger=None, max_batch_execution_time=None,
+                 process_workers=None, executor_routes=None, resource_limits=None, backfill_depth=32,
+                 max_head_wait=30.0, journal=None):
         self.tasks = []  # A heap-based priority queue for tasks
         self.max_workers = max_workers
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
-        self.lock = threading.Lock()
+        # executor_routes maps batch keys to a backend; tasks may override it with Task.executor
+        self.executor = ExecutorRouter(max_workers=max_workers, process_workers=process_workers, routes=executor_routes)
+        # Re-entrant so that done-callbacks fired synchronously during submit can take the lock again
+        self.lock = threading.RLock()
+        self.condition = threading.Condition(self.lock)
         self.task_batches = defaultdict(list)
         self.batch_threshold = batch_threshold
+        self.max_linger = max_linger  # Seconds a partial batch may wait before it is flushed
+        self.max_batch_execution_time = max_batch_execution_time  # Flush once a batch holds this much estimated work
+        self._batch_deadlines = {}  # Batch key -> monotonic flush deadline of its oldest task
+        self._batch_execution_time = defaultdict(float)
+        self._linger_heap = []  # (deadline, sequence, batch key) entries driving the flush timer
+        self._linger_sequence = 0
+        self._flusher = None
+        self.blocked = {}  # task_id -> Task waiting on unfinished dependencies
+        self.completed = set()  # task_ids that finished successfully
+        self.failed = {}  # task_id -> reason for tasks that failed or lost an upstream dependency
+        self._indegree = {}  # task_id -> number of dependencies still outstanding
+        self._dependents = defaultdict(list)  # task_id -> successor task_ids waiting on it
+        self.in_flight = {}  # Future -> Task for work currently handed to the executor
+        # Capacity per resource; resources without a limit are not constrained
+        self.resource_limits = {"cpu": 100.0, "slots": max_workers, **(resource_limits or {})}
+        self.committed = defaultdict(float)  # Resources reserved by in-flight tasks
+        self.resource_monitors = []
+        self.backfill_depth = backfill_depth  # How far past a blocked head to look for a task that fits
+        # Seconds a head blocked by host load alone may be backfilled around before the queue waits for it
+        self.max_head_wait = max_head_wait
+        self._blocked_head = None  # (task, monotonic time) of the queue head while it waits for resources
+        self._expected_end = {}  # Future -> monotonic time its task should finish by its execution_time estimate
+        self.journal = journal  # Optional TaskJournal that makes queued work durable
+        self._dispatcher = None
+        self._stopping = False
 
     def add_task(self, task):
-        """Add a new task to the batch or priority queue."""
-        with self.lock:
+        """
+        Add a new task to the batch or priority queue. Tasks with unfinished dependencies
+        are held in self.blocked until the last of them completes. Raises ValueError if
+        the task would close a dependency cycle.
+        """
+        with self.condition:
+            self._check_requirements(task)
+            if self.journal is not None:
+                self.journal.record_submit(task, [dep for dep in task.dependencies if dep not in self.completed])
+            if task.dependencies:
+                try:
+                    if self._register_dependencies(task):
+                        return
+                except ValueError:
+                    if self.journal is not None:
+                        self.journal.record_fail(task.task_id)
+                    raise
             batch_key = self._get_batch_key(task)
-            self.task_batches[batch_key].append(task)
+            batch = self.task_batches[batch_key]
+            batch.append(task)
+            self._batch_execution_time[batch_key] += task.execution_time
+
+            if len(batch) >= self.batch_threshold:
+                self._enqueue_batch(batch_key, "size")
+            elif (self.max_batch_execution_time is not None
+                    and self._batch_execution_time[batch_key] >= self.max_batch_execution_time):
+                self._enqueue_batch(batch_key, "execution time budget")
+            elif self.max_linger is not None and len(batch) == 1:
+                self._schedule_linger_flush(batch_key)
+
+    def _enqueue_batch(self, batch_key, reason="size"):
+        """Move a pending batch into the priority queue and wake the dispatcher. Caller must hold the lock."""
+        batched_tasks = self.task_batches.pop(batch_key)
+        self._batch_deadlines.pop(batch_key, None)
+        self._batch_execution_time.pop(batch_key, None)
+        for batch_task in batched_tasks:
+            heapq.heappush(self.tasks, batch_task)
+        self.condition.notify_all()
+        logging.info(f"Batch of {len(batched_tasks)} tasks added to the queue with key {batch_key} ({reason}).")
+
+    def _schedule_linger_flush(self, batch_key):
+        """Arm the flush timer for a newly opened batch. Caller must hold the lock."""
+        deadline = time.monotonic() + self.max_linger
+        self._batch_deadlines[batch_key] = deadline
+        self._linger_sequence += 1
+        heapq.heappush(self._linger_heap, (deadline, self._linger_sequence, batch_key))
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="scheduler-flush", daemon=True)
+            self._flusher.start()
+        self.condition.notify_all()
+
+    def _flush_loop(self):
+        """Release partial batches whose oldest task has waited longer than max_linger."""
+        with self.condition:
+            while not self._stopping:
+                now = time.monotonic()
+                while self._linger_heap and self._linger_heap[0][0] <= now:
+                    deadline, _, batch_key = heapq.heappop(self._linger_heap)
+                    # Entries for batches that were already flushed (or reopened since) are stale
+                    if self._batch_deadlines.get(batch_key) == deadline:
+                        self._enqueue_batch(batch_key, "linger deadline")
+                timeout = self._linger_heap[0][0] - now if self._linger_heap else None
+                self.condition.wait(timeout)
+
+    def _register_dependencies(self, task):
+        """
+        Record a task in the dependency graph. Returns True if the task must wait (or has
+        already failed because of an upstream failure). Caller must hold the lock.
+        """
+        unmet = [dep for dep in dict.fromkeys(task.dependencies) if dep not in self.completed]
+        if not unmet:
+            return False
+        failed_dep = next((dep for dep in unmet if dep in self.failed), None)
+        if failed_dep is not None:
+            self._fail_task(task.task_id, f"dependency {failed_dep} failed")
+            return True
+        # A new node can only close a cycle if something already waits on it
+        if task.task_id in self._dependents or task.task_id in unmet:
+            self._check_for_cycle(task.task_id, unmet)
+
+        self._indegree[task.task_id] = len(unmet)
+        for dep in unmet:
+            self._dependents[dep].append(task.task_id)
+        self.blocked[task.task_id] = task
+        logging.info(f"Task {task.task_id} waiting on {len(unmet)} dependencies.")
+        return True
+
+    def _check_for_cycle(self, task_id, dependencies):
+        """Raise ValueError if task_id is reachable from its own dependencies. Caller must hold the lock."""
+        stack = list(dependencies)
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if node == task_id:
+                raise ValueError(f"Task {task_id} would create a dependency cycle.")
+            if node in seen:
+                continue
+            seen.add(node)
+            waiting = self.blocked.get(node)
+            if waiting is not None:
+                stack.extend(dep for dep in waiting.dependencies if dep not in self.completed)
+
+    def _complete_task(self, task_id):
+        """Mark a task as done and release successors whose last dependency it was. Caller must hold the lock."""
+        self.completed.add(task_id)
+        if self.journal is not None:
+            self.journal.record_complete(task_id)
+        for successor_id in self._dependents.pop(task_id, ()):
+            if successor_id not in self._indegree:
+                continue
+            self._indegree[successor_id] -= 1
+            if self._indegree[successor_id] == 0:
+                del self._indegree[successor_id]
+                heapq.heappush(self.tasks, self.blocked.pop(successor_id))
+                self.condition.notify_all()
+
+    def _fail_task(self, task_id, reason):
+        """Mark a task as failed and fail every blocked descendant. Caller must hold the lock."""
+        self.failed[task_id] = reason
+        if self.journal is not None:
+            self.journal.record_fail(task_id)
+        pending = [task_id]
+        while pending:
+            failed_id = pending.pop()
+            for successor_id in self._dependents.pop(failed_id, ()):
+                if self.blocked.pop(successor_id, None) is None:
+                    continue
+                self._indegree.pop(successor_id, None)
+                self.failed[successor_id] = f"upstream task {failed_id} failed"
+                if self.journal is not None:
+                    self.journal.record_fail(successor_id)
+                logging.error(f"Task {successor_id} cancelled: upstream task {failed_id} failed.")
+                pending.append(successor_id)
+
+    def add_resource_monitor(self, monitor):
+        """
+        Feed host usage samples from a ResourceMonitor into admission control. Capacities
+        reported by the monitor fill in any limits that were not configured explicitly.
+        """
+        with self.condition:
+            self.resource_monitors.append(monitor)
+            for resource, amount in monitor.capacity().items():
+                self.resource_limits.setdefault(resource, amount)
+            self.condition.notify_all()
+
+    def _requirements(self, task):
+        """Resources reserved while the task runs. Every task occupies one worker slot unless it says otherwise."""
+        if "slots" in task.required_resources:
+            return task.required_resources
+        return {**task.required_resources, "slots": 1}
 
-            if len(self.task_batches[batch_key]) >= self.batch_threshold:
-                batched_tasks = self.task_batches.pop(batch_key)
-                for batch_task in batched_tasks:
-                    heapq.heappush(self.tasks, batch_task)
-                logging.info(f"Batch of {len(batched_tasks)} tasks added to the queue with key {batch_key}.")
+    def _check_requirements(self, task):
+        """Reject tasks that could never be admitted, rather than letting them wait forever."""
+        for resource, amount in self._requirements(task).items():
+            limit = self.resource_limits.get(resource)
+            if limit is not None and amount > limit:
+                raise ValueError(f"Task {task.task_id} requires {amount} {resource} but the limit is {limit}.")
+
+    def _observed_usage(self):
+        """Highest usage reported by any monitor, per resource. Caller must hold the lock."""
+        observed = {}
+        for monitor in self.resource_monitors:
+            for resource, amount in monitor.usage().items():
+                observed[resource] = max(amount, observed.get(resource, 0))
+        return observed
+
+    def _fits(self, task, observed):
+        """Whether the task fits in the headroom left by committed work and observed host load."""
+        for resource, amount in self._requirements(task).items():
+            limit = self.resource_limits.get(resource)
+            if limit is None:
+                continue
+            # Monitors also see our own running tasks, so take the larger figure instead of adding them
+            in_use = max(self.committed[resource], observed.get(resource, 0))
+            if in_use + amount > limit:
+                return False
+        return True
+
+    def _reservation(self, head, observed):
+        """
+        When the blocked head will fit, assuming in-flight tasks finish as estimated, and the resources it will
+        leave spare then: (shadow time, {resource: spare}). (None, None) if finishing our own work is not enough,
+        i.e. the head waits on host load. Caller must hold the lock.
+        """
+        needed = {resource: amount for resource, amount in self._requirements(head).items()
+                  if self.resource_limits.get(resource) is not None}
+        free = {resource: self.resource_limits[resource] - max(self.committed[resource], observed.get(resource, 0))
+                for resource in needed}
+        for future in sorted(self._expected_end, key=self._expected_end.get):
+            for resource, amount in self._requirements(self.in_flight[future]).items():
+                if resource in free:
+                    free[resource] += amount
+            if all(free[resource] >= amount for resource, amount in needed.items()):
+                return self._expected_end[future], {resource: free[resource] - needed[resource] for resource in needed}
+        return None, None
+
+    def _next_admissible(self, observed):
+        """
+        Pop the highest-priority task that fits right now. If the head of the queue does not fit, backfill
+        with the best task among the next backfill_depth that fits without delaying the head: it must either
+        finish before the head's reservation by its execution_time estimate, or only use resources the head
+        leaves spare. A head waiting on host load rather than on our own tasks has no reservation; it is
+        backfilled around for at most max_head_wait seconds. Caller must hold the lock.
+        """
+        if not self.tasks:
+            return None
+        head = self.tasks[0]
+        if self._fits(head, observed):
+            self._blocked_head = None
+            return heapq.heappop(self.tasks)
+        now = time.monotonic()
+        if self._blocked_head is None or self._blocked_head[0] is not head:
+            self._blocked_head = (head, now)
+        shadow, spare = self._reservation(head, observed)
+        if shadow is None and self.max_head_wait is not None and now - self._blocked_head[1] > self.max_head_wait:
+            return None
+        skipped = [heapq.heappop(self.tasks)]
+        admitted = None
+        while self.tasks and len(skipped) <= self.backfill_depth:
+            candidate = heapq.heappop(self.tasks)
+            if self._fits(candidate, observed) and (
+                    shadow is None or now + candidate.execution_time <= shadow
+                    or all(amount <= spare[resource] for resource, amount in self._requirements(candidate).items()
+                           if resource in spare)):
+                admitted = candidate
+                break
+            skipped.append(candidate)
+        for task in skipped:
+            heapq.heappush(self.tasks, task)
+        if admitted is not None and skipped:
+            logging.info(f"Backfilled task {admitted.task_id} around {len(skipped)} task(s) waiting for resources.")
+        return admitted
+
+    def _commit_resources(self, task, sign):
+        """Reserve (sign=1) or release (sign=-1) a task's resources in the ledger. Caller must hold the lock."""
+        for resource, amount in self._requirements(task).items():
+            self.committed[resource] += sign * amount
+
+    def _resource_wait_timeout(self):
+        """How long to sleep before re-sampling monitors, or None if only a notification can unblock us."""
+        if not self.resource_monitors or not self.tasks:
+            return None
+        return max(RESOURCE_POLL_INTERVAL, min(monitor.sample_interval for monitor in self.resource_monitors))
 
     def _get_batch_key(self, task):
         """Derive the batch key for a task. This can be based on various characteristics."""
         # Example: batch by priority
         return task.priority
 
+    def _dispatch_ready(self):
+        """Submit queued tasks in priority order while workers and resources are free. Caller must hold the lock."""
+        if not self.tasks:
+            return
+        with DISPATCH_SECONDS.time():
+            observed = self._observed_usage()
+            while self.tasks and len(self.in_flight) < self.max_workers:
+                task = self._next_admissible(observed)
+                if task is None:
+                    break
+                self._commit_resources(task, 1)
+                if self.journal is not None:
+                    self.journal.record_start(task.task_id)
+                future = self.executor.submit(task, self.execute_task, self._get_batch_key(task))
+                self.in_flight[future] = task
+                self._expected_end[future] = time.monotonic() + task.execution_time
+                future.add_done_callback(self._on_task_done)
+        self._report_load()
+
+    def _report_load(self):
+        """Publish queue depth and worker utilisation to the metrics registry. Caller must hold the lock."""
+        pending = len(self.tasks) + len(self.blocked) + sum(len(batch) for batch in self.task_batches.values())
+        QUEUE_DEPTH.set(pending)
+        WORKERS_BUSY.set(len(self.in_flight))
+        UTILISATION.set(len(self.in_flight) / self.max_workers)
+
+    def _on_task_done(self, future):
+        """Release the worker slot held by a finished task and wake anyone waiting for capacity."""
+        error = future.exception()
+        with self.condition:
+            task = self.in_flight.pop(future, None)
+            self._expected_end.pop(future, None)
+            if task is not None:
+                self._commit_resources(task, -1)
+                if error is None:
+                    self._complete_task(task.task_id)
+                else:
+                    self._fail_task(task.task_id, repr(error))
+                self._report_load()
+            self.condition.notify_all()
+        if error is not None and task is not None:
+            logging.error(f"Task {task.task_id} failed: {error}")
+
     def schedule_tasks(self):
-        """Schedule and execute tasks based on priority and estimated execution time."""
-        while self.tasks or any(self.task_batches.values()):
-            if threading.active_count() - 1 < self.max_workers and self.tasks:
-                task = heapq.heappop(self.tasks)
-                future = self.executor.submit(self.execute_task, task)
-
-    def test_task_with_dependencies(self):
-        # Test that a task with dependencies does not execute before its dependencies
-        dependent_task = Task(task_id=10, priority=1, execution_time=1, data="Dependent", dependencies=[1, 2])
-        self.scheduler.add_task(dependent_task)
-        self.scheduler.schedule_tasks()
-        # Check if the dependent task is still in the queue due to unmet dependencies
-        self.assertIn(dependent_task, self.scheduler.tasks, "Dependent task should not execute before its dependencies")
-
-    def test_resource_monitoring(self):
-        # Test that the scheduler considers resource availability before scheduling tasks
-        self.scheduler.add_resource_monitor(resource_monitor)
-        heavy_task = Task(task_id=20, priority=1, execution_time=10, data="Heavy Task", required_resources={'cpu': 90})
-        self.scheduler.add_task(heavy_task)
-        self.scheduler.schedule_tasks()
-        # Check if the heavy task is delayed due to resource constraints
-        self.assertIn(heavy_task, self.scheduler.tasks, "Heavy task should be delayed when resources are insufficient")
-
-    def test_graceful_shutdown_and_recovery(self):
-        # Test that tasks are saved during shutdown and can be recovered
-        self.scheduler.add_task(Task(task_id=30, priority=1, execution_time=5, data="Important"))
-        self.scheduler.shutdown()
-        self.scheduler.recover_tasks()
-        # Ensure tasks are present after recovery
-        self.assertNotEqual(len(self.scheduler.tasks), 0, "Tasks should be recovered after shutdown")
-
-    
+        """
+        Schedule and execute tasks based on priority and estimated execution time.
+        Blocks on the condition variable while all workers are busy and returns once
+        the priority queue is empty; tasks still accumulating in task_batches are left
+        for a later flush. If nothing is running and the remaining tasks do not fit in
+        the available resources, they are left queued and the call returns.
+        """
+        with self.condition:
+            while self.tasks:
+                self._dispatch_ready()
+                if not self.tasks:
+                    break
+                if not self.in_flight:
+                    logging.info(f"{len(self.tasks)} task(s) delayed until resources become available.")
+                    break
+                self.condition.wait()
+
+    def drain(self, timeout=None):
+        """
+        Flush every pending batch, dispatch all queued tasks and block until no work is
+        queued or in flight. Returns True once idle, or False if the timeout expired first.
+        Tasks still waiting on dependencies that were never submitted stay in self.blocked.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            for batch_key in list(self.task_batches):
+                self._enqueue_batch(batch_key)
+            while True:
+                self._dispatch_ready()
+                # Fast tasks may already have completed through a synchronous done-callback
+                if not self.tasks and not self.in_flight:
+                    return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                poll = self._resource_wait_timeout()
+                if poll is not None:
+                    remaining = poll if remaining is None else min(poll, remaining)
+                self.condition.wait(remaining)
+
+    def run_until_idle(self):
+        """Block until every submitted task, including partial batches, has been executed."""
+        return self.drain()
+
+    def start(self):
+        """Start a background dispatcher that submits tasks as soon as they reach the queue."""
+        with self.condition:
+            if self._dispatcher is None:
+                self._stopping = False
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name="scheduler-dispatch", daemon=True)
+                self._dispatcher.start()
+
+    def _dispatch_loop(self):
+        """Sleep until a task arrives or a worker frees up, then dispatch whatever fits."""
+        with self.condition:
+            while not self._stopping:
+                self._dispatch_ready()
+                self.condition.wait(self._resource_wait_timeout())
+
     def execute_task(self, task):
-        """Execute a single task."""
+        """Execute a single task on the thread or inline backend."""
         logging.info(f"Executing task {task.task_id} with priority {task.priority}.")
-        time.sleep(task.execution_time)  # Simulate task execution
+        if task.func is not None:
+            result = task.func(task.data)
+        else:
+            time.sleep(task.execution_time)  # Simulate task execution
+            result = None
         logging.info(f"Task {task.task_id} completed.")
+        return result
 
     def shutdown(self):
         """Shutdown the executor and ensure all tasks are completed."""
+        with self.condition:
+            self._stopping = True
+            self.condition.notify_all()
+            threads = [thread for thread in (self._dispatcher, self._flusher) if thread is not None]
+            self._dispatcher = self._flusher = None
+        for thread in threads:
+            thread.join()
         self.executor.shutdown(wait=True)
+        if self.journal is not None:
+            # Tasks still queued, batched or blocked are pending in the journal; compact them for a fast restart
+            with self.condition:
+                self.journal.snapshot()
+                self.journal.close()
         logging.info("Scheduler shutdown, all tasks completed.")
 
+    def recover_tasks(self):
+        """
+        Restore pending tasks from the journal after a restart. Ready tasks go straight to the
+        priority queue (they were already batched before the restart); tasks whose dependencies
+        are still pending are held in self.blocked. Returns the number of tasks recovered.
+        """
+        if self.journal is None:
+            raise RuntimeError("recover_tasks() requires a scheduler created with a journal.")
+        # Rebuilding hundreds of thousands of objects would otherwise trigger repeated full-heap GC passes
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with self.condition:
+                states = self.journal.recover()
+                # State tuples follow the Task constructor's argument order
+                for task in itertools.starmap(Task, states):
+                    if task.dependencies and self._register_dependencies(task):
+                        continue
+                    self.tasks.append(task)
+                # A list sorted by priority is already a valid heap, and sorting on a key avoids Python-level __lt__ calls
+                self.tasks.sort(key=operator.attrgetter("priority"))
+                self.condition.notify_all()
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        logging.info(f"Recovered {len(states)} task(s) from the journal.")
+        return len(states)
+
 # Example usage
 if __name__ == "__main__":
     scheduler = DynamicTaskScheduler(max_workers=3)
@@ -121,5 +524,5 @@ if __name__ == "__main__":
     for task in tasks:
         scheduler.add_task(task)
 
-    scheduler.schedule_tasks()
+    scheduler.run_until_idle()
     scheduler.shutdown()
@@ -0,0 +1,227 @@
+"""
+task_table.py
+
+Columnar storage for large numbers of lightweight tasks. Instead of one Python object per task, a TaskTable keeps
+each field in a NumPy array:
+
+- task_ids: int64
+- type_codes: int32, an index into type_names
+- priorities: int32
+- data_sizes: int64
+- execution_times: float64
+
+That is 32 bytes per task, against several hundred for a dict-backed object and its boxed field values. Aggregates
+such as batch totals, type grouping and priority ordering become vectorised array operations.
+
+TaskView and TaskBatch are small __slots__ objects that expose a row, or a range of rows, through the same attribute
+names as batching.Task, so code that iterates over batches keeps working unchanged. A TaskBatch does not copy any
+task data. It references a slice of a row-order permutation into the table.
+"""
+
+import numpy as np
+
+_COLUMNS = (
+    ("task_ids", np.int64),
+    ("type_codes", np.int32),
+    ("priorities", np.int32),
+    ("data_sizes", np.int64),
+    ("execution_times", np.float64),
+)
+
+
+class TaskTable:
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.type_names = []  # Type code -> task type name
+        self._codes_by_name = {}
+        for name, dtype in _COLUMNS:
+            setattr(self, "_" + name, np.empty(max(capacity, 1), dtype=dtype))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not -self.size <= index < self.size:
+            raise IndexError("task index out of range")
+        return TaskView(self, index % self.size)
+
+    def __iter__(self):
+        return (TaskView(self, index) for index in range(self.size))
+
+    # Column accessors return views of the filled part of each array
+    @property
+    def task_ids(self):
+        return self._task_ids[:self.size]
+
+    @property
+    def type_codes(self):
+        return self._type_codes[:self.size]
+
+    @property
+    def priorities(self):
+        return self._priorities[:self.size]
+
+    @property
+    def data_sizes(self):
+        return self._data_sizes[:self.size]
+
+    @property
+    def execution_times(self):
+        return self._execution_times[:self.size]
+
+    def type_code(self, task_type):
+        """Return the integer code for a task type, registering it on first use."""
+        code = self._codes_by_name.get(task_type)
+        if code is None:
+            code = self._codes_by_name[task_type] = len(self.type_names)
+            self.type_names.append(task_type)
+        return code
+
+    def _reserve(self, count):
+        needed = self.size + count
+        capacity = len(self._task_ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, _ in _COLUMNS:
+            old = getattr(self, "_" + name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, "_" + name, new)
+
+    def append(self, task_type, data_size, task_id=None, priority=0, execution_time=0.0):
+        """Add one task and return its row index. task_id defaults to the row index."""
+        self._reserve(1)
+        row = self.size
+        self._task_ids[row] = row if task_id is None else task_id
+        self._type_codes[row] = self.type_code(task_type)
+        self._priorities[row] = priority
+        self._data_sizes[row] = data_size
+        self._execution_times[row] = execution_time
+        self.size += 1
+        return row
+
+    def extend(self, task_types, data_sizes, task_ids=None, priorities=0, execution_times=0.0):
+        """
+        Bulk-append tasks from sequences or arrays. Scalars broadcast across all rows. task_types
+        may be a sequence of names or a single name. Returns the slice of rows added.
+        """
+        data_sizes = np.asarray(data_sizes)
+        count = len(data_sizes)
+        self._reserve(count)
+        start, stop = self.size, self.size + count
+        if isinstance(task_types, str):
+            self._type_codes[start:stop] = self.type_code(task_types)
+        else:
+            # A dict lookup per row keeps codes in first-appearance order and works for any hashable type name
+            self._type_codes[start:stop] = np.fromiter(map(self.type_code, task_types), dtype=np.int32, count=count)
+        self._task_ids[start:stop] = np.arange(start, stop) if task_ids is None else task_ids
+        self._priorities[start:stop] = priorities
+        self._data_sizes[start:stop] = data_sizes
+        self._execution_times[start:stop] = execution_times
+        self.size = stop
+        return slice(start, stop)
+
+    @classmethod
+    def from_tasks(cls, tasks):
+        """Build a table from task objects (batching.Task or scheduler.Task); missing fields use defaults."""
+        tasks = list(tasks)
+        table = cls(capacity=len(tasks))
+        table.extend(
+            [getattr(task, "task_type", None) for task in tasks],
+            [getattr(task, "data_size", 0) for task in tasks],
+            task_ids=[row if getattr(task, "task_id", None) is None else task.task_id for row, task in enumerate(tasks)],
+            priorities=[getattr(task, "priority", 0) for task in tasks],
+            execution_times=[getattr(task, "execution_time", 0.0) for task in tasks],
+        )
+        return table
+
+    def priority_order(self, rows=None):
+        """Row indices sorted by priority (lower first), stable with respect to insertion order."""
+        if rows is None:
+            return np.argsort(self.priorities, kind="stable")
+        rows = np.asarray(rows)
+        return rows[np.argsort(self.priorities[rows], kind="stable")]
+
+    def type_order(self):
+        """
+        Row indices grouped by task type, in the order types were first registered, stable
+        within each type.
+        """
+        return np.argsort(self.type_codes, kind="stable")
+
+    def nbytes(self):
+        """Bytes held by the column arrays, including spare capacity."""
+        return sum(getattr(self, "_" + name).nbytes for name, _ in _COLUMNS)
+
+
+class TaskView:
+    """Read-only view of one table row with the attribute names of batching.Task."""
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    @property
+    def task_id(self):
+        return int(self.table._task_ids[self.row])
+
+    @property
+    def task_type(self):
+        return self.table.type_names[self.table._type_codes[self.row]]
+
+    @property
+    def priority(self):
+        return int(self.table._priorities[self.row])
+
+    @property
+    def data_size(self):
+        return int(self.table._data_sizes[self.row])
+
+    @property
+    def execution_time(self):
+        return float(self.table._execution_times[self.row])
+
+    def __repr__(self):
+        return f"TaskView(task_id={self.task_id}, task_type={self.task_type!r}, data_size={self.data_size})"
+
+
+class TaskBatch:
+    """
+    A batch expressed as the range [start, stop) of a row-order permutation into a TaskTable.
+    The summed data_size may be supplied when it was computed in bulk for many batches at once.
+    """
+
+    __slots__ = ("table", "order", "start", "stop", "_total")
+
+    def __init__(self, table, order, start, stop, total=None):
+        self.table = table
+        self.order = order
+        self.start = start
+        self.stop = stop
+        self._total = total
+
+    @property
+    def rows(self):
+        return self.order[self.start:self.stop]
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        return (TaskView(self.table, int(row)) for row in self.rows)
+
+    def __getitem__(self, index):
+        return TaskView(self.table, int(self.rows[index]))
+
+    @property
+    def task_type(self):
+        return self.table.type_names[self.table._type_codes[self.order[self.start]]]
+
+    def total_size(self):
+        if self._total is None:
+            self._total = int(self.table._data_sizes[self.rows].sum())
+        return self._total
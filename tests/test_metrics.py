@@ -0,0 +1,153 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+# Add the src and scripts directories to the system path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+import numpy as np
+import metrics
+from batching import BEST_FIT, FILL_RATIO, STREAMING, SelectiveBatching, Task as BatchTask
+from benchmark import compare, summarise
+from synthetic_data import airs_frame, make_trace, read_trace, write_airs_granules, write_trace
+from data_processing.granules import GranuleView
+from metrics import CProfileHook, Registry
+from scheduler import QUEUE_DEPTH, UTILISATION, DynamicTaskScheduler, Task as SchedulerTask
+from task_table import TaskTable
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_render_exposition_format(self):
+        self.registry.counter("jobs_total", "Jobs run.").inc(3, queue="fast")
+        self.registry.gauge("depth", "Queue depth.").set(7)
+        histogram = self.registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe_many([0.5, 2.0])
+        text = self.registry.render()
+        self.assertIn("# TYPE jobs_total counter", text)
+        self.assertIn('jobs_total{queue="fast"} 3.0', text)
+        self.assertIn("depth 7.0", text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("latency_seconds_count 3", text)
+        self.assertEqual(histogram.get(), (3, 2.55))
+
+    def test_metrics_are_shared_by_name(self):
+        self.assertIs(self.registry.gauge("depth"), self.registry.gauge("depth"))
+        with self.assertRaises(ValueError):
+            self.registry.counter("depth")
+
+    def test_collectors_are_rendered_at_scrape_time(self):
+        state = {"value": 1}
+        self.registry.add_collector(lambda: [("cache_entries", "gauge", "Entries.", {(): state["value"]})])
+        state["value"] = 5
+        self.assertIn("cache_entries 5.0", self.registry.render())
+
+    def test_timer_runs_profiler_hooks(self):
+        events = []
+
+        class Hook:
+            def enter(self, name, labels):
+                events.append(("enter", name, labels))
+
+            def exit(self, name, labels, seconds):
+                events.append(("exit", name, labels))
+
+        hook = Hook()
+        self.registry.add_hook(hook)
+        with self.registry.timer("stage_seconds", stage="load"):
+            pass
+        self.registry.remove_hook(hook)
+        with self.registry.timer("stage_seconds", stage="load"):
+            pass
+        self.assertEqual(events, [("enter", "stage_seconds", {"stage": "load"}),
+                                  ("exit", "stage_seconds", {"stage": "load"})])
+        self.assertEqual(self.registry.histogram("stage_seconds").get(stage="load")[0], 2)
+
+    def test_cprofile_hook_profiles_selected_sections(self):
+        hook = CProfileHook(sections=["hot_seconds"])
+        self.registry.add_hook(hook)
+        with self.registry.timer("hot_seconds"):
+            sorted(range(1000), key=lambda value: -value)
+        with self.registry.timer("cold_seconds"):
+            sum(range(1000))
+        self.registry.remove_hook(hook)
+        functions = {function for _, _, function in hook.stats().stats}
+        self.assertIn("<lambda>", functions)
+        self.assertNotIn("<built-in method builtins.sum>", functions)
+
+
+class TestHotPathInstrumentation(unittest.TestCase):
+    def test_batching_records_fill_ratios(self):
+        tasks = [BatchTask("model_inference", size) for size in (6, 4, 5)] + [BatchTask("attention", 3)]
+        for packing, source in ((STREAMING, tasks), (BEST_FIT, tasks), (BEST_FIT, TaskTable.from_tasks(tasks))):
+            before_count, before_total = FILL_RATIO.get(packing=packing)
+            batching = SelectiveBatching(max_batch_size=10, packing=packing)
+            batching.create_batch(source)
+            count, total = FILL_RATIO.get(packing=packing)
+            self.assertEqual(count - before_count, len(batching.batches))
+            self.assertAlmostEqual(total - before_total, sum(batching.fill_ratios()))
+        self.assertIn('earthai_batching_seconds_count{operation="create",packing="best_fit"}', metrics.render())
+
+    def test_scheduler_reports_queue_depth_and_utilisation(self):
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=1)
+        scheduler.start()
+        try:
+            for number in range(4):
+                scheduler.add_task(SchedulerTask(number, 1, 0.0, None, func=lambda data: None))
+            self.assertTrue(scheduler.drain(timeout=5))
+        finally:
+            scheduler.shutdown()
+        self.assertEqual(QUEUE_DEPTH.get(), 0)
+        self.assertEqual(UTILISATION.get(), 0)
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_summarise_percentiles(self):
+        result = summarise([0.001 * value for value in range(1, 101)], elapsed=2.0)
+        self.assertEqual(result["count"], 100)
+        self.assertEqual(result["throughput"], 50.0)
+        self.assertAlmostEqual(result["p50_ms"], 50.5)
+        self.assertAlmostEqual(result["max_ms"], 100.0)
+
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        baseline = {"results": {"server.flask": {"throughput": 1000.0, "p50_ms": 5.0, "p99_ms": 20.0},
+                                "batching.execute": {"throughput": 100.0}}}
+        current = {"results": {"server.flask": {"throughput": 950.0, "p50_ms": 6.0, "p99_ms": 19.0},
+                               "batching.execute": {"throughput": 80.0},
+                               "scheduler.dispatch": {"throughput": 1.0}}}
+        regressions = compare(current, baseline, tolerance=0.1)
+        self.assertEqual(sorted((entry["benchmark"], entry["field"]) for entry in regressions),
+                         [("batching.execute", "throughput"), ("server.flask", "p50_ms")])
+
+    def test_trace_round_trip_and_plain_payload_lines(self):
+        trace = make_trace(20, rows_per_request=2, duplicate_fraction=0.5, seed=3)
+        self.assertTrue(all(len(entry["body"]["instances"]) == 2 for entry in trace))
+        self.assertEqual([entry["offset"] for entry in trace], sorted(entry["offset"] for entry in trace))
+        path = write_trace(os.path.join(self.directory, "trace.jsonl"), trace)
+        self.assertEqual(read_trace(path), trace)
+        with open(path, "w") as trace_file:
+            trace_file.write('{"input": "test data"}\n')
+        self.assertEqual(read_trace(path), [{"body": {"input": "test data"}, "offset": 0.0}])
+
+    def test_synthetic_granules_match_frame(self):
+        path, = write_airs_granules(self.directory, 1, seed=4)
+        frame = GranuleView(path).frame
+        expected = airs_frame(45 * 30, seed=4)
+        self.assertEqual(len(frame), 45 * 30)
+        np.testing.assert_allclose(frame["TSurfAir"].to_numpy(), expected["TSurfAir"].to_numpy(), rtol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
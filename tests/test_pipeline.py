@@ -1,10 +1,42 @@
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
 import unittest
-from pipeline.pipeline import DataProcessingPipeline
+from unittest import mock
+# Add the src directory to the system path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+import numpy as np
+import pandas as pd
+try:
+    import h5py
+except ImportError:
+    h5py = None
+from batching import SelectiveBatching
+from config import load_config
+from data_processing.cache import PipelineCache
+from data_processing.granules import GranuleView, HDF5Granule, NetCDF3Granule, write_netcdf
+from data_processing.pipeline import DataProcessingPipeline
+from data_processing.preprocessing import Preprocessor, RunningStats
 
 class TestDataProcessingPipeline(unittest.TestCase):
     def setUp(self):
-        # Setup your test environment
-        self.pipeline = DataProcessingPipeline(input_path="path/to/test/data.csv")
+        # Setup your test environment: a small AIRS-like CSV with some missing values
+        self.directory = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.directory, "data.csv")
+        frame = pd.DataFrame({
+            "latitude": np.linspace(-60.0, 60.0, 50),
+            "longitude": np.linspace(-120.0, 120.0, 50),
+            "radiance": np.arange(50, dtype=float),
+        })
+        frame.loc[[3, 17, 41], "radiance"] = np.nan
+        frame.to_csv(self.input_path, index=False)
+        self.pipeline = DataProcessingPipeline(input_path=self.input_path, preprocessor=Preprocessor())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
 
     def test_load_data(self):
         # Test data loading functionality
@@ -16,7 +48,7 @@ class TestDataProcessingPipeline(unittest.TestCase):
         self.pipeline.load_data()
         clean_data = self.pipeline.clean_data()
         # Assert conditions that define clean data, e.g., no missing values
-        self.assertIsNone(clean_data.isnull().sum().sum(), "Clean data should not contain any missing values")
+        self.assertEqual(clean_data.isnull().sum().sum(), 0, "Clean data should not contain any missing values")
 
     def test_transform_data(self):
         # Test data transformation functionality
@@ -34,5 +66,403 @@ class TestDataProcessingPipeline(unittest.TestCase):
         batches = self.pipeline.prepare_batches(batch_size=100)
         # Assert conditions that define successful batching, such as batch count or batch size
 
+    def test_prepare_batches_are_views_of_one_float32_array(self):
+        self.pipeline.load_data()
+        self.pipeline.clean_data()
+        batches = self.pipeline.prepare_batches(batch_size=20)
+        features = self.pipeline.features
+        self.assertEqual(features.dtype, np.float32)
+        self.assertTrue(features.flags.c_contiguous)
+        self.assertEqual([len(batch) for batch in batches], [20, 20, 7])
+        for batch in batches:
+            self.assertIs(batch.base, features)
+        np.testing.assert_allclose(np.concatenate(batches), self.pipeline.data.to_numpy(), rtol=1e-6)
+
+    def test_prepare_batches_as_tasks_pack_by_bytes(self):
+        self.pipeline.load_data()
+        self.pipeline.clean_data()
+        tasks = self.pipeline.prepare_batches(batch_size=10, as_tasks=True)
+        self.assertEqual([task.data_size for task in tasks], [120] * 4 + [84])
+        self.assertTrue(np.shares_memory(tasks[0].data, self.pipeline.features))
+        # A 256-byte budget fits two full batches of 10 rows x 3 float32 columns
+        batching = SelectiveBatching(max_batch_size=256)
+        batching.create_batch(tasks)
+        self.assertEqual([[task.task_id for task in batch] for _, batch in batching.batches], [[0, 1], [2, 3], [4]])
+
+    def test_streaming_yields_cleaned_chunks(self):
+        pipeline = DataProcessingPipeline(input_path=self.input_path, chunksize=20, preprocessor=Preprocessor(),
+                                          dtype={"latitude": "float32", "longitude": "float32", "radiance": "float64"})
+        batches = pipeline.run_pipeline()
+        first = next(batches)
+        # The first batch is available before the rest of the file has been read
+        self.assertLessEqual(len(first), 20)
+        self.assertEqual(first["latitude"].dtype, np.float32)
+        remaining = list(batches)
+        combined = pd.concat([first, *remaining])
+        self.assertEqual(len(combined), 47)
+        self.assertEqual(combined.isnull().sum().sum(), 0)
+        self.assertIsNone(pipeline.data, "Streaming mode should not materialise the whole file")
+
+    def test_streaming_matches_in_memory_result(self):
+        expected = self.pipeline.transform_data(self.pipeline.clean_data(self.pipeline.load_data()))
+        streamed = DataProcessingPipeline(input_path=self.input_path, chunksize=7, preprocessor=Preprocessor())
+        streamed = pd.concat(streamed.run_pipeline())
+        pd.testing.assert_frame_equal(streamed, expected)
+
+    def test_parallel_file_matches_in_memory_result(self):
+        expected = self.pipeline.transform_data(self.pipeline.clean_data(self.pipeline.load_data()))
+        pipeline = DataProcessingPipeline(input_path=self.input_path, workers=2, max_in_flight=2, chunk_bytes=200,
+                                          preprocessor=Preprocessor())
+        self.assertGreater(len(pipeline.partitions()), 2)
+        batches = list(pipeline.run_pipeline())
+        self.assertGreater(len(batches), 2)
+        # Parts come back in input order with their dtypes intact
+        pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), expected.reset_index(drop=True))
+
+    def test_parallel_granule_directory(self):
+        granules = os.path.join(self.directory, "granules")
+        os.makedirs(granules)
+        frames = []
+        for number in range(4):
+            frame = pd.DataFrame({"granule": np.full(5, number), "radiance": np.arange(5) * 1.5 + number,
+                                  "label": [f"g{number}"] * 5})
+            frame.to_csv(os.path.join(granules, f"granule_{number:03d}.csv"), index=False)
+            frames.append(frame)
+        pipeline = DataProcessingPipeline(input_path=granules, workers=2, preprocessor=Preprocessor())
+        batches = list(pipeline.run_pipeline())
+        self.assertEqual([batch["granule"].iloc[0] for batch in batches], [0, 1, 2, 3])
+        pd.testing.assert_frame_equal(pd.concat(batches, ignore_index=True), pd.concat(frames, ignore_index=True),
+                                      check_dtype=False)
+
+    def test_parallel_early_stop_releases_shared_memory(self):
+        before = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+        pipeline = DataProcessingPipeline(input_path=self.input_path, workers=2, max_in_flight=3, chunk_bytes=100,
+                                          preprocessor=Preprocessor())
+        batches = pipeline.run_pipeline()
+        next(batches)
+        batches.close()
+        after = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") else set()
+        self.assertEqual(after - before, set())
+
+class TestPreprocessing(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        generator = np.random.default_rng(7)
+        self.frame = pd.DataFrame({
+            "temperature": generator.normal(260.0, 10.0, 400).astype(np.float32),
+            "humidity": generator.normal(0.4, 0.1, 400),
+            "scan": np.arange(400),
+            "label": ["airs"] * 400,
+        })
+        self.frame.loc[10, "temperature"] = 400.0  # Far beyond 2.5 standard deviations
+        self.frame.loc[20, "humidity"] = np.nan
+        self.input_path = os.path.join(self.directory, "data.csv")
+        self.frame.to_csv(self.input_path, index=False)
+        self.config = {"data_processing": {"data_path": self.input_path, "preprocessing": {
+            "clean_missing": True, "outlier_threshold": 2.5, "standardize": True,
+            "stats_path": os.path.join(self.directory, "stats.json")}}}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_running_stats_match_full_pass_regardless_of_chunking(self):
+        block = self.frame[["temperature", "humidity"]].to_numpy(dtype=np.float64)
+        chunked = RunningStats(["temperature", "humidity"])
+        for start in range(0, 400, 37):
+            chunked.update(block[start:start + 37])
+        merged = RunningStats(["temperature", "humidity"]).update(block[:150])
+        merged.merge(RunningStats(["temperature", "humidity"]).update(block[150:]))
+        for stats in (chunked, merged):
+            np.testing.assert_array_equal(stats.count, [400, 399])
+            np.testing.assert_allclose(stats.mean, np.nanmean(block, axis=0))
+            np.testing.assert_allclose(stats.std, np.nanstd(block, axis=0, ddof=1))
+
+    def test_apply_masks_outliers_and_standardises(self):
+        preprocessor = Preprocessor(outlier_threshold=2.5, standardize=True)
+        preprocessor.fit([self.frame])
+        cleaned = preprocessor.apply(self.frame)
+        self.assertNotIn(10, cleaned.index)
+        self.assertNotIn(20, cleaned.index)
+        self.assertEqual(cleaned["temperature"].dtype, np.float32)
+        self.assertTrue((cleaned[["temperature", "humidity", "scan"]].abs() <= 2.5).all().all())
+        self.assertEqual(list(cleaned["label"].unique()), ["airs"])
+        # The input frame is left untouched
+        self.assertEqual(self.frame.loc[10, "temperature"], 400.0)
+
+    def test_apply_rejects_columns_that_do_not_match_the_statistics(self):
+        preprocessor = Preprocessor(standardize=True)
+        preprocessor.fit([self.frame])
+        with self.assertRaisesRegex(ValueError, r"missing from the frame \['scan'\], not in the statistics \['pressure'\]"):
+            preprocessor.apply(self.frame.drop(columns="scan").assign(pressure=1000.0))
+        with self.assertRaises(ValueError):
+            preprocessor.standardize_array(np.zeros((2, 2)))
+
+    def test_masking_without_dropping_keeps_original_scale(self):
+        preprocessor = Preprocessor(clean_missing=False, outlier_threshold=2.5)
+        preprocessor.fit([self.frame])
+        masked = preprocessor.apply(self.frame)
+        self.assertEqual(len(masked), 400)
+        self.assertTrue(np.isnan(masked.loc[10, "temperature"]))
+        self.assertAlmostEqual(masked.loc[0, "humidity"], self.frame.loc[0, "humidity"])
+
+    def test_pipeline_from_config_saves_statistics_and_modes_agree(self):
+        pipeline = DataProcessingPipeline.from_config(self.config)
+        pipeline.run_pipeline()
+        stats = RunningStats.load(self.config["data_processing"]["preprocessing"]["stats_path"])
+        self.assertEqual(stats.columns, ["temperature", "humidity", "scan"])
+        streamed = pd.concat(DataProcessingPipeline.from_config(self.config, chunksize=64).run_pipeline())
+        pd.testing.assert_frame_equal(streamed, pipeline.data)
+        parallel = pd.concat(DataProcessingPipeline.from_config(self.config, workers=2, chunk_bytes=4096)
+                             .run_pipeline(), ignore_index=True)
+        pd.testing.assert_frame_equal(parallel, pipeline.data.reset_index(drop=True))
+
+    def test_saved_statistics_are_reused_only_for_the_input_they_were_fitted_on(self):
+        stats_path = self.config["data_processing"]["preprocessing"]["stats_path"]
+        DataProcessingPipeline.from_config(self.config, chunksize=64).fit_preprocessing()
+        fitted = RunningStats.load(stats_path)
+        pipeline = DataProcessingPipeline.from_config(self.config, chunksize=64)
+        pipeline.iter_chunks = mock.Mock(wraps=pipeline.iter_chunks)
+        list(pipeline.run_pipeline())
+        self.assertEqual(pipeline.iter_chunks.call_count, 1)  # The streaming pass only, no fit pass
+        np.testing.assert_array_equal(pipeline.preprocessor.stats.mean, fitted.mean)
+        # Another input with a shifted distribution must not be judged against the saved statistics
+        other_path = os.path.join(self.directory, "other.csv")
+        other = self.frame.assign(temperature=self.frame["temperature"] + 100.0)
+        other.to_csv(other_path, index=False)
+        pipeline = DataProcessingPipeline.from_config(self.config, input_path=other_path, chunksize=64)
+        pipeline.iter_chunks = mock.Mock(wraps=pipeline.iter_chunks)
+        streamed = pd.concat(pipeline.run_pipeline())
+        self.assertEqual(pipeline.iter_chunks.call_count, 2)  # Refitted, then streamed
+        self.assertGreater(len(streamed), 390)
+        np.testing.assert_allclose(RunningStats.load(stats_path).mean[0], fitted.mean[0] + 100.0, rtol=1e-6)
+        # So must statistics over other columns, even for the same input
+        preprocessing = self.config["data_processing"]["preprocessing"]
+        pipeline = DataProcessingPipeline(other_path, chunksize=64, preprocessor=Preprocessor.from_config(
+            {**preprocessing, "columns": ["humidity"]}))
+        list(pipeline.run_pipeline())
+        self.assertEqual(pipeline.preprocessor.stats.columns, ["humidity"])
+
+    def test_dtypes_default_to_configuration(self):
+        self.config["data_processing"]["dtypes"] = {"humidity": "float32", "scan": "int32"}
+        pipeline = DataProcessingPipeline.from_config(self.config, chunksize=64)
+        chunk = next(pipeline.iter_chunks())
+        self.assertEqual(chunk["humidity"].dtype, np.float32)
+        self.assertEqual(chunk["scan"].dtype, np.int32)
+        self.assertEqual(DataProcessingPipeline(self.input_path).dtype, load_config()["data_processing"]["dtypes"])
+
+    def test_default_preprocessor_follows_config_and_stats_path_is_resolved(self):
+        config_path = os.path.join(self.directory, "config", "app_config.yml")
+        os.makedirs(os.path.dirname(config_path))
+        with open(config_path, "w") as config_file:
+            config_file.write("data_processing:\n  preprocessing:\n    outlier_threshold: 3.0\n"
+                              "    standardize: true\n    stats_path: '../models/stats.json'\n")
+        original = os.environ.get("EARTHAI_CONFIG")
+        os.environ["EARTHAI_CONFIG"] = config_path
+        try:
+            preprocessor = DataProcessingPipeline(self.input_path).preprocessor
+        finally:
+            if original is None:
+                del os.environ["EARTHAI_CONFIG"]
+            else:
+                os.environ["EARTHAI_CONFIG"] = original
+        self.assertEqual(preprocessor.outlier_threshold, 3.0)
+        self.assertTrue(preprocessor.standardize)
+        self.assertEqual(preprocessor.stats_path, os.path.join(self.directory, "models", "stats.json"))
+
+    def test_fitting_empty_input_leaves_statistics_unset(self):
+        empty_directory = os.path.join(self.directory, "no_granules")
+        os.makedirs(empty_directory)
+        pipeline = DataProcessingPipeline(empty_directory, preprocessor=Preprocessor(standardize=True))
+        self.assertIsNone(pipeline.fit_preprocessing())
+
+
+def is_memory_mapped(array):
+    # Follow the chain of views down to the buffer that owns the memory
+    while isinstance(array, np.ndarray):
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return isinstance(array, mmap.mmap)
+
+
+class CountingPipeline(DataProcessingPipeline):
+    # Records which stages actually ran
+    def __init__(self, *args, scale=1.0, **kwargs):
+        kwargs.setdefault("preprocessor", Preprocessor())
+        super().__init__(*args, **kwargs)
+        self.scale = scale
+        self.calls = []
+
+    def load_data(self):
+        self.calls.append("load")
+        return super().load_data()
+
+    def transform_data(self, data=None):
+        self.calls.append("transform")
+        data = super().transform_data(data)
+        return data.assign(radiance=data["radiance"] * self.scale)
+
+    def stage_config(self):
+        config = super().stage_config()
+        config["transform"]["scale"] = self.scale
+        return config
+
+
+class TestPipelineCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.directory, "data.csv")
+        frame = pd.DataFrame({"radiance": np.arange(30, dtype=float), "label": [f"s{i % 3}" for i in range(30)]})
+        frame.loc[[4, 9], "radiance"] = np.nan
+        frame.to_csv(self.input_path, index=False)
+        self.cache = PipelineCache(os.path.join(self.directory, "cache"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_counted(self, scale=1.0):
+        pipeline = CountingPipeline(self.input_path, cache=self.cache, scale=scale)
+        pipeline.run_pipeline()
+        return pipeline
+
+    def test_rerun_is_served_from_memory_mapped_cache(self):
+        first = self.run_counted()
+        self.assertEqual(first.calls, ["load", "transform"])
+        second = self.run_counted()
+        self.assertEqual(second.calls, [])
+        pd.testing.assert_frame_equal(second.data, first.data)
+        self.assertTrue(is_memory_mapped(second.data["radiance"].to_numpy()))
+
+    def test_changed_transform_config_reuses_clean_stage(self):
+        self.run_counted()
+        rerun = self.run_counted(scale=2.0)
+        self.assertEqual(rerun.calls, ["transform"])
+        self.assertEqual(rerun.data["radiance"].iloc[-1], 58.0)
+
+    def test_changed_input_and_invalidation(self):
+        self.run_counted()
+        with open(self.input_path, "a") as data_file:
+            data_file.write("100.0,s1\n")
+        self.assertEqual(self.run_counted().calls, ["load", "transform"])
+        self.cache.invalidate("transform")
+        self.assertEqual(self.run_counted().calls, ["transform"])
+
+    def test_new_statistics_invalidate_clean_stage(self):
+        frame = pd.read_csv(self.input_path)
+        preprocessor = Preprocessor(standardize=True).fit([frame])
+        first = CountingPipeline(self.input_path, cache=self.cache, preprocessor=preprocessor)
+        first.run_pipeline()
+        preprocessor.fit([frame.assign(radiance=frame["radiance"] * 2)])
+        rerun = CountingPipeline(self.input_path, cache=self.cache, preprocessor=preprocessor)
+        rerun.run_pipeline()
+        self.assertEqual(rerun.calls, ["load", "transform"])
+        self.assertFalse(np.allclose(rerun.data["radiance"], first.data["radiance"]))
+
+    def test_entry_removed_during_get_is_a_miss(self):
+        self.cache.put("transform", "key0", pd.DataFrame({"values": np.arange(10.0)}))
+        # Another process evicts the entry between the manifest read and the column loads
+        os.remove(os.path.join(self.cache.directory, "transform", "key0", "0.npy"))
+        self.assertIsNone(self.cache.get("transform", "key0"))
+        self.assertEqual(self.cache.misses, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.cache.directory, "transform", "key0")))
+
+    def test_lru_eviction_bounds_size(self):
+        frame = pd.DataFrame({"values": np.arange(1000, dtype=np.float64)})
+        self.cache.max_bytes = 40000  # Room for two entries
+        self.cache.put("transform", "key0", frame)
+        time.sleep(0.01)
+        self.cache.put("transform", "key1", frame)
+        time.sleep(0.01)
+        self.cache.get("transform", "key0")  # key0 becomes more recent than key1
+        time.sleep(0.01)
+        self.cache.put("transform", "key2", frame)
+        self.assertLessEqual(self.cache.size(), 40000)
+        self.assertIsNone(self.cache.get("transform", "key1"))
+        self.assertIsNotNone(self.cache.get("transform", "key0"))
+        self.assertIsNotNone(self.cache.get("transform", "key2"))
+
+
+class TestGranuleReader(unittest.TestCase):
+    def setUp(self):
+        # Locally generated AIRS-like granule: 6 scan lines of 4 footprints, plus a field we never read
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "granule.nc")
+        self.temperature = np.arange(24, dtype=np.float32).reshape(6, 4) + 200
+        self.temperature[2, 1] = -9999.0
+        self.latitude = np.linspace(-10, 10, 24).reshape(6, 4)
+        self.quality = (np.arange(24, dtype=np.int16) % 3).reshape(6, 4)
+        write_netcdf(self.path, {"GeoTrack": 6, "GeoXTrack": 4, "StdPressureLev": 28}, {
+            "TAirStd": (("GeoTrack", "GeoXTrack"), self.temperature, {"_FillValue": np.float32(-9999.0), "units": "K"}),
+            "Latitude": (("GeoTrack", "GeoXTrack"), self.latitude, {}),
+            "Qual": (("GeoTrack", "GeoXTrack"), self.quality, {"scale_factor": 0.5}),
+            "H2OMMRStd": (("GeoTrack", "GeoXTrack", "StdPressureLev"), np.ones((6, 4, 28)), {}),
+        }, attributes={"title": "AIRS test granule"})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_header_and_memory_mapped_views(self):
+        granule = NetCDF3Granule(self.path)
+        self.assertEqual(granule.attributes["title"], "AIRS test granule")
+        self.assertEqual(granule.variables["H2OMMRStd"].shape, (6, 4, 28))
+        self.assertEqual(granule.variables["TAirStd"].attributes["units"], "K")
+        view = granule.array("Latitude", {"GeoTrack": slice(1, 3)})
+        # The slice is a view into the mapped file, not a copy
+        self.assertTrue(np.shares_memory(view, granule._buffer))
+        np.testing.assert_array_equal(view, self.latitude[1:3])
+
+    def test_view_is_lazy_and_projected(self):
+        view = GranuleView(self.path, variables=["TAirStd", "Latitude"], selection={"GeoTrack": slice(1, 4)})
+        self.assertIsNone(view._granule, "Nothing should be opened before first access")
+        frame = view.frame
+        self.assertEqual(list(frame.columns), ["TAirStd", "Latitude"])
+        self.assertEqual(len(frame), 12)
+        self.assertTrue(np.isnan(frame["TAirStd"].iloc[5]), "Fill values should become NaN")
+        np.testing.assert_allclose(frame["Latitude"], self.latitude[1:4].reshape(-1))
+        self.assertIs(view.frame, frame)
+
+    def test_scale_factor_and_shape_mismatch(self):
+        frame = GranuleView(self.path, variables=["Qual"]).frame
+        np.testing.assert_allclose(frame["Qual"], self.quality.reshape(-1) * 0.5)
+        with self.assertRaises(ValueError):
+            GranuleView(self.path, variables=["Latitude", "H2OMMRStd"]).frame
+
+    def test_selection_of_unknown_dimension_is_rejected(self):
+        with self.assertRaises(KeyError):
+            GranuleView(self.path, variables=["Latitude"], selection={"GeoTrak": slice(0, 2)}).frame
+
+    @unittest.skipUnless(h5py, "h5py is not installed")
+    def test_hdf5_dimensions_are_named_after_dimension_scales(self):
+        path = os.path.join(self.directory, "granule.h5")
+        with h5py.File(path, "w") as granule:
+            for name, length in (("GeoTrack", 6), ("GeoXTrack", 4)):
+                granule.create_dataset(name, data=np.arange(length))
+                granule[name].make_scale(name)
+            temperature = granule.create_dataset("Data Fields/TAirStd", data=self.temperature)
+            temperature.attrs["_FillValue"] = np.float32(-9999.0)
+            for axis, name in enumerate(("GeoTrack", "GeoXTrack")):
+                temperature.dims[axis].attach_scale(granule[name])
+        with HDF5Granule(path) as granule:
+            self.assertEqual(granule.variables["TAirStd"].dimensions, ("GeoTrack", "GeoXTrack"))
+            self.assertEqual(granule.variables["GeoTrack"].dimensions, ("GeoTrack",))
+            np.testing.assert_array_equal(granule.array("TAirStd", {"GeoXTrack": slice(1, 3)}),
+                                          self.temperature[:, 1:3])
+        frame = GranuleView(path, variables=["TAirStd"], selection={"GeoTrack": slice(2, 3)}).frame
+        self.assertEqual(len(frame), 4)
+        self.assertTrue(np.isnan(frame["TAirStd"].iloc[1]))
+
+    def test_pipeline_reads_granules_in_every_mode(self):
+        options = {"variables": ["TAirStd", "Latitude"], "selection": {"GeoXTrack": slice(0, 2)},
+                   "preprocessor": Preprocessor()}
+        loaded = DataProcessingPipeline(self.path, **options)
+        loaded.load_data()
+        expected = loaded.clean_data()
+        self.assertEqual(len(expected), 11)
+        streamed = list(DataProcessingPipeline(self.path, chunksize=4, **options).run_pipeline())
+        self.assertEqual([len(batch) for batch in streamed], [4, 3, 4])
+        pd.testing.assert_frame_equal(pd.concat(streamed, ignore_index=True), expected.reset_index(drop=True))
+        parallel = list(DataProcessingPipeline(self.directory, workers=2, **options).run_pipeline())
+        pd.testing.assert_frame_equal(pd.concat(parallel, ignore_index=True), expected.reset_index(drop=True))
+
 if __name__ == '__main__':
     unittest.main()
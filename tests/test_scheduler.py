@@ -1,10 +1,24 @@
+import asyncio
 import sys
 import os
+import tempfile
+import threading
+import time
 import unittest
 # Add the src directory to the system path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+import numpy as np
 from scheduler import Task, DynamicTaskScheduler
-from batching import SelectiveBatching
+from batching import ContinuousBatching, SelectiveBatching, Task as BatchTask
+from executors import ExecutorRouter
+from resources import StaticResourceMonitor
+from journal import TaskJournal
+from task_table import TaskTable
+
+
+def column_means(data):
+    # Module-level so it can be pickled to the process backend
+    return data.mean(axis=0)
 
 class TestTask(unittest.TestCase):
     def setUp(self):
@@ -39,6 +53,199 @@ class TestSelectiveBatching(unittest.TestCase):
         # Assert that batches are created even for edge cases
         self.assertEqual(len(self.batching.batches), 2)
 
+class TestBatchPacking(unittest.TestCase):
+    def setUp(self):
+        # Setup for each test
+        self.batching = SelectiveBatching()
+
+    def test_homogeneous_batch_creation(self):
+        # Test that batches contain only homogeneous tasks
+        heterogeneous_tasks = [BatchTask(task_id=i, task_type='type_A' if i % 2 == 0 else 'type_B', data_size=i) for i in range(1, 10)]
+        self.batching.create_batch(heterogeneous_tasks)
+        for batch_type, batch in self.batching.batches:
+            self.assertTrue(all(task.task_type == batch_type for task in batch), f"All tasks in the batch should be of type {batch_type}")
+
+    def test_batch_size_limit(self):
+        # Test that no batch exceeds the maximum size limit
+        tasks = [BatchTask(task_id=i, task_type='data_processing', data_size=10) for i in range(20)]
+        self.batching.create_batch(tasks)
+        for _, batch in self.batching.batches:
+            total_size = sum(task.data_size for task in batch)
+            self.assertLessEqual(total_size, self.batching.max_batch_size, "Batch size should not exceed the maximum limit")
+
+    def test_individual_attention_task_processing(self):
+        # Test that attention tasks are executed individually
+        tasks = [BatchTask(task_id=i, task_type='attention', data_size=30) for i in range(5)]
+        self.batching.create_batch(tasks)
+        self.assertEqual(len(self.batching.batches), len(tasks), "Each attention task should be in its own batch")
+
+    def test_best_fit_packs_interleaved_tasks(self):
+        # Test that best-fit packing groups interleaved types into fewer, fuller batches
+        tasks = [BatchTask(task_id=i, task_type='type_A' if i % 2 == 0 else 'type_B', data_size=10) for i in range(16)]
+        self.batching.create_batch(tasks)
+        self.assertEqual(len(self.batching.batches), 16, "Streaming mode cuts a batch on every type change")
+
+        packed = SelectiveBatching(packing="best_fit")
+        packed.create_batch(tasks)
+        self.assertEqual(len(packed.batches), 4)
+        self.assertEqual(packed.fill_ratios(), [1.0] * 4)
+        packed_ids = sorted(task.task_id for _, batch in packed.batches for task in batch)
+        self.assertEqual(packed_ids, list(range(16)), "Every task should be packed exactly once")
+        for batch_type, batch in packed.batches:
+            self.assertTrue(all(task.task_type == batch_type for task in batch))
+
+    def test_best_fit_respects_size_limit(self):
+        # Test that best-fit never overfills a batch and isolates oversized tasks
+        sizes = [25, 5, 30, 10, 15, 35, 20, 40, 8, 12, 3, 50]
+        tasks = [BatchTask(task_id=i, task_type='model_inference', data_size=size) for i, size in enumerate(sizes)]
+        self.batching.create_batch(tasks, mode="best_fit")
+        for _, batch in self.batching.batches:
+            total_size = sum(task.data_size for task in batch)
+            self.assertTrue(total_size <= self.batching.max_batch_size or len(batch) == 1)
+        # Total size 253 needs at least 7 batches of 40 (the 50-size task alone takes one)
+        self.assertLessEqual(len(self.batching.batches), 8)
+
+    def test_unknown_packing_mode(self):
+        # Test that an unknown packing mode is rejected
+        with self.assertRaises(ValueError):
+            self.batching.create_batch([], mode="first_come")
+        # The mode is keyword-only, so a stray positional argument is not taken for one
+        with self.assertRaises(TypeError):
+            self.batching.create_batch([], "best_fit")
+
+class TestTaskTable(unittest.TestCase):
+    def setUp(self):
+        self.table = TaskTable(capacity=4)
+        self.table.extend(['type_A' if i % 2 == 0 else 'type_B' for i in range(20)], np.arange(1, 21),
+                          priorities=np.arange(20) % 3)
+
+    def test_columns_and_views(self):
+        # Test that rows are stored column-wise and exposed through task-like views
+        self.assertEqual(len(self.table), 20)
+        self.assertEqual(self.table.type_names, ['type_A', 'type_B'])
+        view = self.table[3]
+        self.assertEqual((view.task_id, view.task_type, view.data_size, view.priority), (3, 'type_B', 4, 0))
+        self.assertEqual(self.table.append('attention', 30, task_id=99), 20)
+        self.assertEqual(self.table[-1].task_type, 'attention')
+
+    def test_compact_memory(self):
+        # Test that each task costs a few dozen bytes in the table
+        table = TaskTable(capacity=100000)
+        table.extend('data_processing', np.full(100000, 10))
+        self.assertLessEqual(table.nbytes() / len(table), 32)
+
+    def test_table_batches_match_object_batches(self):
+        # Test that table-backed batching produces the same batches as object-backed batching
+        tasks = [BatchTask(task_id=i, task_type='type_A' if i % 3 else 'type_B', data_size=(i * 7) % 23 + 1) for i in range(50)]
+        for mode in ('streaming', 'best_fit'):
+            from_objects = SelectiveBatching(packing=mode)
+            from_objects.create_batch(tasks)
+            from_table = SelectiveBatching(packing=mode)
+            from_table.create_batch(TaskTable.from_tasks(tasks))
+            expected = sorted((batch_type, sorted(task.task_id for task in batch)) for batch_type, batch in from_objects.batches)
+            actual = sorted((batch_type, sorted(task.task_id for task in batch)) for batch_type, batch in from_table.batches)
+            self.assertEqual(actual, expected, f"{mode} batches should not depend on the task storage")
+            self.assertEqual(sorted(from_table.batch_totals()), sorted(from_objects.batch_totals()))
+
+    def test_table_best_fit_packs_runs_of_equal_sizes(self):
+        # Test that packing whole runs of equal sizes gives the same batches as packing task by task
+        sizes = np.random.default_rng(5).choice([0, 3, 7, 12, 25, 40, 45], 2000)
+        tasks = [BatchTask('type_A' if i % 4 else 'type_B', int(size), task_id=i) for i, size in enumerate(sizes)]
+        from_objects = SelectiveBatching(packing='best_fit')
+        from_objects.create_batch(tasks)
+        from_table = SelectiveBatching(packing='best_fit')
+        from_table.create_batch(TaskTable.from_tasks(tasks))
+        expected = sorted((batch_type, sorted(task.task_id for task in batch)) for batch_type, batch in from_objects.batches)
+        actual = sorted((batch_type, sorted(task.task_id for task in batch)) for batch_type, batch in from_table.batches)
+        self.assertEqual(actual, expected)
+
+    def test_table_batch_size_limit(self):
+        # Test that no table batch exceeds the maximum size limit
+        batching = SelectiveBatching()
+        batching.create_batch(self.table, mode='best_fit')
+        for batch_type, batch in batching.batches:
+            self.assertLessEqual(batch.total_size(), batching.max_batch_size)
+            self.assertTrue(all(task.task_type == batch_type for task in batch))
+        self.assertEqual(sum(batching.batch_totals()), int(self.table.data_sizes.sum()))
+
+    def test_priority_order(self):
+        # Test that priority ordering is stable and vectorised over the table
+        order = self.table.priority_order()
+        priorities = self.table.priorities[order]
+        self.assertTrue(np.all(priorities[:-1] <= priorities[1:]))
+        self.assertEqual(order[:3].tolist(), [0, 3, 6])
+
+class TestParallelBatchExecution(unittest.TestCase):
+    def setUp(self):
+        self.batching = SelectiveBatching()
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+
+    def _track(self, task_type, duration):
+        with self.lock:
+            self.running[task_type] = self.running.get(task_type, 0) + 1
+            self.peak[task_type] = max(self.peak.get(task_type, 0), self.running[task_type])
+        time.sleep(duration)
+        with self.lock:
+            self.running[task_type] -= 1
+
+    def test_batches_run_concurrently_with_lanes(self):
+        # Test that batches overlap while attention stays within its own lane
+        self.batching.process_batch = lambda batch: self._track(batch[0].task_type, 0.05)
+        self.batching.execute_task = lambda task: self._track(task.task_type, 0.05)
+        tasks = ([BatchTask('attention', 30, task_id=i) for i in range(4)] +
+                 [BatchTask('model_inference', 30, task_id=10 + i) for i in range(4)])
+        self.batching.create_batch(tasks)
+        results = self.batching.execute_batches_parallel(max_workers=4)
+        self.assertEqual(len(results), len(self.batching.batches))
+        self.assertEqual(self.peak['attention'], 1, "Attention should be confined to its lane")
+        self.assertGreater(self.peak['model_inference'], 1, "Other batches should run concurrently")
+
+    def test_results_yielded_as_completed(self):
+        # Test that a slow batch does not hold back results of faster ones
+        self.batching.process_batch = lambda batch: time.sleep(batch[0].data_size / 100) or batch[0].task_id
+        self.batching.create_batch([BatchTask('data_processing', 30, task_id='slow'),
+                                    BatchTask('model_inference', 1, task_id='fast')])
+
+        async def collect():
+            return [result async for _, _, result in self.batching.execute_batches_async(max_workers=2)]
+
+        self.assertEqual(asyncio.run(collect()), ['fast', 'slow'])
+
+class TestContinuousBatching(unittest.TestCase):
+    def setUp(self):
+        # Record the composition of every iteration instead of printing it
+        self.engine = ContinuousBatching(max_batch_size=40)
+        self.iterations = []
+        self.engine.process_batch = lambda batch: self.iterations.append(('batch', [task.task_id for task in batch]))
+        self.engine.execute_task = lambda task: self.iterations.append(('single', task.task_id))
+
+    def test_requests_join_and_leave_between_iterations(self):
+        # Test that a queued request takes the slot of a finished one instead of waiting for the whole batch
+        tasks = [BatchTask('model_inference', 20, task_id='long', iterations=3),
+                 BatchTask('model_inference', 20, task_id='short'),
+                 BatchTask('model_inference', 20, task_id='queued')]
+        finished = self.engine.run(tasks)
+        self.assertEqual([task.task_id for task in finished], ['short', 'queued', 'long'])
+        self.assertEqual(self.iterations, [('batch', ['long', 'short']),
+                                           ('batch', ['long', 'queued']),
+                                           ('batch', ['long'])])
+        self.assertEqual(self.engine.running_size, 0)
+
+    def test_attention_runs_per_request(self):
+        # Test that attention work is executed individually inside each iteration
+        self.engine.run([BatchTask('attention', 10, task_id=1), BatchTask('attention', 10, task_id=2),
+                         BatchTask('model_inference', 10, task_id=3)])
+        self.assertEqual(self.iterations, [('single', 1), ('single', 2), ('batch', [3])])
+
+    def test_oversized_request_does_not_block_queue(self):
+        # Test that a request larger than max_batch_size still runs, on its own
+        finished = self.engine.run([BatchTask('model_inference', 60, task_id='big'),
+                                    BatchTask('model_inference', 10, task_id='small')])
+        self.assertEqual([task.task_id for task in finished], ['big', 'small'])
+        self.assertEqual(self.iterations, [('batch', ['big']), ('batch', ['small'])])
+
 class TestDynamicTaskScheduler(unittest.TestCase):
     def setUp(self):
         # Setup for each test
@@ -63,5 +270,317 @@ class TestDynamicTaskScheduler(unittest.TestCase):
         # Edge cases should be handled gracefully
         self.assertTrue(not self.scheduler.tasks)
 
+    def test_drain_flushes_partial_batches(self):
+        # Test that drain runs tasks still waiting below the batch threshold
+        for i in range(3):
+            self.scheduler.add_task(Task(task_id=i, priority=1, execution_time=0, data=f"Test data {i}"))
+        self.assertTrue(self.scheduler.drain(timeout=5), "Scheduler should become idle")
+        self.assertFalse(self.scheduler.tasks)
+        self.assertFalse(self.scheduler.task_batches)
+        self.assertFalse(self.scheduler.in_flight)
+
+    def test_dispatch_respects_worker_limit(self):
+        # Test that no more than max_workers tasks run at the same time
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=1)
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def execute_task(task):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(task.execution_time)
+            with lock:
+                running[0] -= 1
+
+        scheduler.execute_task = execute_task
+        for i in range(6):
+            scheduler.add_task(Task(task_id=i, priority=i, execution_time=0.02, data=None))
+        scheduler.schedule_tasks()
+        self.assertTrue(scheduler.run_until_idle())
+        scheduler.shutdown()
+        self.assertLessEqual(peak[0], 2, "Worker limit should never be exceeded")
+
+    def test_linger_deadline_flushes_partial_batch(self):
+        # Test that a rare priority is released after max_linger instead of waiting forever
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=10, max_linger=0.05)
+        scheduler.add_task(Task(task_id=1, priority=7, execution_time=0, data=None))
+        self.assertEqual(len(scheduler.tasks), 0, "Task should wait for its batch to fill")
+        deadline = time.monotonic() + 5
+        while not scheduler.tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(scheduler.tasks), 1, "Partial batch should be flushed after the linger deadline")
+        self.assertFalse(scheduler.task_batches)
+        scheduler.shutdown()
+
+    def test_execution_time_budget_flushes_batch(self):
+        # Test that a batch is released once its summed execution_time reaches the budget
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=10, max_batch_execution_time=5)
+        scheduler.add_task(Task(task_id=1, priority=1, execution_time=2, data=None))
+        self.assertEqual(len(scheduler.tasks), 0)
+        scheduler.add_task(Task(task_id=2, priority=1, execution_time=3, data=None))
+        self.assertEqual(len(scheduler.tasks), 2, "Batch should be flushed when the budget is reached")
+
+    def test_task_with_dependencies(self):
+        # Test that a task with dependencies does not execute before its dependencies
+        dependent_task = Task(task_id=10, priority=1, execution_time=1, data="Dependent", dependencies=[1, 2])
+        self.scheduler.add_task(dependent_task)
+        self.scheduler.schedule_tasks()
+        # Check if the dependent task is still waiting due to unmet dependencies
+        self.assertIn(dependent_task, self.scheduler.blocked.values(), "Dependent task should not execute before its dependencies")
+
+    def test_dependency_chain_executes_in_order(self):
+        # Test that successors are released only after their dependencies complete
+        scheduler = DynamicTaskScheduler(max_workers=4, batch_threshold=1)
+        order = []
+        scheduler.execute_task = lambda task: order.append(task.task_id)
+        scheduler.add_task(Task(task_id="infer", priority=1, execution_time=0, data=None, dependencies=["transform"]))
+        scheduler.add_task(Task(task_id="transform", priority=1, execution_time=0, data=None, dependencies=["clean"]))
+        scheduler.add_task(Task(task_id="clean", priority=1, execution_time=0, data=None, dependencies=["ingest"]))
+        scheduler.add_task(Task(task_id="ingest", priority=5, execution_time=0, data=None))
+        self.assertTrue(scheduler.run_until_idle())
+        scheduler.shutdown()
+        self.assertEqual(order, ["ingest", "clean", "transform", "infer"])
+        self.assertFalse(scheduler.blocked)
+
+    def test_dependency_cycle_rejected(self):
+        # Test that a submission closing a cycle is rejected
+        self.scheduler.add_task(Task(task_id="a", priority=1, execution_time=0, data=None, dependencies=["b"]))
+        with self.assertRaises(ValueError):
+            self.scheduler.add_task(Task(task_id="b", priority=1, execution_time=0, data=None, dependencies=["a"]))
+        with self.assertRaises(ValueError):
+            self.scheduler.add_task(Task(task_id="c", priority=1, execution_time=0, data=None, dependencies=["c"]))
+
+    def test_failure_propagates_to_descendants(self):
+        # Test that descendants of a failed task are cancelled rather than executed
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=1)
+        executed = []
+
+        def execute_task(task):
+            executed.append(task.task_id)
+            if task.task_id == "ingest":
+                raise RuntimeError("corrupt granule")
+
+        scheduler.execute_task = execute_task
+        scheduler.add_task(Task(task_id="clean", priority=1, execution_time=0, data=None, dependencies=["ingest"]))
+        scheduler.add_task(Task(task_id="infer", priority=1, execution_time=0, data=None, dependencies=["clean"]))
+        scheduler.add_task(Task(task_id="ingest", priority=1, execution_time=0, data=None))
+        self.assertTrue(scheduler.run_until_idle())
+        scheduler.shutdown()
+        self.assertEqual(executed, ["ingest"])
+        self.assertEqual(set(scheduler.failed), {"ingest", "clean", "infer"})
+        self.assertFalse(scheduler.blocked)
+
+    def test_inline_route_runs_in_dispatching_thread(self):
+        # Test that tasks routed inline by batch key run in the caller's thread
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=1, executor_routes={3: "inline"})
+        threads = {}
+        scheduler.execute_task = lambda task: threads.setdefault(task.task_id, threading.current_thread())
+        scheduler.add_task(Task(task_id="inline", priority=3, execution_time=0, data=None))
+        scheduler.add_task(Task(task_id="pooled", priority=1, execution_time=0, data=None))
+        self.assertTrue(scheduler.run_until_idle())
+        scheduler.shutdown()
+        self.assertIs(threads["inline"], threading.current_thread())
+        self.assertIsNot(threads["pooled"], threading.current_thread())
+
+    def test_process_backend_completes_tasks(self):
+        # Test that a per-task process hint runs func in a worker process and releases successors
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=1, process_workers=1)
+        payload = np.ones((512, 512), dtype=np.float64)
+        scheduler.add_task(Task(task_id="transform", priority=1, execution_time=0, data=payload,
+                                func=column_means, executor="process"))
+        scheduler.add_task(Task(task_id="report", priority=1, execution_time=0, data=None, dependencies=["transform"]))
+        self.assertTrue(scheduler.drain(timeout=30))
+        scheduler.shutdown()
+        self.assertEqual(scheduler.completed, {"transform", "report"})
+
+    def test_resource_monitoring(self):
+        # Test that the scheduler considers resource availability before scheduling tasks
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=1)
+        resource_monitor = StaticResourceMonitor({'cpu': 50})
+        scheduler.add_resource_monitor(resource_monitor)
+        heavy_task = Task(task_id=20, priority=1, execution_time=10, data="Heavy Task", required_resources={'cpu': 90})
+        scheduler.add_task(heavy_task)
+        scheduler.schedule_tasks()
+        # Check if the heavy task is delayed due to resource constraints
+        self.assertIn(heavy_task, scheduler.tasks, "Heavy task should be delayed when resources are insufficient")
+        scheduler.shutdown()
+
+    def test_backfill_around_blocked_task(self):
+        # Test that a smaller task runs while a higher-priority heavy task waits for resources
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=1)
+        resource_monitor = StaticResourceMonitor({'cpu': 50})
+        scheduler.add_resource_monitor(resource_monitor)
+        executed = []
+        scheduler.execute_task = lambda task: executed.append(task.task_id)
+        heavy_task = Task(task_id="heavy", priority=1, execution_time=0, data=None, required_resources={'cpu': 90})
+        scheduler.add_task(heavy_task)
+        scheduler.add_task(Task(task_id="light", priority=2, execution_time=0, data=None, required_resources={'cpu': 20}))
+        scheduler.schedule_tasks()
+        self.assertFalse(scheduler.drain(timeout=0.2), "Heavy task should still be waiting")
+        self.assertEqual(executed, ["light"])
+        # Once host load drops the heavy task is admitted
+        resource_monitor.set_usage(cpu=0)
+        self.assertTrue(scheduler.drain(timeout=5))
+        scheduler.shutdown()
+        self.assertEqual(executed, ["light", "heavy"])
+
+    def test_backfill_does_not_delay_blocked_task(self):
+        # Test that only tasks finishing before the heavy task's reservation are backfilled around it
+        scheduler = DynamicTaskScheduler(max_workers=4, batch_threshold=1)
+        executed = []
+
+        def run(name, seconds=0.0):
+            return lambda data: (time.sleep(seconds), executed.append(name))
+
+        scheduler.add_task(Task("running", 0, 0.5, None, func=run("running", 0.1), required_resources={'cpu': 20}))
+        scheduler.schedule_tasks()
+        scheduler.add_task(Task("heavy", 1, 0.0, None, func=run("heavy"), required_resources={'cpu': 90}))
+        scheduler.add_task(Task("long", 2, 5.0, None, func=run("long"), required_resources={'cpu': 20}))
+        scheduler.add_task(Task("short", 2, 0.01, None, func=run("short"), required_resources={'cpu': 20}))
+        self.assertTrue(scheduler.drain(timeout=5))
+        scheduler.shutdown()
+        self.assertEqual(executed, ["short", "running", "heavy", "long"])
+
+    def test_backfill_stops_once_head_waited_too_long(self):
+        # Test that a head blocked by host load is no longer bypassed after max_head_wait
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=1, max_head_wait=0.0)
+        scheduler.add_resource_monitor(StaticResourceMonitor({'cpu': 50}))
+        scheduler.execute_task = lambda task: None
+        scheduler.add_task(Task("heavy", 1, 0, None, required_resources={'cpu': 90}))
+        scheduler.schedule_tasks()
+        time.sleep(0.01)
+        scheduler.add_task(Task("light", 2, 0, None, required_resources={'cpu': 20}))
+        scheduler.schedule_tasks()
+        self.assertEqual(len(scheduler.tasks), 2)
+        scheduler.shutdown()
+
+    def test_resource_ledger_limits_concurrency(self):
+        # Test that committed resources of in-flight tasks are counted before admitting more
+        scheduler = DynamicTaskScheduler(max_workers=4, batch_threshold=1, resource_limits={'memory': 8})
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def execute_task(task):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        scheduler.execute_task = execute_task
+        for i in range(4):
+            scheduler.add_task(Task(task_id=i, priority=1, execution_time=0, data=None, required_resources={'memory': 5}))
+        self.assertTrue(scheduler.run_until_idle())
+        scheduler.shutdown()
+        self.assertEqual(peak[0], 1, "Only one 5-unit task fits in an 8-unit memory limit")
+        self.assertEqual(scheduler.committed['memory'], 0)
+
+    def test_oversized_task_rejected(self):
+        # Test that a task that can never fit is rejected at submit time
+        with self.assertRaises(ValueError):
+            self.scheduler.add_task(Task(task_id=1, priority=1, execution_time=0, data=None, required_resources={'cpu': 150}))
+
+    def test_graceful_shutdown_and_recovery(self):
+        # Test that tasks are saved during shutdown and can be recovered
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        scheduler = DynamicTaskScheduler(max_workers=2, journal=TaskJournal(journal_dir.name))
+        scheduler.add_task(Task(task_id=30, priority=1, execution_time=5, data="Important"))
+        scheduler.shutdown()
+        scheduler.recover_tasks()
+        # Ensure tasks are present after recovery
+        self.assertNotEqual(len(scheduler.tasks), 0, "Tasks should be recovered after shutdown")
+
+    def test_recovery_after_crash_replays_journal_tail(self):
+        # Test that a new scheduler restores only outstanding work, including blocked tasks
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=1, journal=TaskJournal(journal_dir.name))
+        scheduler.execute_task = lambda task: None
+        scheduler.add_task(Task(task_id="ingest", priority=1, execution_time=0, data=None))
+        self.assertTrue(scheduler.run_until_idle())
+        scheduler.add_task(Task(task_id="clean", priority=1, execution_time=0, data=[1, 2], dependencies=["ingest"]))
+        scheduler.add_task(Task(task_id="infer", priority=2, execution_time=0, data=None, dependencies=["clean"]))
+        scheduler.journal.sync()
+        # Simulate a crash: no shutdown, plus a torn record at the end of the log
+        with open(os.path.join(journal_dir.name, "journal-0.log"), "ab") as log:
+            log.write(b"\x10\x00\x00")
+
+        recovered = DynamicTaskScheduler(max_workers=2, batch_threshold=1, journal=TaskJournal(journal_dir.name))
+        self.assertEqual(recovered.recover_tasks(), 2)
+        self.assertEqual([task.task_id for task in recovered.tasks], ["clean"])
+        self.assertEqual(recovered.tasks[0].data, [1, 2])
+        self.assertIn("infer", recovered.blocked)
+        recovered.execute_task = lambda task: None
+        self.assertTrue(recovered.run_until_idle())
+        self.assertEqual(recovered.completed, {"clean", "infer"})
+        recovered.shutdown()
+
+    def test_journal_snapshot_compacts_history(self):
+        # Test that snapshots keep only pending tasks and start a new journal generation
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        journal = TaskJournal(journal_dir.name, snapshot_every=50)
+        for i in range(100):
+            journal.record_submit(Task(task_id=i, priority=1, execution_time=0, data=None))
+            if i % 2 == 0:
+                journal.record_complete(i)
+        journal.close()
+        self.assertGreater(journal.generation, 0)
+        self.assertEqual(os.listdir(journal_dir.name).count(f"journal-{journal.generation}.log"), 1)
+        states = TaskJournal(journal_dir.name).recover()
+        self.assertEqual(sorted(state[0] for state in states), list(range(1, 100, 2)))
+
+    def test_journal_syncs_tail_of_burst_within_interval(self):
+        # Test that records below the fsync batch are flushed at once and synced by the interval timer
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        journal = TaskJournal(journal_dir.name, fsync_batch=1000, fsync_interval=0.05)
+        self.addCleanup(journal.close)
+        for i in range(3):
+            journal.record_submit(Task(task_id=i, priority=1, execution_time=0, data=None))
+        # Flushed to the OS immediately, so another reader already sees every record
+        reader = TaskJournal(journal_dir.name)
+        states = reader.recover()
+        reader.close()
+        self.assertEqual(sorted(state[0] for state in states), [0, 1, 2])
+        deadline = time.monotonic() + 2
+        while journal._unsynced and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(journal._unsynced, 0, "The interval timer should sync the tail of a burst")
+
+    def test_background_dispatcher(self):
+        # Test that a started scheduler dispatches tasks as they arrive
+        scheduler = DynamicTaskScheduler(max_workers=2, batch_threshold=1)
+        done = threading.Event()
+        scheduler.execute_task = lambda task: done.set()
+        scheduler.start()
+        scheduler.add_task(Task(task_id=1, priority=1, execution_time=0, data=None))
+        self.assertTrue(done.wait(timeout=5), "Task should be dispatched without calling schedule_tasks")
+        scheduler.shutdown()
+
+class TestExecutorRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = ExecutorRouter(max_workers=2, process_workers=1, shared_memory_threshold=1024)
+
+    def tearDown(self):
+        self.router.shutdown()
+
+    def test_shared_memory_payload(self):
+        # Test that large arrays reach the worker process intact through shared memory
+        payload = np.arange(64 * 1024, dtype=np.float32).reshape(1024, 64)
+        task = Task(task_id=1, priority=1, execution_time=0, data=payload, func=column_means, executor="process")
+        result = self.router.submit(task, run_local=None).result(timeout=30)
+        np.testing.assert_allclose(result, payload.mean(axis=0))
+
+    def test_unknown_backend_rejected(self):
+        # Test that a misconfigured route is reported up front
+        with self.assertRaises(ValueError):
+            ExecutorRouter(routes={1: "gpu"})
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,11 +1,27 @@
+import asyncio
+import io
 import json
+import os
+import sys
+import threading
+import time
 import unittest
-from server.server import app
+# Add the src directory to the system path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+import numpy as np
+from data_processing.preprocessing import Preprocessor, RunningStats
+from model_serving import server
+from model_serving.asgi import PredictApp
+from model_serving.batcher import MicroBatcher
+from model_serving.result_cache import ResultCache
+from model_serving.tensor_codec import decode_npy, iter_json, wants_npy
+from model_serving.server import app
 
 class TestFlaskApi(unittest.TestCase):
     def setUp(self):
         self.app = app.test_client()
         self.app.testing = True
+        server.result_cache.clear()
 
     def test_predict_endpoint(self):
         # Test the /predict endpoint
@@ -16,5 +32,397 @@ class TestFlaskApi(unittest.TestCase):
         # Assert conditions on the response format and content
         self.assertIn('predictions', data, "Response should contain predictions")
 
+    def test_predict_standardises_with_saved_statistics(self):
+        stats = RunningStats(["temperature", "humidity"]).update(np.array([[250.0, 0.2], [270.0, 0.4], [260.0, 0.3]]))
+        original = server.preprocessor
+        server.preprocessor = Preprocessor(standardize=True, stats=stats)
+        try:
+            response = self.app.post('/predict', data=json.dumps({"instances": [
+                {"temperature": 260.0, "humidity": 0.3}, {"temperature": 270.0, "humidity": 0.4}]}),
+                content_type='application/json')
+            missing = self.app.post('/predict', data=json.dumps({"instances": [{"temperature": 1.0}]}),
+                                    content_type='application/json')
+        finally:
+            server.preprocessor = original
+        self.assertEqual(response.status_code, 200)
+        # Row means of the z-scores: the mean row scores 0, the upper row 1 standard deviation
+        np.testing.assert_allclose(json.loads(response.get_data())["predictions"], [0.0, 1.0], atol=1e-12)
+        self.assertEqual(missing.status_code, 400)
+
+    def test_concurrent_requests_share_model_calls(self):
+        calls = []
+        original, original_wait = server.predict, server.batcher.max_wait
+        server.predict = lambda features: calls.append(len(features)) or features.sum(axis=1)
+        server.batcher.max_wait = 0.2  # Generous window so the test does not depend on thread start-up speed
+        responses = [None] * 8
+
+        def post(index):
+            client = app.test_client()
+            responses[index] = client.post('/predict', data=json.dumps({"instances": [[index, 1.0]]}),
+                                           content_type='application/json')
+
+        try:
+            threads = [threading.Thread(target=post, args=(index,)) for index in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            server.predict, server.batcher.max_wait = original, original_wait
+        self.assertEqual([json.loads(response.get_data())["predictions"] for response in responses],
+                         [[index + 1.0] for index in range(8)])
+        self.assertEqual(sum(calls), 8)
+        self.assertLess(len(calls), 8)
+
+
+    def test_repeated_request_is_served_from_result_cache(self):
+        calls = []
+        original, hits = server.predict, server.result_cache.hits
+        server.predict = lambda features: calls.append(len(features)) or features.sum(axis=1)
+        try:
+            first = self.app.post('/predict', data=json.dumps({"instances": [[1.0, 2.0]], "window": "2024-01"}),
+                                  content_type='application/json')
+            # Same request with a different key order hashes to the same entry
+            second = self.app.post('/predict', data='{"window": "2024-01", "instances": [[1.0, 2.0]]}',
+                                   content_type='application/json')
+        finally:
+            server.predict = original
+        self.assertEqual(json.loads(first.get_data()), json.loads(second.get_data()))
+        self.assertEqual(calls, [1])
+        self.assertEqual(server.result_cache.hits, hits + 1)
+
+
+    def test_binary_tensor_request_and_response(self):
+        features = np.arange(12, dtype=np.float32).reshape(4, 3)
+        buffer = io.BytesIO()
+        np.save(buffer, features)
+        response = self.app.post('/predict', data=buffer.getvalue(), content_type='application/x-npy',
+                                 headers={"Accept": "application/x-npy"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-npy')
+        self.assertTrue(response.is_streamed)
+        predictions = np.load(io.BytesIO(response.get_data()))
+        np.testing.assert_allclose(predictions, features.mean(axis=1))
+        # Without the Accept header the same tensor request is answered in JSON
+        response = self.app.post('/predict', data=buffer.getvalue(), content_type='application/x-npy')
+        np.testing.assert_allclose(json.loads(response.get_data())["predictions"], features.mean(axis=1))
+        invalid = self.app.post('/predict', data=buffer.getvalue()[:-4], content_type='application/x-npy')
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_large_json_predictions_are_streamed(self):
+        original = server.stream_chunk_rows
+        server.stream_chunk_rows = 2
+        try:
+            response = self.app.post('/predict', data=json.dumps({"instances": [[value] for value in range(5)]}),
+                                     content_type='application/json')
+        finally:
+            server.stream_chunk_rows = original
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(json.loads(response.get_data()), {"status": "success", "predictions": [0, 1, 2, 3, 4]})
+
+    def test_feature_width_mismatch_is_rejected(self):
+        original = server.model_weights
+        server.model_weights = np.ones(2)
+        try:
+            good = self.app.post('/predict', data=json.dumps({"instances": [[1.0, 2.0]]}),
+                                 content_type='application/json')
+            bad = self.app.post('/predict', data=json.dumps({"instances": [[1.0, 2.0, 3.0]]}),
+                                content_type='application/json')
+        finally:
+            server.model_weights = original
+        self.assertEqual(good.status_code, 200)
+        self.assertEqual(json.loads(good.get_data())["predictions"], [3.0])
+        self.assertEqual(bad.status_code, 400)
+        self.assertIn("Expected 2 features", json.loads(bad.get_data())["message"])
+
+    def test_metrics_endpoint_reports_requests_and_cache(self):
+        payload = json.dumps({"instances": [[2.0, 4.0]]})
+        for _ in range(2):
+            self.app.post('/predict', data=payload, content_type='application/json')
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        text = response.get_data(as_text=True)
+        self.assertIn("# TYPE earthai_request_seconds histogram", text)
+        self.assertIn('earthai_request_seconds_count{server="flask",status="200"}', text)
+        self.assertIn('earthai_result_cache_requests_total{outcome="hits"}', text)
+        self.assertIn("earthai_inference_batch_fill_ratio_bucket", text)
+
+
+class TestTensorCodec(unittest.TestCase):
+    def test_decode_is_a_view_over_the_request_body(self):
+        buffer = io.BytesIO()
+        np.save(buffer, np.arange(6, dtype='<f4').reshape(2, 3))
+        raw = buffer.getvalue()
+        decoded = decode_npy(raw)
+        self.assertEqual(decoded.shape, (2, 3))
+        self.assertFalse(decoded.flags.owndata)
+        self.assertFalse(decoded.flags.writeable)
+        self.assertTrue(np.shares_memory(decoded, np.frombuffer(raw, dtype=np.uint8)))
+
+    def test_fortran_order_and_malformed_payloads(self):
+        array = np.asfortranarray(np.arange(6, dtype=np.float64).reshape(2, 3))
+        buffer = io.BytesIO()
+        np.save(buffer, array)
+        np.testing.assert_array_equal(decode_npy(buffer.getvalue()), array)
+        with self.assertRaises(ValueError):
+            decode_npy(b"not a tensor")
+        object_buffer = io.BytesIO()
+        np.save(object_buffer, np.array(["a"], dtype=object))
+        with self.assertRaises(ValueError):
+            decode_npy(object_buffer.getvalue())
+
+    def test_accept_negotiation_and_json_stream(self):
+        self.assertTrue(wants_npy("application/json;q=0.5, application/x-npy"))
+        self.assertFalse(wants_npy("application/x-npy;q=0"))
+        self.assertFalse(wants_npy(None))
+        body = {"status": "success", "predictions": np.arange(5.0)}
+        chunks = list(iter_json(body, rows_per_chunk=2))
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(json.loads(b"".join(chunks)), {"status": "success", "predictions": [0, 1, 2, 3, 4]})
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = ResultCache(max_bytes=1000, ttl=10.0, namespace="Prithvi:1.0", sizeof=lambda value: 100,
+                                 clock=lambda: self.now)
+
+    def test_keys_are_canonical_and_namespaced(self):
+        self.assertEqual(self.cache.key({"a": 1, "b": [1, 2]}), self.cache.key({"b": [1, 2], "a": 1}))
+        self.assertNotEqual(self.cache.key({"a": 1}), ResultCache(namespace="Prithvi:2.0").key({"a": 1}))
+
+    def test_ttl_expiry_and_lru_eviction(self):
+        for number in range(10):
+            self.cache.get_or_compute(f"key{number}", lambda: number)
+        self.cache.get_or_compute("key0", lambda: "recomputed")  # Refreshes key0's recency
+        self.cache.get_or_compute("key10", lambda: 10)
+        self.assertEqual(self.cache.get_or_compute("key0", lambda: "recomputed"), 0)
+        self.assertEqual(self.cache.get_or_compute("key1", lambda: "recomputed"), "recomputed")
+        self.assertLessEqual(self.cache.size, 1000)
+        self.now = 11.0
+        self.assertEqual(self.cache.get_or_compute("key0", lambda: "expired"), "expired")
+        self.assertEqual(self.cache.stats()["evictions"], 2)
+
+    def test_concurrent_identical_requests_compute_once(self):
+        calls = []
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            release.wait(2)
+            return "result"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get_or_compute("tile", compute)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while self.cache.coalesced < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((self.cache.misses, self.cache.coalesced), (1, 4))
+
+    def test_failures_and_uncacheable_results_are_not_stored(self):
+        with self.assertRaises(ZeroDivisionError):
+            self.cache.get_or_compute("bad", lambda: 1 / 0)
+        self.assertEqual(self.cache.get_or_compute("bad", lambda: "ok"), "ok")
+        self.cache.get_or_compute("invalid", lambda: ("error", 400), cacheable=lambda reply: reply[1] == 200)
+        self.assertEqual(self.cache.get_or_compute("invalid", lambda: "again"), "again")
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.batcher = MicroBatcher(self.model, max_batch_size=5, max_wait=0.05)
+
+    def tearDown(self):
+        self.batcher.shutdown()
+
+    def model(self, features):
+        self.calls.append(len(features))
+        return features * 10
+
+    def test_batches_fill_up_to_max_batch_size(self):
+        futures = [self.batcher.submit(np.full((2, 1), index, dtype=float)) for index in range(5)]
+        results = [future.result(timeout=2) for future in futures]
+        for index, result in enumerate(results):
+            np.testing.assert_array_equal(result, np.full((2, 1), index * 10.0))
+        # Two-row requests never split: 4 + 4 + 2 rows
+        self.assertEqual(self.calls, [4, 4, 2])
+        self.assertEqual(self.batcher.requests_served, 5)
+
+    def test_lone_request_waits_at_most_max_wait(self):
+        started = time.monotonic()
+        result = self.batcher.predict(np.ones((1, 3)), timeout=2)
+        self.assertLess(time.monotonic() - started, 0.5)
+        np.testing.assert_array_equal(result, np.full((1, 3), 10.0))
+        self.assertEqual(self.calls, [1])
+
+    def test_oversized_request_runs_alone_and_errors_reach_every_request(self):
+        self.assertEqual(len(self.batcher.predict(np.ones((12, 1)), timeout=2)), 12)
+        failing = MicroBatcher(lambda features: 1 / 0, max_batch_size=5, max_wait=0.05)
+        try:
+            futures = [failing.submit(np.ones((1, 1))) for _ in range(3)]
+            for future in futures:
+                with self.assertRaises(ZeroDivisionError):
+                    future.result(timeout=2)
+        finally:
+            failing.shutdown()
+
+    def test_only_matching_feature_layouts_share_a_batch(self):
+        futures = [self.batcher.submit(np.ones((1, 2))), self.batcher.submit(np.ones((1, 3))),
+                   self.batcher.submit(np.ones((1, 2))), self.batcher.submit(np.ones((1, 2), dtype=np.float32))]
+        results = [future.result(timeout=2) for future in futures]
+        self.assertEqual([result.shape for result in results], [(1, 2), (1, 3), (1, 2), (1, 2)])
+        self.assertEqual(results[3].dtype, np.float32)
+        self.assertEqual(sorted(self.calls), [1, 1, 2])
+
+async def asgi_request(application, method, path, body=b""):
+    # Minimal ASGI client: returns (status, headers, decoded JSON body)
+    messages = []
+    incoming = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return incoming.pop(0) if incoming else {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    await application({"type": "http", "method": method, "path": path, "headers": []}, receive, send)
+    return messages[0]["status"], dict(messages[0]["headers"]), json.loads(messages[1]["body"])
+
+
+class TestAsgiApp(unittest.TestCase):
+    def setUp(self):
+        self.application = PredictApp(max_in_flight=2)
+        server.result_cache.clear()
+
+    def test_lifespan_preloads_and_shuts_down(self):
+        async def lifespan():
+            events = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+            sent = []
+
+            async def receive():
+                return events.pop(0)
+
+            async def send(message):
+                sent.append(message["type"])
+
+            await self.application({"type": "lifespan"}, receive, send)
+            return sent
+
+        self.assertEqual(asyncio.run(lifespan()), ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+
+    def test_predict_contract_matches_flask_server(self):
+        # Request work now yields to the loop, so all three POSTs are in flight at once
+        self.application.max_in_flight = 8
+
+        async def requests():
+            return await asyncio.gather(
+                asgi_request(self.application, "POST", "/predict", json.dumps({"input": "test data"}).encode()),
+                asgi_request(self.application, "POST", "/predict", json.dumps({"instances": [[1.0, 3.0]]}).encode()),
+                asgi_request(self.application, "POST", "/predict", b"{not json"),
+                asgi_request(self.application, "GET", "/predict"),
+                asgi_request(self.application, "POST", "/missing"))
+
+        free_form, instances, invalid, wrong_method, missing = asyncio.run(requests())
+        self.assertEqual(free_form[0], 200)
+        self.assertIn("predictions", free_form[2])
+        self.assertEqual(instances[2]["predictions"], [2.0])
+        self.assertEqual([invalid[0], wrong_method[0], missing[0]], [400, 405, 404])
+
+    def test_binary_tensor_response_is_streamed(self):
+        features = np.ones((3, 2), dtype=np.float32)
+        buffer = io.BytesIO()
+        np.save(buffer, features)
+        messages = []
+        incoming = [{"type": "http.request", "body": buffer.getvalue(), "more_body": False}]
+
+        async def receive():
+            return incoming.pop(0)
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/predict",
+                 "headers": [(b"content-type", b"application/x-npy"), (b"accept", b"application/x-npy")]}
+        asyncio.run(self.application(scope, receive, send))
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertTrue(messages[1]["more_body"])
+        predictions = np.load(io.BytesIO(b"".join(message.get("body", b"") for message in messages[1:])))
+        np.testing.assert_allclose(predictions, [1.0, 1.0, 1.0])
+
+    def test_request_preprocessing_runs_off_the_event_loop(self):
+        original = server.parse_predict_request
+        release = threading.Event()
+
+        def slow_parse(data):
+            release.wait(2)
+            return original(data)
+
+        async def scenario():
+            server.parse_predict_request = slow_parse
+            predict = asyncio.ensure_future(
+                asgi_request(self.application, "POST", "/predict", json.dumps({"instances": [[5.0]]}).encode()))
+            # While preprocessing blocks its worker thread, the loop still sheds excess requests
+            self.application.max_in_flight = 1
+            await asyncio.sleep(0.05)
+            shed = await asgi_request(self.application, "POST", "/predict", b"{}")
+            release.set()
+            return shed, await predict
+
+        try:
+            shed, served = asyncio.run(scenario())
+        finally:
+            server.parse_predict_request = original
+            release.set()
+        self.assertEqual(shed[0], 503)
+        self.assertEqual(served[2]["predictions"], [5.0])
+
+    def test_excess_concurrency_is_shed_with_503(self):
+        original = server.predict
+        server.predict = lambda features: time.sleep(0.2) or features.sum(axis=1)
+        payload = json.dumps({"instances": [[1.0]]}).encode()
+
+        async def burst():
+            return await asyncio.gather(*[asgi_request(self.application, "POST", "/predict", payload)
+                                          for _ in range(5)])
+
+        try:
+            responses = asyncio.run(burst())
+        finally:
+            server.predict = original
+        statuses = sorted(status for status, _, _ in responses)
+        self.assertEqual(statuses, [200, 200, 503, 503, 503])
+        shed = [headers for status, headers, _ in responses if status == 503]
+        self.assertEqual(shed[0][b"retry-after"], b"1")
+        self.assertEqual(self.application.requests_shed, 3)
+        self.assertEqual(self.application.in_flight, 0)
+
+    def test_metrics_endpoint(self):
+        async def scrape():
+            messages = []
+
+            async def receive():
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                messages.append(message)
+
+            await self.application({"type": "http", "method": "GET", "path": "/metrics", "headers": []},
+                                   receive, send)
+            return messages
+
+        asyncio.run(asgi_request(self.application, "POST", "/predict", json.dumps({"instances": [[1.0]]}).encode()))
+        start, body = asyncio.run(scrape())
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-type", b"text/plain; version=0.0.4; charset=utf-8"), start["headers"])
+        self.assertIn('earthai_request_seconds_count{server="asgi",status="200"}', body["body"].decode())
+
 if __name__ == '__main__':
     unittest.main()